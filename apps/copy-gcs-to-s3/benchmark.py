@@ -0,0 +1,337 @@
+import os, sys, time
+import json, logging
+import argparse
+import itertools
+import multiprocessing
+import socket
+import statistics
+import tempfile
+import threading
+from urllib.parse import urlparse
+
+# benchmarks the copy engine in main.py against local gcs and s3 emulators (e.g. fake-gcs-server, and moto
+# server or minio), over a matrix of object sizes, chunk sizes, max workers, checksum and streaming settings.
+# copies go through a local throttling proxy which adds latency and limits bandwidth, and each copy runs in a
+# fresh process so its peak memory can be measured. results are printed as a table and optionally written to
+# a json report, which a later run can use as a baseline to detect throughput regressions
+
+MB = 1024 * 1024
+SOURCE_BUCKET = 'copy-benchmark-source'
+TARGET_BUCKET = 'copy-benchmark-target'
+PROXY_BUFFER_SIZE = 64 * 1024 # bytes relayed by the throttling proxy at a time
+
+# report columns, as (name, header, number of decimals)
+REPORT_COLUMNS = [
+  ('object_size_mb', 'size MB', 1),
+  ('chunk_size_mb', 'chunk MB', 1),
+  ('max_workers', 'workers', 0),
+  ('checksum', 'checksum', 0),
+  ('streaming', 'stream', 0),
+  ('parts', 'parts', 0),
+  ('mb_per_sec', 'MB/s', 1),
+  ('execution_time', 'secs', 2),
+  ('gcs_read_time', 'read s', 2),
+  ('crc_time', 'crc s', 2),
+  ('s3_upload_time', 'upload s', 2),
+  ('queue_wait_time', 'queue s', 2),
+  ('retries', 'retries', 0),
+  ('peak_memory_mb', 'peak MB', 1)
+]
+
+
+# token bucket shared by all connections of a proxy direction, so the bandwidth limit applies to the
+# function as a whole (like a network interface) rather than to each connection
+class _TokenBucket:
+  def __init__(self, bytes_per_second: float):
+    self.bytes_per_second = bytes_per_second
+    self._available = bytes_per_second
+    self._last_time = time.monotonic()
+    self._lock = threading.Lock()
+
+  # blocks until `num_bytes` may be sent
+  def consume(self, num_bytes: int):
+    if not self.bytes_per_second:
+      return
+    with self._lock:
+      now = time.monotonic()
+      self._available = min(self.bytes_per_second, self._available + (now - self._last_time) * self.bytes_per_second)
+      self._last_time = now
+      self._available -= num_bytes
+      wait_time = -self._available / self.bytes_per_second if self._available < 0 else 0
+    if wait_time:
+      time.sleep(wait_time)
+
+
+# tcp proxy in front of an emulator endpoint, which delays each request and response by `latency` seconds
+# (a delay is added whenever data starts flowing in the other direction of a connection, so every http
+# request/response exchange costs a round trip) and limits bandwidth of each direction to `bandwidth` bytes/s
+class _ThrottlingProxy:
+  def __init__(self, target_url: str, latency: float = 0, bandwidth: float = 0):
+    target = urlparse(target_url)
+    self.target_address = (target.hostname, target.port or 80)
+    self.latency = latency
+    self.upload_bucket = _TokenBucket(bandwidth)
+    self.download_bucket = _TokenBucket(bandwidth)
+    self._server = socket.create_server(('127.0.0.1', 0))
+    self.url = f'{target.scheme}://127.0.0.1:{self._server.getsockname()[1]}'
+
+  def start(self):
+    threading.Thread(target=self._accept, daemon=True).start()
+    return self
+
+  def _accept(self):
+    while True:
+      client_socket, _ = self._server.accept()
+      try:
+        upstream_socket = socket.create_connection(self.target_address)
+      except OSError as e:
+        logging.error('Unable to connect to emulator at %s: %s', self.target_address, e)
+        client_socket.close()
+        continue
+      connection = dict(last_direction=None)
+      threading.Thread(target=self._relay, args=(client_socket, upstream_socket, self.upload_bucket, 'upload', connection), daemon=True).start()
+      threading.Thread(target=self._relay, args=(upstream_socket, client_socket, self.download_bucket, 'download', connection), daemon=True).start()
+
+  def _relay(self, source_socket, target_socket, token_bucket: _TokenBucket, direction: str, connection: dict):
+    try:
+      while True:
+        data = source_socket.recv(PROXY_BUFFER_SIZE)
+        if not data:
+          break
+        if self.latency and connection['last_direction'] != direction:
+          connection['last_direction'] = direction
+          time.sleep(self.latency)
+        token_bucket.consume(len(data))
+        target_socket.sendall(data)
+    except OSError:
+      pass # connection closed by the other side
+    finally:
+      for s in (source_socket, target_socket):
+        try:
+          s.shutdown(socket.SHUT_RDWR)
+        except OSError:
+          pass
+
+
+# creates the benchmark buckets and uploads a source object of each size to the gcs emulator (directly,
+# not through the throttling proxy). objects already uploaded with the right size are reused
+def _prepare_objects(gcs_endpoint: str, s3_endpoint: str, object_sizes: list) -> dict:
+  import boto3
+  from google.auth.credentials import AnonymousCredentials
+  from google.cloud import storage
+
+  s3_client = boto3.client('s3', endpoint_url=s3_endpoint)
+  try:
+    s3_client.create_bucket(Bucket=TARGET_BUCKET)
+  except (s3_client.exceptions.BucketAlreadyOwnedByYou, s3_client.exceptions.BucketAlreadyExists):
+    pass
+
+  gcs_client = storage.Client(project='benchmark', credentials=AnonymousCredentials(), client_options={'api_endpoint': gcs_endpoint})
+  gcs_bucket = gcs_client.bucket(SOURCE_BUCKET)
+  if not gcs_bucket.exists():
+    gcs_client.create_bucket(SOURCE_BUCKET)
+
+  source_uris = {}
+  for object_size in object_sizes:
+    object_name = f'benchmark/object-{object_size}'
+    gcs_object = gcs_bucket.get_blob(object_name)
+    if gcs_object is None or gcs_object.size != object_size:
+      logging.info('Uploading %s byte source object to GCS emulator', object_size)
+      with tempfile.TemporaryFile() as data_file:
+        for offset in range(0, object_size, 8 * MB):
+          data_file.write(os.urandom(min(8 * MB, object_size - offset)))
+        data_file.seek(0)
+        gcs_bucket.blob(object_name).upload_from_file(data_file, size=object_size)
+    source_uris[object_size] = f'gs://{SOURCE_BUCKET}/{object_name}'
+  return source_uris
+
+# runs a single benchmark case in a fresh worker process, so the reported peak memory is that of this copy only
+def _run_case(case: dict) -> dict:
+  import main
+
+  start_time = time.time()
+  response = main.copy_object_gcs_to_s3(case['source_uri'], f's3://{TARGET_BUCKET}/benchmark/{os.getpid()}',
+                                        chunk_size=case['chunk_size'], max_workers=case['max_workers'],
+                                        checksum=case['checksum'], streaming=case['streaming'])
+  response['wall_time'] = time.time() - start_time
+  return response
+
+# returns a report row from a benchmark case and the copy responses of its repeats. timings are those of
+# the repeat with median throughput
+def _report_row(case: dict, responses: list) -> dict:
+  responses = sorted(responses, key=lambda response: response['metrics']['mb_per_sec'])
+  response = responses[len(responses) // 2]
+  metrics = response['metrics']
+  return dict(
+    object_size_mb = round(case['object_size'] / MB, 1),
+    chunk_size_mb = round(case['chunk_size'] / MB, 1) if case['chunk_size'] else 'auto',
+    max_workers = case['max_workers'] or 'auto',
+    checksum = case['checksum'],
+    streaming = case['streaming'],
+    status = response['status'],
+    parts = response.get('parts'),
+    planned_chunk_size = response.get('chunk_size'),
+    planned_max_workers = response.get('max_workers'),
+    execution_time = response['execution_time'],
+    mb_per_sec = metrics['mb_per_sec'],
+    mb_per_sec_stdev = round(statistics.pstdev([ repeat['metrics']['mb_per_sec'] for repeat in responses ]), 3),
+    gcs_read_time = metrics['gcs_read_time'],
+    crc_time = metrics['crc_time'],
+    s3_upload_time = metrics['s3_upload_time'],
+    queue_wait_time = metrics['queue_wait_time'],
+    retries = metrics['gcs_retries'] + metrics['s3_retries'],
+    peak_memory_mb = metrics['peak_memory_mb'] or 0
+  )
+
+# identifies a report row when comparing a report with a baseline
+def _case_key(row: dict) -> tuple:
+  return (row['object_size_mb'], row['chunk_size_mb'], row['max_workers'], row['checksum'], row['streaming'])
+
+def _print_report(rows: list):
+  widths = [ max(8, len(header)) for _, header, _ in REPORT_COLUMNS ]
+  print(' '.join(header.rjust(width) for (_, header, _), width in zip(REPORT_COLUMNS, widths)))
+  for row in rows:
+    values = []
+    for (name, _, decimals), width in zip(REPORT_COLUMNS, widths):
+      value = row[name]
+      if isinstance(value, float):
+        value = f'{value:.{decimals}f}'
+      values.append(str(value).rjust(width))
+    print(' '.join(values))
+
+# returns rows whose throughput dropped by more than `tolerance` (a fraction) compared to the baseline report
+def _find_regressions(rows: list, baseline_rows: list, tolerance: float) -> list:
+  baseline = { _case_key(row): row for row in baseline_rows }
+  regressions = []
+  for row in rows:
+    baseline_row = baseline.get(_case_key(row))
+    if baseline_row and row['mb_per_sec'] < baseline_row['mb_per_sec'] * (1 - tolerance):
+      regressions.append((row, baseline_row))
+  return regressions
+
+# parses a comma separated list of values, where `auto` (planned by the copy engine) is returned as None
+def _parse_list(value: str, parse=int) -> list:
+  return [ None if item.strip() == 'auto' else parse(item.strip()) for item in value.split(',') ]
+
+def _parse_bool(value: str) -> bool:
+  return value.strip() in ['True', 'true', 'Yes', 'yes', 'Y', 'y', '1']
+
+
+if __name__ == "__main__":
+  cliparser = argparse.ArgumentParser(
+    description='Benchmark copying objects from a local GCS emulator to a local S3 emulator, with injected latency and bandwidth limits.',
+  )
+  cliparser.add_argument('--gcs-endpoint',
+                          default=os.environ.get('STORAGE_EMULATOR_HOST', 'http://localhost:4443'),
+                          help='gcs emulator endpoint, e.g. fake-gcs-server (default: STORAGE_EMULATOR_HOST or http://localhost:4443)'
+                        )
+  cliparser.add_argument('--s3-endpoint',
+                          default=os.environ.get('AWS_ENDPOINT_URL_S3', 'http://localhost:5000'),
+                          help='s3 emulator endpoint, e.g. moto server or minio (default: AWS_ENDPOINT_URL_S3 or http://localhost:5000)'
+                        )
+  cliparser.add_argument('--sizes',
+                          default='8,64,256',
+                          help='comma separated source object sizes in MB (default: 8,64,256)'
+                        )
+  cliparser.add_argument('--chunk-sizes',
+                          default='auto,8,32',
+                          help='comma separated chunk sizes in MB, `auto` lets the copy planner choose (default: auto,8,32)'
+                        )
+  cliparser.add_argument('--max-workers',
+                          default='auto,1,4,8',
+                          help='comma separated max workers, `auto` lets the copy planner choose (default: auto,1,4,8)'
+                        )
+  cliparser.add_argument('--checksum',
+                          default='false,true',
+                          help='comma separated checksum settings (default: false,true)'
+                        )
+  cliparser.add_argument('--streaming',
+                          default='false',
+                          help='comma separated streaming settings (default: false)'
+                        )
+  cliparser.add_argument('--latency',
+                          type=float,
+                          default=0,
+                          help='latency in milliseconds added to each request and response (default: 0)'
+                        )
+  cliparser.add_argument('--bandwidth',
+                          type=float,
+                          default=0,
+                          help='bandwidth limit in MB/s of each direction of each emulator, 0 for no limit (default: 0)'
+                        )
+  cliparser.add_argument('--repeat',
+                          type=int,
+                          default=1,
+                          help='number of times each case is run, the run with median throughput is reported (default: 1)'
+                        )
+  cliparser.add_argument('--report',
+                          help='path of a json report to write'
+                        )
+  cliparser.add_argument('--baseline',
+                          help='path of a json report of an earlier run, to compare throughput with'
+                        )
+  cliparser.add_argument('--tolerance',
+                          type=float,
+                          default=0.2,
+                          help='fraction by which throughput may drop below the baseline before it is reported as a regression (default: 0.2)'
+                        )
+  args = cliparser.parse_args()
+  logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=os.environ.get('LOG_LEVEL', 'INFO'))
+
+  # emulators accept any aws credentials
+  os.environ.setdefault('AWS_ACCESS_KEY_ID', 'benchmark')
+  os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+  os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+  object_sizes = [ int(size * MB) for size in _parse_list(args.sizes, float) ]
+  source_uris = _prepare_objects(args.gcs_endpoint, args.s3_endpoint, object_sizes)
+
+  # copies made by worker processes go through the throttling proxies, configured with the environment
+  # variables that gcs and aws sdks read their endpoints from
+  gcs_proxy = _ThrottlingProxy(args.gcs_endpoint, args.latency / 1000, args.bandwidth * MB).start()
+  s3_proxy = _ThrottlingProxy(args.s3_endpoint, args.latency / 1000, args.bandwidth * MB).start()
+  os.environ.update({
+    'STORAGE_EMULATOR_HOST': gcs_proxy.url,
+    'AWS_ENDPOINT_URL_S3': s3_proxy.url,
+    'METRICS_SINK': 'none',
+    'LOG_LEVEL': os.environ.get('COPY_LOG_LEVEL', 'WARNING')
+  })
+  os.environ.pop('GCP_CREDENTIALS_FILE', None)
+
+  cases = [ dict(object_size=object_size, source_uri=source_uris[object_size], chunk_size=chunk_size and chunk_size * MB,
+                 max_workers=max_workers, checksum=checksum, streaming=streaming)
+            for object_size, chunk_size, max_workers, checksum, streaming in itertools.product(
+              object_sizes, _parse_list(args.chunk_sizes), _parse_list(args.max_workers),
+              _parse_list(args.checksum, _parse_bool), _parse_list(args.streaming, _parse_bool)) ]
+
+  rows = []
+  mp_context = multiprocessing.get_context('spawn')
+  for case_num, case in enumerate(cases, start=1):
+    logging.info('Running benchmark case #%s of %s: %s', case_num, len(cases), { name: value for name, value in case.items() if name != 'source_uri' })
+    responses = []
+    for _ in range(args.repeat):
+      with mp_context.Pool(1) as pool:
+        responses.append(pool.apply(_run_case, (case,)))
+    rows.append(_report_row(case, responses))
+
+  _print_report(rows)
+  report = dict(
+    latency_ms = args.latency,
+    bandwidth_mb_per_sec = args.bandwidth,
+    repeat = args.repeat,
+    results = rows
+  )
+  if args.report:
+    with open(args.report, 'wt') as report_file:
+      json.dump(report, report_file, indent=2)
+    logging.info('Wrote benchmark report to %s', args.report)
+
+  if args.baseline:
+    with open(args.baseline, 'rt') as baseline_file:
+      baseline_rows = json.load(baseline_file)['results']
+    regressions = _find_regressions(rows, baseline_rows, args.tolerance)
+    for row, baseline_row in regressions:
+      logging.error('Throughput regression for case %s: %s MB/s (baseline: %s MB/s)', _case_key(row), row['mb_per_sec'], baseline_row['mb_per_sec'])
+    if regressions:
+      sys.exit(1)
+    logging.info('No throughput regressions compared to baseline %s', args.baseline)
@@ -1,31 +1,121 @@
 import os, sys, time
+module_load_start_time = time.time() # used to report cold start timing
 from datetime import datetime
-import base64, logging, json
+import base64, logging, json, zlib, csv
 import argparse
-from urllib.parse import urlparse
+from urllib.parse import urlparse, urlencode, quote
+from collections import deque
 import concurrent.futures
+import multiprocessing
+import threading
+import queue
+import contextlib
+import random
+import itertools
+import asyncio
 
 # add lib directory to path if this program runs inside lambda runtime
 if os.environ.get('LAMBDA_TASK_ROOT'):
   sys.path.insert(0, f"{os.environ['LAMBDA_TASK_ROOT']}/lib")
 
-# aws sdk
-import boto3
-from botocore.config import Config
-
-# gcp storage and auth modules
-import google.auth
-from google.cloud import storage
-from google.oauth2 import service_account
-
-import jsonschema
+# aws sdk, gcp storage and auth modules and jsonschema are imported when they are first needed, 
+# which keeps cold starts (and command line runs which don't need all of them) fast
 import crc32c
 
 # define global variables
-DEFAULT_CHUNK_SIZE = 1024 * 1024 * 64 # 64 MB
-DEFAULT_MAX_WORKERS = 2
+DEFAULT_CHUNK_SIZE = 1024 * 1024 * 64 # 64 MB, part size used by planner until part throughput has been observed
+DEFAULT_POOL_SIZE = 8 # number of worker threads shared by all objects copied in a single invocation
+# http connections kept by each of the s3 and gcs clients, on top of one per worker and helper thread (for metadata 
+# calls made outside of workers). MAX_POOL_CONNECTIONS sets a minimum pool size regardless of number of workers
+CONNECTION_POOL_HEADROOM = 4
+MAX_POOL_CONNECTIONS = int(os.environ.get('MAX_POOL_CONNECTIONS', 2 * DEFAULT_POOL_SIZE + CONNECTION_POOL_HEADROOM))
+GCP_CREDENTIALS_TTL = int(os.environ.get('GCP_CREDENTIALS_TTL', 3600)) # seconds decoded gcp credentials are cached for
 DEFAULT_CHECKSUM_ENABLED = False
-RETRY_DELAY = 2 # number of seconds to wait before retrying on read/write failure
+DEFAULT_STREAMING_ENABLED = False
+DEFAULT_RESUMABLE_ENABLED = False
+DEFAULT_SYNC_ENABLED = False
+DEFAULT_VERIFY_ENABLED = True
+# resumable copies stop starting new parts this many seconds before the lambda invocation times out
+RESUMABLE_DEADLINE_MARGIN = int(os.environ.get('RESUMABLE_DEADLINE_MARGIN', 60))
+# the ledger of a resumable copy is saved in the background once LEDGER_SAVE_PARTS parts were uploaded, or 
+# LEDGER_SAVE_INTERVAL seconds passed, since it was last saved (and when the copy fails or stops at the deadline)
+LEDGER_SAVE_PARTS = int(os.environ.get('LEDGER_SAVE_PARTS', 100))
+LEDGER_SAVE_INTERVAL = int(os.environ.get('LEDGER_SAVE_INTERVAL', 15))
+# in streaming mode, object data moves from gcs to s3 through a process wide pool of fixed size buffers
+# so peak memory used by copies is bounded by STREAM_BUFFER_SIZE * STREAM_BUFFER_COUNT (64 MB by default)
+STREAM_BUFFER_SIZE = int(os.environ.get('STREAM_BUFFER_SIZE', 1024 * 1024 * 8)) # 8 MB
+STREAM_BUFFER_COUNT = int(os.environ.get('STREAM_BUFFER_COUNT', 8))
+# failed gcs reads and s3 writes are attempted up to RETRY_ATTEMPTS times. before each retry we wait a random 
+# time of up to RETRY_BASE_DELAY * 2^retry seconds (capped at RETRY_MAX_DELAY), so that parts which failed 
+# together (e.g. when a service throttled us) don't retry together
+RETRY_ATTEMPTS = int(os.environ.get('RETRY_ATTEMPTS', 4))
+RETRY_BASE_DELAY = 1
+RETRY_MAX_DELAY = 20
+# a second (hedged) copy of a part is started when the part has been running for longer than HEDGE_MULTIPLIER 
+# times the HEDGE_PERCENTILE (set to 0 to disable hedging) of the copy time of parts of the same object. 
+# whichever copy completes first is used. at most one in HEDGE_MAX_PARTS_RATIO parts of an object is hedged
+HEDGE_PERCENTILE = float(os.environ.get('HEDGE_PERCENTILE', 90))
+HEDGE_MULTIPLIER = 1.5
+HEDGE_MIN_SAMPLES = 3 # parts of an object which must have completed before its parts can be hedged
+HEDGE_MIN_DELAY = 2 # seconds a part must run before it can be hedged, regardless of its peers
+HEDGE_MAX_PARTS_RATIO = 10
+HEDGE_CHECK_INTERVAL = 0.5 # seconds between checks for straggler parts
+# a hedged copy replaces a slow one, so it gives up on gcs reads and s3 responses which stall for longer than 
+# HEDGE_READ_TIMEOUT seconds rather than waiting as long as the first copy did
+HEDGE_READ_TIMEOUT = int(os.environ.get('HEDGE_READ_TIMEOUT', 10))
+LIST_PAGE_SIZE = 1000 # number of objects fetched per page when listing a source prefix or glob pattern
+# metadata of gcs source objects listed in a payload is fetched for up to METADATA_PREFETCH_WINDOW objects 
+# ahead of their copies, by METADATA_PREFETCH_WORKERS concurrent requests
+METADATA_PREFETCH_WINDOW = int(os.environ.get('METADATA_PREFETCH_WINDOW', 100))
+METADATA_PREFETCH_WORKERS = int(os.environ.get('METADATA_PREFETCH_WORKERS', 16))
+
+# in manifest mode, objects to copy are read from a jsonl or csv manifest object (in s3 or gcs) as a stream, and 
+# copied in batches of `batch_size` entries. a result line per copied object is written to a result object per 
+# batch (under a result prefix) as batches complete, and only a summary is returned
+MANIFEST_FORMATS = ['jsonl', 'csv']
+DEFAULT_MANIFEST_BATCH_SIZE = 1000
+MANIFEST_INTEGER_FIELDS = ['chunk_size', 'max_workers', 'fan_out'] # csv manifest values converted to integers
+RESULT_MANIFEST_PART_SIZE = 1024 * 1024 * 8 # 8 MB, result lines are buffered and uploaded in parts of this size
+# copy metrics are written to the sink selected by METRICS_SINK: `emf` (cloudwatch embedded metric format 
+# lines on stdout), `file` (emf lines appended to METRICS_FILE, e.g. when running offline) or `none`
+METRICS_SINK = os.environ.get('METRICS_SINK', 'emf')
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'DataDuplake/CopyGcsToS3')
+
+# objects are copied by a pool of worker threads (`threads` engine), or by a single thread running many 
+# concurrent aiohttp transfers (`asyncio` engine, where `pool_size` is the number of concurrent part transfers)
+ENGINES = ['threads', 'asyncio']
+DEFAULT_ENGINE = 'threads'
+ASYNC_POOL_SIZE = int(os.environ.get('ASYNC_POOL_SIZE', 64)) # default number of concurrent part transfers of the asyncio engine
+GCS_API_ENDPOINT = 'https://storage.googleapis.com' # used by the asyncio engine, unless STORAGE_EMULATOR_HOST is set
+
+# a gcs to s3 multi-part copy with `fan_out` greater than 1 is coordinated by this invocation, which splits the
+# parts across `fan_out` part range workers. workers are invocations of the FAN_OUT_FUNCTION lambda function 
+# (this function, by default), or processes of a local process pool when not running inside lambda
+DEFAULT_FAN_OUT = 1
+FAN_OUT_FUNCTION = os.environ.get('FAN_OUT_FUNCTION') or os.environ.get('AWS_LAMBDA_FUNCTION_NAME')
+FAN_OUT_INVOKE_TIMEOUT = 910 # seconds to wait for a part range worker, just over the lambda maximum timeout
+
+# a gcs to s3 copy with a `compression` is compressed on the fly. blocks of the source are read and compressed 
+# by up to `max_workers` threads, each block as an independent gzip member or zstd frame (a concatenation of 
+# which is a valid gzip or zstd file), and the compressed stream is cut into s3 parts of `chunk_size` bytes
+COMPRESSIONS = ['gzip', 'zstd']
+COMPRESSION_LEVELS = {'gzip': 6, 'zstd': 3}
+COMPRESSION_BLOCK_SIZE = int(os.environ.get('COMPRESSION_BLOCK_SIZE', 1024 * 1024 * 16)) # 16 MB
+
+# supported (source, target) uri schemes. s3 to s3 and gcs to gcs copies are made server side
+COPY_ROUTES = [('gs', 's3'), ('s3', 's3'), ('gs', 'gs')]
+SERVER_SIDE_CHUNK_SIZE = 1024 * 1024 * 512 # 512 MB, default part size of server side s3 multi-part copies
+
+# s3 multi-part upload limits
+S3_MIN_PART_SIZE = 1024 * 1024 * 5 # 5 MB (except last part)
+S3_MAX_PART_SIZE = 1024 * 1024 * 1024 * 5 # 5 GB
+S3_MAX_PARTS = 10000
+S3_MAX_OBJECT_SIZE = 1024 * 1024 * 1024 * 1024 * 5 # 5 TB
+
+# copy planner settings, used when chunk size or max workers are not set for an object
+PLANNER_TARGET_PART_SECONDS = 8 # size parts so that each takes about this long to copy at observed throughput
+PLANNER_MEMORY_FRACTION = 0.5 # fraction of function memory that in-memory (non streaming) part copies may use
+PLANNER_WORKERS_PER_VCPU = 4 # copies are i/o bound, so we run several workers per vcpu
 
 # define lambda payload schema
 LAMBDA_PAYLOAD_SCHEMA = {
@@ -53,6 +143,26 @@ LAMBDA_PAYLOAD_SCHEMA = {
           }, 
           "kms_key_arn": {
             "type": "string"
+          }, 
+          "streaming": {
+            "type": ["boolean", "string"]
+          }, 
+          "resumable": {
+            "type": ["boolean", "string"]
+          }, 
+          "sync": {
+            "type": ["boolean", "string"]
+          }, 
+          "verify": {
+            "type": ["boolean", "string"]
+          }, 
+          "fan_out": {
+            "type": "integer", 
+            "minimum": 1
+          }, 
+          "compression": {
+            "type": "string", 
+            "enum": COMPRESSIONS
           } 
         },
         "required": ["source_uri", "target_uri"]
@@ -73,11 +183,118 @@ LAMBDA_PAYLOAD_SCHEMA = {
         }, 
         "kms_key_arn": {
           "type": "string"
+        }, 
+        "streaming": {
+          "type": ["boolean", "string"]
+        }, 
+        "resumable": {
+          "type": ["boolean", "string"]
+        }, 
+        "sync": {
+          "type": ["boolean", "string"]
+        }, 
+        "verify": {
+          "type": ["boolean", "string"]
+        }, 
+        "fan_out": {
+          "type": "integer", 
+          "minimum": 1
+        }, 
+        "compression": {
+          "type": "string", 
+          "enum": COMPRESSIONS
         } 
       }
+    }, 
+    "manifest": {
+      "type": "object", 
+      "properties": {
+        "uri": {
+          "type": "string"
+        }, 
+        "format": {
+          "type": "string", 
+          "enum": MANIFEST_FORMATS
+        }, 
+        "result_uri": {
+          "type": "string"
+        }, 
+        "batch_size": {
+          "type": "integer", 
+          "minimum": 1
+        }, 
+        "offset": {
+          "type": "integer", 
+          "minimum": 0
+        }, 
+        "kms_key_arn": {
+          "type": "string"
+        }
+      }, 
+      "required": ["uri"]
+    }, 
+    "pool_size": {
+      "type": "integer", 
+      "minimum": 1
+    }, 
+    "engine": {
+      "type": "string", 
+      "enum": ENGINES
+    }, 
+    "part_range_task": {
+      "type": "object", 
+      "properties": {
+        "source_uri": {
+          "type": "string"
+        }, 
+        "source_generation": {
+          "type": "string"
+        }, 
+        "target_uri": {
+          "type": "string"
+        }, 
+        "upload_id": {
+          "type": "string"
+        }, 
+        "parts": {
+          "type": "array", 
+          "items": {
+            "type": "array", 
+            "items": {
+              "type": "integer"
+            }, 
+            "minItems": 3, 
+            "maxItems": 3
+          }, 
+          "minItems": 1
+        }, 
+        "total_parts": {
+          "type": "integer"
+        }, 
+        "checksum": {
+          "type": "boolean"
+        }, 
+        "streaming": {
+          "type": "boolean"
+        }, 
+        "max_workers": {
+          "type": "integer", 
+          "minimum": 1
+        }, 
+        "deadline": {
+          "type": ["number", "null"]
+        }
+      }, 
+      "required": ["source_uri", "source_generation", "target_uri", "upload_id", "parts", "total_parts", "checksum", "streaming", "max_workers"]
     }
   }, 
-  "required": ["objects"]
+  # a payload either lists objects to copy, refers to a manifest of objects to copy, or is a part range task 
+  # sent by a fan out coordinator
+  "oneOf": [
+    {"required": ["objects"]}, 
+    {"required": ["manifest"]}, 
+    {"required": ["part_range_task"]}
+  ]
 }
 
 LAMBDA_PAYLOAD_EXAMPLE = '''{ 
@@ -86,30 +303,53 @@ LAMBDA_PAYLOAD_EXAMPLE = '''{
       "source_uri": "gs://xxxx", 
       "target_uri": "s3://yyyy", 
       "checksum": "yes", 
-      "max_workers": 1
+      "max_workers": 1, 
+      "resumable": "true"
+    }, 
+    { 
+      "source_uri": "gs://abcd/events/dt={0:%Y-%m-%d}/*.json", 
+      "target_uri": "s3://pqrs/events/dt={0:%Y-%m-%d}/", 
+      "chunk_size": 102400, 
+      "streaming": "true"
     }, 
     { 
-      "source_uri": "gs://abcd", 
-      "target_uri": "s3://pqrs", 
-      "chunk_size": 102400
+      "source_uri": "gs://xxxx/large-object", 
+      "target_uri": "s3://yyyy/large-object", 
+      "fan_out": 8
     } 
   ], 
   "defaults": { 
     "checksum": "false",
+    "sync": "true", 
     "chunk_size": 1024, 
     "max_workers": 2, 
     "kms_key_arn": "XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX"
-  } 
+  }, 
+  "pool_size": 8, 
+  "engine": "threads"
 }'''
 
 s3_client = None
+s3_hedge_client = None # s3 client used by hedged copies of parts, with HEDGE_READ_TIMEOUT
+lambda_client = None
 gcs_client = None
+gcs_client_credentials = None # gcp credentials the current gcs client was created with
+gcp_credentials = None
+gcp_credentials_expiry = 0 # time after which gcp credentials are read again (e.g. to pick up a rotated secret)
+connection_pool_size = MAX_POOL_CONNECTIONS # number of http connections the s3 and gcs clients are created with
 lambda_schema_validator = None
+manifest_entry_validator = None
+stream_buffer_pool = None
+metrics_sink = None # any object with an `emit(dimensions, metrics, properties)` method, created on first use
+client_lock = threading.RLock() # guards lazy creation of clients and credentials by concurrent workers
+init_timings = {} # seconds spent on each cold start initialization step
+init_timings_logged = False
 
 # must be called once at startup, configures logging and sets global variables
-# we use global variables carefully and in order to improve performance
+# we use global variables carefully and in order to improve performance. clients, credentials and the 
+# payload validator are expensive to create, so they are created lazily and cached for warm invocations
 def _initializer(): 
-  global s3_client, gcs_client, lambda_schema_validator
+  global stream_buffer_pool
 
   # get the log level from environment variable
   log_level = os.environ.get('LOG_LEVEL', 'INFO')
@@ -120,51 +360,216 @@ def _initializer():
     logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=log_level)
 
   logging.info('Initializing Lambda runtime...')
+  stream_buffer_pool = _BufferPool(STREAM_BUFFER_SIZE, STREAM_BUFFER_COUNT)
+  init_timings['module_load'] = time.time() - module_load_start_time
+  logging.info('Initialization complete, AWS and GCS clients will be created when first used')
 
-  ## create aws s3 client
-  config = Config(
-    retries = {
-      'max_attempts': 3, # change to set boto3 s3 max retries count
-      'mode': 'legacy' # legacy mode is default 
-    }, 
-    proxies = {} # override any environment based proxy settings
-  )
-  s3_client = boto3.client('s3', config=config)
-
-  ## create gcp storage client
-  OAUTH_SCOPES = ['https://www.googleapis.com/auth/devstorage.read_write']
-  if os.environ.get('GCP_CREDENTIALS_FILE'): 
-    # if GCP_CREDENTIALS_FILE variable is set, use that to create gcp client
-    key_path = os.environ['GCP_CREDENTIALS_FILE']
-    gcp_credentials = service_account.Credentials.from_service_account_file(key_path, scopes=OAUTH_SCOPES)
-  else: 
-    # if not, lets fetch a service account credentials via aws secrets manager
-    # get value of 'GCP_CREDENTIALS_SECRET_ID' environment variable 
-    # gcp credentials must be stored in aws secrets manager as a json object with attribute:
-    #   - credentials: base64 encoded string containing the gcp service account credentials
-    secrets_mgr_id = os.environ.get('GCP_CREDENTIALS_SECRET_ID')
-    if (not secrets_mgr_id):
-      logging.error('No GCP credentials found. This Lambda function cannot create a GCP client, and therefore cannot continue. Goodbye!')
-      sys.exit(1)
-    else: 
-      logging.info('Fetching GCP credentials from AWS Secrets Manager (Secret Id: %s)...', secrets_mgr_id)
-      credentials_json = get_credentials_from_secrets_mgr(secrets_mgr_id) 
-      logging.info('Read GCP credentials json (size %s bytes)', len(credentials_json))
-      gcp_credentials = service_account.Credentials.from_service_account_info(json.loads(credentials_json), scopes=OAUTH_SCOPES)
-
-  gcp_proxy = os.environ.get('GCP_PROXY') # proxy server used for GCP connections only
-  if gcp_proxy: 
-    auth_session = google.auth.transport.requests.AuthorizedSession(credentials=gcp_credentials)
-    auth_session.proxies.update({'https': gcp_proxy})
-    gcs_client = storage.Client(credentials=gcp_credentials, _http=auth_session)
-  else: 
-    gcs_client = storage.Client(credentials=gcp_credentials)
+# records the time spent on a cold start initialization step
+class _InitTimer: 
+  def __init__(self, step: str): 
+    self.step = step
+
+  def __enter__(self): 
+    self.start_time = time.time()
+
+  def __exit__(self, *exc_info): 
+    init_timings[self.step] = init_timings.get(self.step, 0) + time.time() - self.start_time
+
+# logs the cold start timing breakdown once, after the first invocation has created everything it needed
+def _log_init_timings(): 
+  global init_timings_logged
+  if not init_timings_logged: 
+    init_timings_logged = True
+    logging.info('Cold start timing breakdown (seconds): %s', { step: round(seconds, 3) for step, seconds in init_timings.items() })
+
+# returns gcp service account credentials, read from GCP_CREDENTIALS_FILE or aws secrets manager. credentials
+# are cached for GCP_CREDENTIALS_TTL seconds, so warm invocations don't call secrets manager again
+def _get_gcp_credentials(): 
+  global gcp_credentials, gcp_credentials_expiry
+  with client_lock: 
+    if gcp_credentials is not None and time.time() < gcp_credentials_expiry: 
+      return gcp_credentials
+
+    with _InitTimer('gcp_credentials'): 
+      from google.oauth2 import service_account
+
+      OAUTH_SCOPES = ['https://www.googleapis.com/auth/devstorage.read_write']
+      if os.environ.get('GCP_CREDENTIALS_FILE'): 
+        # if GCP_CREDENTIALS_FILE variable is set, use that to create gcp client
+        key_path = os.environ['GCP_CREDENTIALS_FILE']
+        gcp_credentials = service_account.Credentials.from_service_account_file(key_path, scopes=OAUTH_SCOPES)
+      elif os.environ.get('STORAGE_EMULATOR_HOST'): 
+        # local gcs emulators (e.g. used by benchmark.py) don't authenticate requests
+        from google.auth.credentials import AnonymousCredentials
+        gcp_credentials = AnonymousCredentials()
+      else: 
+        # if not, lets fetch a service account credentials via aws secrets manager
+        # get value of 'GCP_CREDENTIALS_SECRET_ID' environment variable 
+        # gcp credentials must be stored in aws secrets manager as a json object with attribute:
+        #   - credentials: base64 encoded string containing the gcp service account credentials
+        secrets_mgr_id = os.environ.get('GCP_CREDENTIALS_SECRET_ID')
+        if (not secrets_mgr_id):
+          raise RuntimeError('No GCP credentials found (set GCP_CREDENTIALS_FILE or GCP_CREDENTIALS_SECRET_ID), a GCP client cannot be created')
+        logging.info('Fetching GCP credentials from AWS Secrets Manager (Secret Id: %s)...', secrets_mgr_id)
+        credentials_json = get_credentials_from_secrets_mgr(secrets_mgr_id) 
+        logging.info('Read GCP credentials json (size %s bytes)', len(credentials_json))
+        gcp_credentials = service_account.Credentials.from_service_account_info(json.loads(credentials_json), scopes=OAUTH_SCOPES)
+      gcp_credentials_expiry = time.time() + GCP_CREDENTIALS_TTL
+    return gcp_credentials
 
-  lambda_schema_validator = jsonschema.Draft202012Validator(LAMBDA_PAYLOAD_SCHEMA) 
-  logging.info('Initialization complete with AWS and GCS clients created')
+# grows the http connection pools of the s3 and gcs clients to at least `pool_connections`. an s3 client with 
+# a smaller pool is closed, and created again with the larger pool size when next used
+def _ensure_connection_pools(pool_connections: int): 
+  global s3_client, s3_hedge_client, connection_pool_size
+  with client_lock: 
+    if pool_connections > connection_pool_size: 
+      logging.info('Growing AWS and GCS client connection pools from %s to %s connections', connection_pool_size, pool_connections)
+      connection_pool_size = pool_connections
+      # the s3 client is created again (its connections closed), while the gcs client's authorized session is 
+      # kept with a larger connection pool mounted on it
+      if s3_client is not None: 
+        s3_client.close()
+        s3_client = None
+      if s3_hedge_client is not None: 
+        s3_hedge_client.close()
+        s3_hedge_client = None
+      if gcs_client is not None: 
+        _mount_gcs_adapter(gcs_client._http)
+
+# returns the s3 client, creating it when first used. the client is kept in a global variable, so warm 
+# lambda invocations reuse it along with its open (keep-alive) connections
+def _get_s3_client(): 
+  global s3_client
+  client = s3_client
+  if client is not None: 
+    return client
+  with client_lock: 
+    if s3_client is None: 
+      with _InitTimer('s3_client'): 
+        import boto3
+        from botocore.config import Config
+
+        config = Config(
+          retries = {
+            'max_attempts': 3, # change to set boto3 s3 max retries count
+            'mode': 'legacy' # legacy mode is default 
+          }, 
+          proxies = {}, # override any environment based proxy settings
+          max_pool_connections = connection_pool_size, 
+          tcp_keepalive = True
+        )
+        s3_client = boto3.client('s3', config=config)
+    return s3_client
+
+# returns the s3 client used by hedged copies of parts, which times out stalled connections and responses 
+# after HEDGE_READ_TIMEOUT seconds and leaves retries to `_call_with_retries`
+def _get_s3_hedge_client(): 
+  global s3_hedge_client
+  client = s3_hedge_client
+  if client is not None: 
+    return client
+  with client_lock: 
+    if s3_hedge_client is None: 
+      with _InitTimer('s3_hedge_client'): 
+        import boto3
+        from botocore.config import Config
+
+        config = Config(
+          connect_timeout = HEDGE_READ_TIMEOUT, 
+          read_timeout = HEDGE_READ_TIMEOUT, 
+          retries = {
+            'max_attempts': 0
+          }, 
+          proxies = {}, # override any environment based proxy settings
+          max_pool_connections = connection_pool_size, 
+          tcp_keepalive = True
+        )
+        s3_hedge_client = boto3.client('s3', config=config)
+    return s3_hedge_client
+
+# returns the lambda client used to invoke part range workers, creating it when first used. a worker may run 
+# for up to the lambda maximum timeout, and failed invocations are retried by `_invoke_part_range_worker`
+def _get_lambda_client(): 
+  global lambda_client
+  client = lambda_client
+  if client is not None: 
+    return client
+  with client_lock: 
+    if lambda_client is None: 
+      with _InitTimer('lambda_client'): 
+        import boto3
+        from botocore.config import Config
+
+        config = Config(
+          read_timeout = FAN_OUT_INVOKE_TIMEOUT, 
+          retries = {
+            'max_attempts': 0
+          }, 
+          proxies = {}, # override any environment based proxy settings
+          max_pool_connections = connection_pool_size, 
+          tcp_keepalive = True
+        )
+        lambda_client = boto3.client('lambda', config=config)
+    return lambda_client
+
+# returns the gcs client, creating it when first used (or when gcp credentials have been read again). the 
+# client uses an authorized session with a connection pool of the same size as the s3 client
+def _get_gcs_client(): 
+  global gcs_client, gcs_client_credentials
+  credentials = _get_gcp_credentials()
+  client = gcs_client
+  if client is not None and gcs_client_credentials is credentials: 
+    return client
+  with client_lock: 
+    if gcs_client is None or gcs_client_credentials is not credentials: 
+      with _InitTimer('gcs_client'): 
+        import google.auth.transport.requests
+        from google.cloud import storage
+
+        auth_session = google.auth.transport.requests.AuthorizedSession(credentials=credentials)
+        _mount_gcs_adapter(auth_session)
+        gcp_proxy = os.environ.get('GCP_PROXY') # proxy server used for GCP connections only
+        if gcp_proxy: 
+          auth_session.proxies.update({'https': gcp_proxy})
+        gcs_client = storage.Client(credentials=credentials, _http=auth_session)
+        gcs_client_credentials = credentials
+    return gcs_client
+
+# mounts an http adapter with a pool of `connection_pool_size` connections on the authorized session of the gcs 
+# client, closing connections of the adapter it replaces
+def _mount_gcs_adapter(auth_session): 
+  import requests.adapters
+  adapter = requests.adapters.HTTPAdapter(pool_connections=connection_pool_size, pool_maxsize=connection_pool_size)
+  for prefix in ['https://', 'http://']: 
+    replaced_adapter = auth_session.adapters.get(prefix)
+    auth_session.mount(prefix, adapter)
+    if replaced_adapter is not None and replaced_adapter is not adapter: 
+      replaced_adapter.close()
+
+# returns the lambda payload validator, compiling the json schema when first used
+def _get_payload_validator(): 
+  global lambda_schema_validator
+  if lambda_schema_validator is None: 
+    with _InitTimer('payload_validator'): 
+      import jsonschema
+      lambda_schema_validator = jsonschema.Draft202012Validator(LAMBDA_PAYLOAD_SCHEMA) 
+  return lambda_schema_validator
+
+# returns the validator of manifest entries. entries are object definitions of a payload's `objects`, validated 
+# more strictly than the payload schema: unknown options and max workers below 1 are rejected. the payload schema 
+# itself stays permissive for existing callers
+def _get_manifest_entry_validator(): 
+  global manifest_entry_validator
+  if manifest_entry_validator is None: 
+    import jsonschema
+    object_schema = LAMBDA_PAYLOAD_SCHEMA['properties']['objects']['items']
+    entry_properties = dict(object_schema['properties'], max_workers=dict(object_schema['properties']['max_workers'], minimum=1))
+    manifest_entry_validator = jsonschema.Draft202012Validator(dict(object_schema, properties=entry_properties, additionalProperties=False))
+  return manifest_entry_validator
 
 # fetch and base64 decode credentials from aws secrets manager
 def get_credentials_from_secrets_mgr(secret_id: str) -> str:
+  import boto3
   client = boto3.client('secretsmanager')
   response = client.get_secret_value(SecretId=secret_id)
   credentials_base64 = json.loads(response['SecretString'])['credentials']
@@ -179,92 +584,693 @@ def _split_uri(uri: str) -> tuple:
   object_name = parsed_uri.path.lstrip('/') 
   return bucket_name, object_name
 
-# copy gcs object to s3 using multi-part upload
-def _copy_mpu(gcs_object: str, s3_bucket_name: str, s3_object_name: str, gcs_object_size: int, total_parts: int, chunk_size: int, max_workers: int, checksum: bool, kms_key_arn: str): 
+# interprets boolean-like payload and cli values (e.g. "yes", "true", "1")
+def _is_true(value) -> bool: 
+  return value in [True, 'True', 'true', 'Yes', 'yes', 'Y', 'y', '1']
+
+# returns the crc32c checksum (int) as a base64 encoded big endian 32 bit value, as used by s3 and gcs
+def _crc32c_b64(crc_checksum: int) -> str: 
+  return base64.b64encode(crc_checksum.to_bytes(4, byteorder='big', signed=False)).decode('ascii')
+
+# crc32c combine math (as in zlib's crc32_combine), used to compute the crc32c of a whole object from crc32c 
+# checksums of its parts without reading its data again. polynomials are bit reflected, so x^0 is 1 << 31
+CRC32C_POLY = 0x82F63B78
+
+# multiplies polynomials a and b modulo the crc32c polynomial
+def _crc32c_multmodp(a: int, b: int) -> int: 
+  m = 1 << 31
+  product = 0
+  while a: 
+    if a & m: 
+      product ^= b
+      a ^= m
+    m >>= 1
+    b = (b >> 1) ^ CRC32C_POLY if b & 1 else b >> 1
+  return product
+
+# x^(2^k) modulo the crc32c polynomial, for k = 0..31
+CRC32C_X2N_TABLE = [1 << 30]
+for _ in range(31): 
+  CRC32C_X2N_TABLE.append(_crc32c_multmodp(CRC32C_X2N_TABLE[-1], CRC32C_X2N_TABLE[-1]))
+
+# returns the crc32c checksum of the concatenation of two byte sequences, from their checksums and the 
+# length of the second sequence
+def _crc32c_combine(crc1: int, crc2: int, len2: int) -> int: 
+  x8n = 1 << 31 # x^(8 * len2) modulo the crc32c polynomial
+  k = 3
+  while len2: 
+    if len2 & 1: 
+      x8n = _crc32c_multmodp(CRC32C_X2N_TABLE[k & 31], x8n)
+    len2 >>= 1
+    k += 1
+  return _crc32c_multmodp(x8n, crc1) ^ crc2
+
+# returns the base64 crc32c checksum of an object from the base64 crc32c checksums of its parts (ordered by 
+# part number), or None if a part checksum is missing. all parts except the last are `chunk_size` bytes
+def _combine_part_crc32c(copy_parts: list, object_size: int, chunk_size: int) -> str: 
+  if not copy_parts or not all(copy_part and copy_part.get('ChecksumCRC32C') for copy_part in copy_parts): 
+    return None
+  object_crc32c = 0 # crc32c of no data
+  for part_index, copy_part in enumerate(copy_parts): 
+    part_size = min(chunk_size, object_size - part_index * chunk_size) if len(copy_parts) > 1 else object_size
+    part_crc32c = int.from_bytes(base64.b64decode(copy_part['ChecksumCRC32C']), byteorder='big')
+    object_crc32c = _crc32c_combine(object_crc32c, part_crc32c, part_size)
+  return _crc32c_b64(object_crc32c)
+
+
+# tracks throughput of copied parts (bytes per second of a single worker), as an exponentially weighted 
+# moving average. kept in a global so warm lambda invocations keep planning with what was observed earlier
+class _ThroughputStats: 
+  def __init__(self, weight: float = 0.2): 
+    self.weight = weight
+    self.bytes_per_second = None
+    self._lock = threading.Lock()
+
+  def record(self, num_bytes: int, seconds: float): 
+    if seconds <= 0: 
+      return
+    sample = num_bytes / seconds
+    with self._lock: 
+      if self.bytes_per_second is None: 
+        self.bytes_per_second = sample
+      else: 
+        self.bytes_per_second += self.weight * (sample - self.bytes_per_second)
+
+part_throughput = _ThroughputStats()
+
+# timings (in seconds), byte and retry counts of an object copy. each part copy records its own metrics, 
+# which are added to the metrics of its object when the part is done
+class _CopyMetrics: 
+  COUNTERS = ['bytes_copied', 'parts_copied', 'gcs_read_time', 'crc_time', 's3_upload_time', 'queue_wait_time', 'gcs_retries', 's3_retries', 'hedged_parts', 'compress_time']
+  MAXIMUMS = ['max_part_time', 'max_queue_wait_time']
+
+  def __init__(self): 
+    self.values = dict.fromkeys(self.COUNTERS + self.MAXIMUMS, 0)
+    self._lock = threading.Lock()
+
+  def get(self, name: str): 
+    return self.values[name]
+
+  def add(self, name: str, value): 
+    with self._lock: 
+      if name in self.MAXIMUMS: 
+        self.values[name] = max(self.values[name], value)
+      else: 
+        self.values[name] += value
+
+  def merge(self, other: '_CopyMetrics'): 
+    for name, value in other.values.items(): 
+      self.add(name, value)
+
+  # adds the time spent in the `with` block to the named metric, including when the block raises
+  @contextlib.contextmanager
+  def timer(self, name: str): 
+    start_time = time.perf_counter()
+    try: 
+      yield
+    finally: 
+      self.add(name, time.perf_counter() - start_time)
+
+  # returns metrics reported in the copy response of an object
+  def report(self, execution_time: float) -> dict: 
+    report = { name: round(value, 3) for name, value in self.values.items() }
+    report['mb_per_sec'] = round(self.values['bytes_copied'] / (1024 * 1024) / execution_time, 3) if execution_time > 0 else 0
+    report['peak_memory_mb'] = _peak_memory_mb()
+    return report
+
+# returns peak resident memory of this process in MB (None if not known on this platform). lambda reuses 
+# the process for warm invocations, so this is the peak since the execution environment started
+def _peak_memory_mb() -> float: 
+  try: 
+    import resource
+  except ImportError: 
+    return None
+  max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  if sys.platform == 'darwin': 
+    max_rss /= 1024 # reported in bytes on macos, and in KB on linux
+  return round(max_rss / 1024, 1)
+
+# raised by a copy of a part which was given up because another copy of the part has completed
+class _CopyCancelled(Exception): 
+  pass
+
+# returns false for errors which won't go away by retrying, i.e. http 4xx client errors such as a failed 
+# generation or etag precondition, a missing object or upload, or missing permissions (and copies which were 
+# cancelled), except timeouts and throttling
+def _is_retryable(e: Exception) -> bool: 
+  if isinstance(e, _CopyCancelled): 
+    return False
+  status = getattr(e, 'code', None) # http status of google api errors
+  response = getattr(e, 'response', None)
+  if isinstance(response, dict): 
+    status = response.get('ResponseMetadata', {}).get('HTTPStatusCode') # http status of botocore client errors
+  return not (isinstance(status, int) and 400 <= status < 500 and status not in [408, 429])
+
+# calls `fn` until it succeeds or RETRY_ATTEMPTS attempts have failed, using exponential backoff with jitter 
+# between attempts. each retry is counted in the `retry_metric` of `metrics`
+def _call_with_retries(fn, description: str, metrics: _CopyMetrics = None, retry_metric: str = None): 
+  for attempt in range(1, RETRY_ATTEMPTS + 1): 
+    try: 
+      return fn()
+    except Exception as e:
+      if attempt >= RETRY_ATTEMPTS or not _is_retryable(e): 
+        raise
+      delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+      logging.warning('Encountered an error %s (attempt %s of %s), retrying after %.2f seconds: %s', description, attempt, RETRY_ATTEMPTS, delay, e)
+      if metrics is not None: 
+        metrics.add(retry_metric, 1)
+      time.sleep(delay)
+
+# reads a gcs object, or a byte range of it, retrying failed and short reads. reads are pinned to the 
+# generation of the object when the copy was prepared, so a retried read can't return data of a newer 
+# version of the object (the copy fails instead)
+def _read_gcs(gcs_object, metrics: _CopyMetrics, start_byte: int = None, end_byte: int = None, timeout: float = None) -> bytes: 
+  timeout_args = {} if timeout is None else dict(timeout=timeout) # the gcs client's default timeout otherwise
+  if start_byte is None: 
+    expected_length = gcs_object.size
+    description = 'reading GCS object'
+  else: 
+    expected_length = end_byte - start_byte + 1
+    description = f'reading GCS object range (start byte: {start_byte}; end byte: {end_byte})'
+
+  def read(): 
+    with metrics.timer('gcs_read_time'): 
+      data = gcs_object.download_as_bytes(start=start_byte, end=end_byte, if_generation_match=gcs_object.generation, **timeout_args) 
+    if len(data) != expected_length: 
+      raise IOError(f'Read {len(data)} bytes {description}, expected {expected_length}')
+    return data
+  return _call_with_retries(read, description, metrics, 'gcs_retries')
+
+# units of metrics written to the metrics sink, as named by cloudwatch
+METRIC_UNITS = {
+  'bytes_copied': 'Bytes', 
+  'mb_per_sec': 'Megabytes/Second', 
+  'peak_memory_mb': 'Megabytes', 
+  'execution_time': 'Seconds'
+}
+
+# writes metrics as cloudwatch embedded metric format (emf) json lines to a stream. in lambda, emf lines 
+# written to stdout are turned into cloudwatch metrics by cloudwatch logs, without any api calls
+class _EmfMetricsSink: 
+  def __init__(self, stream, namespace: str = METRICS_NAMESPACE): 
+    self.stream = stream
+    self.namespace = namespace
+    self._lock = threading.Lock()
+
+  def emit(self, dimensions: dict, metrics: dict, properties: dict = None): 
+    metrics = { name: value for name, value in metrics.items() if value is not None }
+    metric_defs = []
+    for name in metrics: 
+      unit = METRIC_UNITS.get(name) or ('Seconds' if name.endswith('_time') else 'Count')
+      metric_defs.append({'Name': name, 'Unit': unit})
+    record = {
+      '_aws': {
+        'Timestamp': int(time.time() * 1000), 
+        'CloudWatchMetrics': [{'Namespace': self.namespace, 'Dimensions': [list(dimensions)], 'Metrics': metric_defs}]
+      }
+    }
+    record.update(properties or {})
+    record.update(dimensions)
+    record.update(metrics)
+    with self._lock: 
+      self.stream.write(json.dumps(record) + '\n')
+      self.stream.flush()
+
+class _NullMetricsSink: 
+  def emit(self, dimensions: dict, metrics: dict, properties: dict = None): 
+    pass
+
+# returns the metrics sink, creating the one selected by METRICS_SINK when first used
+def _get_metrics_sink(): 
+  global metrics_sink
+  with client_lock: 
+    if metrics_sink is None: 
+      if METRICS_SINK == 'emf': 
+        metrics_sink = _EmfMetricsSink(sys.stdout)
+      elif METRICS_SINK == 'file': 
+        metrics_sink = _EmfMetricsSink(open(os.environ.get('METRICS_FILE', 'copy-metrics.jsonl'), 'at'))
+      else: 
+        metrics_sink = _NullMetricsSink()
+    return metrics_sink
+
+# writes metrics to the metrics sink. metrics are best effort, so a failing sink doesn't fail copies
+def _emit_metrics(dimensions: dict, metrics: dict, properties: dict = None): 
+  try: 
+    _get_metrics_sink().emit(dimensions, metrics, properties)
+  except Exception as e:
+    logging.warning('Unable to emit copy metrics: %s', e)
+
+# returns memory (in bytes) available to this function, using the lambda configured memory size if set
+def _available_memory() -> int: 
+  if os.environ.get('AWS_LAMBDA_FUNCTION_MEMORY_SIZE'): 
+    return int(os.environ['AWS_LAMBDA_FUNCTION_MEMORY_SIZE']) * 1024 * 1024
+  try: 
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+  except (ValueError, OSError, AttributeError): 
+    return 1769 * 1024 * 1024 # size of our lambda function
+
+# plans how an object of the given size is copied, returns a tuple of (chunk_size, max_workers, total_parts). 
+# chunk_size and max_workers may be pinned by the caller, otherwise they are chosen from the object size, 
+# function memory and vcpus and part throughput observed so far. s3 part size and part count limits always apply
+def _plan_copy(object_size: int, chunk_size: int = None, max_workers: int = None, streaming: bool = False, engine: str = DEFAULT_ENGINE) -> tuple: 
+  if object_size > S3_MAX_OBJECT_SIZE: 
+    raise ValueError(f'Object size of {object_size} bytes exceeds S3 maximum object size of {S3_MAX_OBJECT_SIZE} bytes')
+
+  # smallest part size which keeps the object within s3's max parts limit
+  min_chunk_size = max(S3_MIN_PART_SIZE, -(-object_size // S3_MAX_PARTS))
+  memory = _available_memory()
+
+  if chunk_size is None: 
+    if part_throughput.bytes_per_second: 
+      chunk_size = int(part_throughput.bytes_per_second * PLANNER_TARGET_PART_SECONDS)
+    else: 
+      chunk_size = DEFAULT_CHUNK_SIZE
+    if not streaming: 
+      # leave room for at least two parts in memory
+      chunk_size = min(chunk_size, int(memory * PLANNER_MEMORY_FRACTION) // 2)
+    chunk_size = -(-chunk_size // (1024 * 1024)) * 1024 * 1024 # round up to whole MBs
+  elif object_size >= S3_MIN_PART_SIZE and object_size > chunk_size and chunk_size < min_chunk_size: 
+    logging.warning('Chunk size of %s bytes is below S3 part size limits for an object of %s bytes, using %s bytes instead', chunk_size, object_size, min_chunk_size)
+  chunk_size = min(max(chunk_size, min_chunk_size), S3_MAX_PART_SIZE)
+
+  # s3 mpu requires parts to be atleast 5Mb, so if object size is less than 5Mb, 
+  # or less than chunk size, we direct copy the object
+  if object_size < S3_MIN_PART_SIZE or object_size <= chunk_size: 
+    total_parts = 1
+  else: 
+    total_parts = -(-object_size // chunk_size) # ceiling division, so there is no empty trailing part
+
+  if max_workers is None: 
+    if engine == 'asyncio': 
+      max_workers = ASYNC_POOL_SIZE # asyncio transfers don't need a thread each
+    else: 
+      max_workers = (os.cpu_count() or 1) * PLANNER_WORKERS_PER_VCPU
+    if not streaming: 
+      # every in-memory part copy holds a full chunk
+      max_workers = min(max_workers, int(memory * PLANNER_MEMORY_FRACTION) // chunk_size)
+  max_workers = max(1, min(max_workers, total_parts))
+
+  logging.info('Planned copy of %s bytes using chunk size %s, %s parts and %s max workers (observed part throughput: %s bytes/s)', 
+               object_size, chunk_size, total_parts, max_workers, part_throughput.bytes_per_second)
+  return chunk_size, max_workers, total_parts
+
+
+# fixed number of reusable, fixed size buffers shared by all streaming copies. buffers are allocated
+# lazily and `acquire` blocks while all of them are in use, which bounds memory used by object data
+class _BufferPool: 
+  def __init__(self, buffer_size: int, buffer_count: int): 
+    self.buffer_size = buffer_size
+    self.buffer_count = max(1, buffer_count)
+    self._free = queue.LifoQueue()
+    self._allocated = 0
+    self._lock = threading.Lock()
+
+  def acquire(self) -> bytearray: 
+    with self._lock: 
+      if self._free.empty() and self._allocated < self.buffer_count: 
+        self._allocated += 1
+        return bytearray(self.buffer_size)
+    return self._free.get()
+
+  def release(self, buffer: bytearray): 
+    self._free.put(buffer)
+
+
+# file-like writer used by gcs `download_to_file` to fill a buffer from the buffer pool in place
+class _BufferWriter: 
+  def __init__(self, buffer: bytearray): 
+    self._view = memoryview(buffer)
+    self.length = 0
+
+  def write(self, data) -> int: 
+    n = len(data)
+    self._view[self.length:self.length + n] = data
+    self.length += n
+    return n
+
+
+# read-only, seekable file-like view over a byte range of a gcs object, used as the `Body` of s3 uploads. 
+# data is fetched with ranged gcs reads of one pool buffer at a time (only one buffer is held at any time), 
+# and crc32c is computed incrementally as bytes are handed to the uploader. seeking (e.g. when boto3 
+# rewinds the body to retry an upload) simply re-reads the range from gcs
+class _GcsRangeReader: 
+  def __init__(self, gcs_object, start_byte: int, end_byte: int, buffer_pool: _BufferPool, metrics: _CopyMetrics = None, 
+               cancelled: threading.Event = None, timeout: float = None): 
+    self._gcs_object = gcs_object
+    self._cancelled = cancelled # checked before each buffer is read, to stop copies which are no longer needed
+    self._timeout_args = {} if timeout is None else dict(timeout=timeout)
+    self._metrics = metrics if metrics is not None else _CopyMetrics()
+    self._start_byte = start_byte
+    self._length = end_byte - start_byte + 1
+    self._buffer_pool = buffer_pool
+    self._buffer = None
+    self._buffer_offset = 0 # position (relative to range start) of first byte held in buffer
+    self._buffer_length = 0
+    self._pos = 0
+    self._crc = 0
+    self._crc_pos = 0 # number of leading bytes of the range included in _crc
+
+  # crc32c of the full range, available once all bytes have been read in order
+  @property
+  def crc32c(self) -> int: 
+    return self._crc if self._crc_pos == self._length else None
+
+  def readable(self) -> bool: 
+    return True
+
+  def seekable(self) -> bool: 
+    return True
+
+  def tell(self) -> int: 
+    return self._pos
+
+  def seek(self, offset: int, whence: int = os.SEEK_SET) -> int: 
+    if whence == os.SEEK_CUR: 
+      offset += self._pos
+    elif whence == os.SEEK_END: 
+      offset += self._length
+    self._pos = min(max(0, offset), self._length)
+    if self._pos < self._crc_pos: 
+      # data will be read again, so start a new checksum
+      self._crc = 0
+      self._crc_pos = 0
+    return self._pos
+
+  def read(self, size: int = -1) -> bytes: 
+    if self._pos >= self._length: 
+      self._release_buffer() # release buffer as soon as the range is consumed
+      return b''
+    if not (self._buffer_offset <= self._pos < self._buffer_offset + self._buffer_length): 
+      self._fill_buffer()
+    buffer_pos = self._pos - self._buffer_offset
+    available = self._buffer_length - buffer_pos
+    n = available if size is None or size < 0 else min(size, available)
+    data = bytes(self._buffer[buffer_pos:buffer_pos + n])
+    if self._pos == self._crc_pos: 
+      with self._metrics.timer('crc_time'): 
+        self._crc = crc32c.crc32c(data, self._crc)
+      self._crc_pos += n
+    self._pos += n
+    return data
+
+  def close(self): 
+    self._release_buffer()
+
+  def __enter__(self): 
+    return self
+
+  def __exit__(self, *exc_info): 
+    self.close()
+
+  def _fill_buffer(self): 
+    if self._cancelled is not None and self._cancelled.is_set(): 
+      raise _CopyCancelled('Copy of GCS object range was cancelled')
+    self._release_buffer()
+    self._buffer = self._buffer_pool.acquire()
+    read_length = min(len(self._buffer), self._length - self._pos)
+    start_byte = self._start_byte + self._pos
+    end_byte = start_byte + read_length - 1 # end byte index is inclusive
+    writer = _call_with_retries(lambda: self._download(start_byte, end_byte), 
+                                f'reading GCS object range (start byte: {start_byte}; end byte: {end_byte})', self._metrics, 'gcs_retries')
+    self._buffer_offset = self._pos
+    self._buffer_length = writer.length
+
+  # reads a byte range into the buffer (from its start), pinned to the generation of the object like `_read_gcs`
+  def _download(self, start_byte: int, end_byte: int) -> _BufferWriter: 
+    writer = _BufferWriter(self._buffer)
+    # checksum of a byte range can't be validated by gcs client, we compute crc32c ourselves
+    with self._metrics.timer('gcs_read_time'): 
+      self._gcs_object.download_to_file(writer, start=start_byte, end=end_byte, checksum=None, if_generation_match=self._gcs_object.generation, 
+                                        **self._timeout_args)
+    if writer.length != end_byte - start_byte + 1: 
+      raise IOError(f'Read {writer.length} bytes from GCS object range (start byte: {start_byte}; end byte: {end_byte}), expected {end_byte - start_byte + 1}')
+    return writer
+
+  def _release_buffer(self): 
+    if self._buffer is not None: 
+      self._buffer_pool.release(self._buffer)
+      self._buffer = None
+      self._buffer_length = 0
+
+
+# returns s3 server side encryption arguments, using kms if a key arn is provided, or s3 managed keys otherwise
+def _sse_args(kms_key_arn: str) -> dict: 
+  if isinstance(kms_key_arn, str) and kms_key_arn.startswith('arn:aws'): 
+    return {'ServerSideEncryption': 'aws:kms', 'SSEKMSKeyId': kms_key_arn}
+  else: 
+    return {'ServerSideEncryption': 'AES256'}
+
+# create an s3 multi-part upload for the target object, returns the upload id
+def _create_mpu(s3_bucket_name: str, s3_object_name: str, checksum: bool, kms_key_arn: str, metadata: dict = None) -> str: 
   create_mpu_args = {
     'Bucket': s3_bucket_name,
     'Key': s3_object_name
   }
+  if metadata: 
+    create_mpu_args.update({'Metadata': metadata})
   if checksum: 
     create_mpu_args.update({'ChecksumAlgorithm': 'CRC32C'})
-
-  if isinstance(kms_key_arn, str) and kms_key_arn.startswith('arn:aws'): 
-    create_mpu_args.update({'ServerSideEncryption': 'aws:kms', 'SSEKMSKeyId': kms_key_arn})
-  else: 
-    create_mpu_args.update({'ServerSideEncryption': 'AES256'})
+  create_mpu_args.update(_sse_args(kms_key_arn))
 
   # call s3 create_multipart_upload() with arguments
-  mpu = s3_client.create_multipart_upload(**create_mpu_args)
-
-  mpu_id = mpu['UploadId']
-  mpu_parts = [None] * total_parts
-
-  if (max_workers <= 1):
-    # perform a single threaded copy
-    logging.info('Using single threaded multi-part object copy because max-workers is less than or equal to 1')
-    for part_index in range(total_parts):
-      start_byte = part_index * chunk_size
-      end_byte = min((part_index + 1) * chunk_size, gcs_object_size) - 1 # end byte index is inclusive, so we minus 1
-      part_num = part_index + 1 # part numbers start at 1
-      copy_part_response = _copy_part(gcs_object, s3_bucket_name, s3_object_name, part_num, total_parts, mpu_id, start_byte, end_byte, checksum)
-      logging.info('copy_part response: %s', copy_part_response)
-      mpu_parts[part_index] = copy_part_response
-  else: 
-    # perform a multi-threaded copy
-    logging.info('Using multi-threaded multi-part object copy with max-workers equal to %s', max_workers)
-    futures = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers = max_workers) as executor:
-      for part_index in range(total_parts):
-        start_byte = part_index * chunk_size
-        end_byte = min((part_index + 1) * chunk_size, gcs_object_size) - 1 # end byte index is inclusive, so we minus 1
-        part_num = part_index + 1 # part numbers start at 1
-        futures.append(executor.submit(_copy_part, gcs_object, s3_bucket_name, s3_object_name, part_num, total_parts, mpu_id, start_byte, end_byte, checksum))
-      
-      for future in concurrent.futures.as_completed(futures):
-        try: 
-          copy_part_response = future.result()
-        except Exception as e:
-          logging.error('One of the multi-part object copy threads returned an exception [%s]. Aborting copy operation now!', e)
-          # cancel all pending tasks and bubble up the exception
-          executor.shutdown(wait=False, cancel_futures=True)
-          raise e
-        mpu_parts[copy_part_response['PartNumber']-1] = copy_part_response
-        logging.info('copy_part response: %s', copy_part_response)
-
-  s3_response = s3_client.complete_multipart_upload(Bucket=s3_bucket_name, Key=s3_object_name, MultipartUpload={'Parts': mpu_parts}, UploadId=mpu_id)
+  mpu = _get_s3_client().create_multipart_upload(**create_mpu_args)
+  return mpu['UploadId']
+
+# complete an s3 multi-part upload using the list of uploaded parts (ordered by part number), returns the s3 response
+def _complete_mpu(s3_bucket_name: str, s3_object_name: str, mpu_id: str, mpu_parts: list): 
+  s3_response = _get_s3_client().complete_multipart_upload(Bucket=s3_bucket_name, Key=s3_object_name, MultipartUpload={'Parts': mpu_parts}, UploadId=mpu_id)
   logging.info('S3 complete_multipart_upload response: %s', s3_response)
+  return s3_response
+
+# abort an s3 multi-part upload, so storage used by its uploaded parts is released
+def _abort_mpu(s3_bucket_name: str, s3_object_name: str, mpu_id: str): 
+  try: 
+    _get_s3_client().abort_multipart_upload(Bucket=s3_bucket_name, Key=s3_object_name, UploadId=mpu_id)
+    logging.info('Aborted S3 multi-part upload %s of s3://%s/%s', mpu_id, s3_bucket_name, s3_object_name)
+  except Exception as e:
+    logging.error('Encountered an error aborting S3 multi-part upload %s of s3://%s/%s: %s', mpu_id, s3_bucket_name, s3_object_name, e)
+
+# returns parts already uploaded to an s3 multi-part upload as a dict keyed by part number, 
+# or None if the upload no longer exists (e.g. it was completed or aborted)
+def _list_mpu_parts(s3_bucket_name: str, s3_object_name: str, mpu_id: str) -> dict: 
+  uploaded_parts = {}
+  try: 
+    for page in _get_s3_client().get_paginator('list_parts').paginate(Bucket=s3_bucket_name, Key=s3_object_name, UploadId=mpu_id): 
+      for part in page.get('Parts', []): 
+        uploaded_parts[part['PartNumber']] = part
+  except _get_s3_client().exceptions.NoSuchUpload: 
+    return None
+  return uploaded_parts
+
+
+# a resumable multi-part copy records its progress in a ledger, so a later invocation can upload only the
+# missing parts. the ledger is a json sidecar object stored next to the s3 target object, or a local file 
+# under COPY_LEDGER_DIR if that environment variable is set (e.g. when running from a terminal)
+LEDGER_SUFFIX = '.copy-ledger.json'
+
+def _ledger_path(s3_bucket_name: str, s3_object_name: str) -> str: 
+  return os.path.join(os.environ['COPY_LEDGER_DIR'], s3_bucket_name, s3_object_name + LEDGER_SUFFIX)
+
+def _load_ledger(s3_bucket_name: str, s3_object_name: str) -> dict: 
+  if os.environ.get('COPY_LEDGER_DIR'): 
+    try: 
+      with open(_ledger_path(s3_bucket_name, s3_object_name), 'rt') as ledger_file: 
+        return json.load(ledger_file)
+    except FileNotFoundError: 
+      return None
+  try: 
+    s3_response = _get_s3_client().get_object(Bucket=s3_bucket_name, Key=s3_object_name + LEDGER_SUFFIX)
+  except _get_s3_client().exceptions.ClientError as e:
+    # without s3:ListBucket on the target bucket (as the lambda role has), s3 answers a get of a missing 
+    # key with access denied rather than no such key
+    error_status = e.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+    if e.response.get('Error', {}).get('Code') in ['NoSuchKey', '404', 'AccessDenied'] or error_status in [403, 404]: 
+      logging.info('No copy ledger found for s3://%s/%s: %s', s3_bucket_name, s3_object_name, e)
+      return None
+    raise
+  return json.loads(s3_response['Body'].read())
+
+def _save_ledger(s3_bucket_name: str, s3_object_name: str, ledger: dict, kms_key_arn: str): 
+  ledger_json = json.dumps(ledger)
+  if os.environ.get('COPY_LEDGER_DIR'): 
+    ledger_path = _ledger_path(s3_bucket_name, s3_object_name)
+    os.makedirs(os.path.dirname(ledger_path), exist_ok=True)
+    with open(ledger_path + '.tmp', 'wt') as ledger_file: 
+      ledger_file.write(ledger_json)
+    os.replace(ledger_path + '.tmp', ledger_path) # atomically replace previous ledger
+  else: 
+    _get_s3_client().put_object(Bucket=s3_bucket_name, Key=s3_object_name + LEDGER_SUFFIX, Body=ledger_json.encode('utf-8'), 
+                         ContentType='application/json', **_sse_args(kms_key_arn))
+
+def _delete_ledger(s3_bucket_name: str, s3_object_name: str): 
+  try: 
+    if os.environ.get('COPY_LEDGER_DIR'): 
+      os.remove(_ledger_path(s3_bucket_name, s3_object_name))
+    else: 
+      _get_s3_client().delete_object(Bucket=s3_bucket_name, Key=s3_object_name + LEDGER_SUFFIX)
+  except Exception as e:
+    logging.warning('Unable to delete copy ledger of s3://%s/%s: %s', s3_bucket_name, s3_object_name, e)
+
+# resumes the multi-part upload recorded in the target object's ledger if it is still valid for the source
+# object, or creates a new multi-part upload and ledger otherwise. returns the ledger, whose `parts` holds 
+# parts already uploaded (keyed by part number as a string). parts listed by s3 are authoritative, so parts 
+# uploaded after the ledger was last saved are resumed too
+def _resume_or_create_mpu(copy_ctx: dict) -> dict: 
+  s3_bucket_name = copy_ctx['s3_bucket_name']
+  s3_object_name = copy_ctx['s3_object_name']
+  source = dict(
+    source_uri = copy_ctx['source_object_uri'], 
+    source_generation = copy_ctx['source_generation'], 
+    source_etag = copy_ctx['source_etag'], 
+    object_size = copy_ctx['object_size'], 
+    checksum = copy_ctx['checksum']
+  )
+
+  ledger = _load_ledger(s3_bucket_name, s3_object_name)
+  if ledger: 
+    if all(ledger.get(name) == value for name, value in source.items()): 
+      uploaded_parts = _list_mpu_parts(s3_bucket_name, s3_object_name, ledger['upload_id'])
+      if uploaded_parts is not None: 
+        # only trust parts s3 has with the size parts of this copy have (and a checksum, if the copy has one)
+        recorded_parts, ledger['parts'] = ledger['parts'], {}
+        for part_num, part in uploaded_parts.items(): 
+          part_size = min(ledger['chunk_size'], ledger['object_size'] - (part_num - 1) * ledger['chunk_size'])
+          if part.get('Size', part_size) != part_size: 
+            continue
+          resumed_part = {"ETag": part['ETag'], "PartNumber": part_num}
+          if ledger['checksum']: 
+            recorded_part = recorded_parts.get(str(part_num), {})
+            resumed_part['ChecksumCRC32C'] = part.get('ChecksumCRC32C') or (recorded_part.get('ChecksumCRC32C') if recorded_part.get('ETag') == part['ETag'] else None)
+            if not resumed_part['ChecksumCRC32C']: 
+              continue
+          ledger['parts'][str(part_num)] = resumed_part
+        logging.info('Resuming S3 multi-part upload %s with %s parts already uploaded', ledger['upload_id'], len(ledger['parts']))
+        return ledger
+      logging.info('S3 multi-part upload %s recorded in copy ledger no longer exists, starting a new multi-part upload', ledger['upload_id'])
+    else: 
+      logging.info('GCS source object or copy settings changed since copy ledger was written, starting a new multi-part upload')
+      _abort_mpu(s3_bucket_name, s3_object_name, ledger['upload_id'])
+
+  ledger = dict(
+    upload_id = _create_mpu(s3_bucket_name, s3_object_name, copy_ctx['checksum'], copy_ctx['kms_key_arn'], copy_ctx['target_metadata']), 
+    chunk_size = copy_ctx['chunk_size'], 
+    parts = {}, 
+    **source
+  )
+  _save_ledger(s3_bucket_name, s3_object_name, ledger, copy_ctx['kms_key_arn'])
+  return ledger
+
+# records parts uploaded by a resumable copy in its ledger. rather than saving the whole ledger after every part 
+# (which would make ledger writes grow with the square of the number of parts, and make part copies wait on 
+# them), the ledger is saved by a background thread, at most one save at a time, once enough parts or time have 
+# passed since the last save. a failure to save the ledger doesn't fail the copy, parts s3 has are listed when 
+# the copy is resumed (see `_resume_or_create_mpu`)
+class _LedgerWriter: 
+  def __init__(self, copy_ctx: dict, ledger: dict): 
+    self.copy_ctx = copy_ctx
+    self.ledger = ledger
+    self.lock = threading.Lock()
+    self.saver = None # thread saving the ledger, while a save is in progress
+    self.unsaved_parts = 0
+    self.last_save_time = time.time()
+
+  def record(self, copy_part_responses: list): 
+    with self.lock: 
+      for copy_part_response in copy_part_responses: 
+        self.ledger['parts'][str(copy_part_response['PartNumber'])] = copy_part_response
+      self.unsaved_parts += len(copy_part_responses)
+      if self.saver is None and (self.unsaved_parts >= LEDGER_SAVE_PARTS or time.time() - self.last_save_time >= LEDGER_SAVE_INTERVAL): 
+        self.saver = threading.Thread(target=self._save, daemon=True)
+        self.saver.start()
+
+  # saves a snapshot of the ledger, so parts recorded meanwhile don't wait on the save
+  def _save(self): 
+    with self.lock: 
+      ledger = dict(self.ledger, parts=dict(self.ledger['parts']))
+      saved_parts, self.unsaved_parts = self.unsaved_parts, 0
+      self.last_save_time = time.time()
+    try: 
+      _save_ledger(self.copy_ctx['s3_bucket_name'], self.copy_ctx['s3_object_name'], ledger, self.copy_ctx['kms_key_arn'])
+    except Exception as e:
+      logging.warning('Unable to save copy ledger with %s parts: %s', len(ledger['parts']), e)
+      with self.lock: 
+        self.unsaved_parts += saved_parts
+    finally: 
+      with self.lock: 
+        if self.saver is threading.current_thread(): 
+          self.saver = None
+
+  def _wait(self): 
+    with self.lock: 
+      saver = self.saver
+    if saver is not None: 
+      saver.join()
+
+  # waits for a save in progress, then saves parts recorded since. called once a copy fails or stops
+  def flush(self): 
+    self._wait()
+    with self.lock: 
+      if self.unsaved_parts == 0: 
+        return
+    self._save()
+
+  # waits for a save in progress, so that it doesn't write the ledger again after the copy completed and deleted it
+  def close(self): 
+    self._wait()
+
+# generates (part_num, start_byte, end_byte) tuples for each part of a multi-part copy
+def _iter_part_ranges(object_size: int, total_parts: int, chunk_size: int): 
+  for part_index in range(total_parts):
+    start_byte = part_index * chunk_size
+    end_byte = min((part_index + 1) * chunk_size, object_size) - 1 # end byte index is inclusive, so we minus 1
+    part_num = part_index + 1 # part numbers start at 1
+    yield part_num, start_byte, end_byte
 
 # copy a chunk of a gcs object to s3 using multi-part upload
 # if checksum is true, we will use ultrafast crc32c checksum algorithm
-def _copy_part(gcs_object, s3_bucket_name, s3_object_name, part_num: int, total_parts: int, mpu_id: int, start_byte: int, end_byte: int, checksum: bool) -> dict:
+# gcs read, crc32c and s3 upload timings and retries are added to `metrics` if provided
+# a copy of a part stops (raising _CopyCancelled) once `cancelled` is set, between reading and uploading data. 
+# hedged copies use HEDGE_READ_TIMEOUT for gcs reads and s3 uploads
+def _copy_part(gcs_object, s3_bucket_name, s3_object_name, part_num: int, total_parts: int, mpu_id: int, start_byte: int, end_byte: int, checksum: bool, streaming: bool = False, 
+               metrics: _CopyMetrics = None, cancelled: threading.Event = None, hedged: bool = False) -> dict:
+  if metrics is None: 
+    metrics = _CopyMetrics()
+  if streaming: 
+    return _copy_part_streaming(gcs_object, s3_bucket_name, s3_object_name, part_num, total_parts, mpu_id, start_byte, end_byte, checksum, metrics, cancelled, hedged)
+
   logging.info('Reading GCS object chunk #%s of %s (start byte: %s; end byte: %s)', part_num, total_parts, start_byte, end_byte)
   try: 
-    gcs_chunk = gcs_object.download_as_bytes(start=start_byte, end=end_byte) 
+    gcs_chunk = _read_gcs(gcs_object, metrics, start_byte, end_byte, HEDGE_READ_TIMEOUT if hedged else None)
   except Exception as e:
     logging.error('Encountered an error reading GCS object chunk #%s: %s', part_num, e)
-    # let's retry reading gcs chunk one more time
-    logging.info('Retrying reading GCS object chunk #%s after a delay of %s seconds', part_num, RETRY_DELAY)
-    time.sleep(RETRY_DELAY)
-    gcs_chunk = gcs_object.download_as_bytes(start=start_byte, end=end_byte) 
+    raise # re-raise the exception so that the caller can handle it
 
   # download successful if reached here
   logging.info('Read GCS object chunk #%s of length: %s bytes', part_num, len(gcs_chunk))
+  if cancelled is not None and cancelled.is_set(): 
+    raise _CopyCancelled(f'Copy of GCS object chunk #{part_num} was cancelled')
 
   upload_part_args = dict(Bucket=s3_bucket_name, Key=s3_object_name, Body=gcs_chunk, PartNumber=part_num, UploadId=mpu_id)
   if checksum: 
-    crc_checksum = crc32c.crc32c(gcs_chunk) # returns an int
-    crc_checksum_b64 = base64.b64encode(crc_checksum.to_bytes(4, byteorder='big', signed=False)).decode('ascii') # convert int to 32 bits and then base64 encode
+    with metrics.timer('crc_time'): 
+      crc_checksum = crc32c.crc32c(gcs_chunk) # returns an int
+    crc_checksum_b64 = _crc32c_b64(crc_checksum) # convert int to 32 bits and then base64 encode
     upload_part_args.update(dict(ChecksumAlgorithm='CRC32C', ChecksumCRC32C=crc_checksum_b64))
     logging.info('Uploading GCS object chunk #%s to S3 with CRC32C checksum: int(%s) and base64(%s)', part_num, crc_checksum, crc_checksum_b64)
   else: 
     logging.info('Uploading GCS object chunk #%s to S3 without checksum', part_num)
 
+  def upload(): 
+    with metrics.timer('s3_upload_time'): 
+      return (_get_s3_hedge_client() if hedged else _get_s3_client()).upload_part(**upload_part_args)
+
   try: 
-    # boto3 has retry mechanism built-in for failures, including checksum failures 
-    s3_response = s3_client.upload_part(**upload_part_args)
+    # besides the retries built into boto3, which are made right away, we retry failed uploads after a backoff
+    s3_response = _call_with_retries(upload, f'uploading GCS object chunk #{part_num} to S3', metrics, 's3_retries')
   except Exception as e:
     logging.error('Encountered an error uploading GCS object chunk #%s to S3: %s', part_num, e)
     raise # re-raise the exception so that the caller can handle it
+  metrics.add('s3_retries', _s3_retries(s3_response))
 
   # upload successful if reached here
   logging.info('Wrote GCS object chunk #%s to S3 part, which returned: %s', part_num, s3_response) 
@@ -275,86 +1281,546 @@ def _copy_part(gcs_object, s3_bucket_name, s3_object_name, part_num: int, total_
     return {"ETag": s3_response["ETag"], "PartNumber": part_num}
 
 
-# copy full gcs object to s3
-def _copy_full(gcs_object, s3_bucket_name, s3_object_name, checksum: bool, kms_key_arn: str) -> dict:
-  logging.info('Reading full GCS object')
-  gcs_data = gcs_object.download_as_bytes() 
-  logging.info('Read GCS object of length: %s bytes', len(gcs_data))
+# streaming variant of _copy_part, which moves the chunk from gcs to s3 through the stream buffer pool 
+# instead of holding the whole chunk in memory
+def _copy_part_streaming(gcs_object, s3_bucket_name, s3_object_name, part_num: int, total_parts: int, mpu_id: int, start_byte: int, end_byte: int, checksum: bool, 
+                         metrics: _CopyMetrics, cancelled: threading.Event = None, hedged: bool = False) -> dict:
+  logging.info('Streaming GCS object chunk #%s of %s (start byte: %s; end byte: %s)', part_num, total_parts, start_byte, end_byte)
+  with _GcsRangeReader(gcs_object, start_byte, end_byte, stream_buffer_pool, metrics, cancelled, HEDGE_READ_TIMEOUT if hedged else None) as reader: 
+    upload_part_args = dict(Bucket=s3_bucket_name, Key=s3_object_name, Body=reader, ContentLength=end_byte - start_byte + 1, PartNumber=part_num, UploadId=mpu_id)
+    s3 = _get_s3_hedge_client() if hedged else _get_s3_client()
+    try: 
+      s3_response, crc_checksum_b64 = _upload_stream(s3.upload_part, upload_part_args, reader, checksum, metrics)
+    except Exception as e:
+      logging.error('Encountered an error streaming GCS object chunk #%s to S3: %s', part_num, e)
+      raise # re-raise the exception so that the caller can handle it
+
+  logging.info('Streamed GCS object chunk #%s to S3 part, which returned: %s', part_num, s3_response) 
+
+  if checksum:
+    return {"ETag": s3_response["ETag"], "PartNumber": part_num, "ChecksumCRC32C": crc_checksum_b64}
+  else: 
+    return {"ETag": s3_response["ETag"], "PartNumber": part_num}
+
+# calls an s3 upload function (put_object or upload_part) with a _GcsRangeReader body. the crc32c of a 
+# stream is only known once it has been sent, so boto3 computes it as a trailing checksum, and we compare 
+# the checksum s3 received with the one computed incrementally by the reader. 
+# returns the s3 response and base64 crc32c checksum (None if checksum is false)
+def _upload_stream(upload_fn, upload_args: dict, reader: _GcsRangeReader, checksum: bool, metrics: _CopyMetrics) -> tuple: 
+  if checksum: 
+    upload_args.update(dict(ChecksumAlgorithm='CRC32C'))
+
+  # failed uploads and checksum mismatches are retried from the start of the range, which is read again from gcs
+  def upload(): 
+    reader.seek(0)
+    # the upload pulls data from the reader, so time the reader spent reading gcs and computing crc32c 
+    # (recorded in the same metrics) is not counted as s3 upload time
+    reader_time = metrics.get('gcs_read_time') + metrics.get('crc_time')
+    upload_start_time = time.perf_counter()
+    try: 
+      s3_response = upload_fn(**upload_args)
+    finally: 
+      reader_time = metrics.get('gcs_read_time') + metrics.get('crc_time') - reader_time
+      metrics.add('s3_upload_time', time.perf_counter() - upload_start_time - reader_time)
+    if checksum: 
+      if reader.crc32c is None: 
+        raise IOError('Upload did not read the complete GCS object range, CRC32C checksum is not available')
+      s3_checksum_b64 = s3_response.get('ChecksumCRC32C')
+      if s3_checksum_b64 and s3_checksum_b64 != _crc32c_b64(reader.crc32c): 
+        raise IOError(f'CRC32C checksum received by S3 ({s3_checksum_b64}) does not match checksum of GCS data read ({_crc32c_b64(reader.crc32c)})')
+    return s3_response
+
+  s3_response = _call_with_retries(upload, 'streaming GCS object data to S3', metrics, 's3_retries')
+  metrics.add('s3_retries', _s3_retries(s3_response))
+  if not checksum: 
+    return s3_response, None
+  crc_checksum_b64 = _crc32c_b64(reader.crc32c)
+  logging.info('Uploaded GCS object data to S3 with CRC32C checksum: int(%s) and base64(%s)', reader.crc32c, crc_checksum_b64)
+  return s3_response, crc_checksum_b64
+
 
+# returns number of retries boto3 made before an s3 call succeeded
+def _s3_retries(s3_response: dict) -> int: 
+  return s3_response.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+
+# copy full gcs object to s3
+def _copy_full(gcs_object, s3_bucket_name, s3_object_name, checksum: bool, kms_key_arn: str, streaming: bool = False, metadata: dict = None, 
+               metrics: _CopyMetrics = None) -> dict:
+  if metrics is None: 
+    metrics = _CopyMetrics()
   put_object_args = {
     'Bucket': s3_bucket_name,
-    'Key': s3_object_name, 
-    'Body': gcs_data
+    'Key': s3_object_name
   }
+  if metadata: 
+    put_object_args.update({'Metadata': metadata})
+  put_object_args.update(_sse_args(kms_key_arn))
+
+  if streaming: 
+    logging.info('Streaming full GCS object')
+    with _GcsRangeReader(gcs_object, 0, gcs_object.size - 1, stream_buffer_pool, metrics) as reader: 
+      put_object_args.update({'Body': reader, 'ContentLength': gcs_object.size})
+      s3_response, crc_checksum_b64 = _upload_stream(_get_s3_client().put_object, put_object_args, reader, checksum, metrics)
+    logging.info('Streamed GCS object to S3: %s', s3_response)
+  else: 
+    s3_response, crc_checksum_b64 = _put_full(gcs_object, put_object_args, checksum, metrics)
+
+  if checksum: 
+    return {"ETag": s3_response["ETag"], "ChecksumCRC32C": crc_checksum_b64}
+  else: 
+    return {"ETag": s3_response["ETag"]}
+
+# reads a full gcs object in memory and writes it to s3 using put_object 
+def _put_full(gcs_object, put_object_args: dict, checksum: bool, metrics: _CopyMetrics) -> tuple: 
+  logging.info('Reading full GCS object')
+  gcs_data = _read_gcs(gcs_object, metrics)
+  logging.info('Read GCS object of length: %s bytes', len(gcs_data))
+
+  put_object_args.update({'Body': gcs_data})
+  crc_checksum_b64 = None
   if checksum: 
-    crc_checksum = crc32c.crc32c(gcs_data) # returns an int
-    crc_checksum_b64 = base64.b64encode(crc_checksum.to_bytes(4, byteorder='big', signed=False)).decode('ascii') # convert int to 32 bit and then base64 encode
+    with metrics.timer('crc_time'): 
+      crc_checksum = crc32c.crc32c(gcs_data) # returns an int
+    crc_checksum_b64 = _crc32c_b64(crc_checksum) # convert int to 32 bit and then base64 encode
     logging.info('GCS object CRC32C checksum: int(%s) and base64(%s)', crc_checksum, crc_checksum_b64)
     put_object_args.update({'ChecksumAlgorithm': 'CRC32C', 'ChecksumCRC32C' : crc_checksum_b64})
 
-  if isinstance(kms_key_arn, str) and kms_key_arn.startswith('arn:aws'): 
-    put_object_args.update({'ServerSideEncryption': 'aws:kms', 'SSEKMSKeyId': kms_key_arn})
-  else: 
-    put_object_args.update({'ServerSideEncryption': 'AES256'})
+  def upload(): 
+    with metrics.timer('s3_upload_time'): 
+      return _get_s3_client().put_object(**put_object_args)
 
-  s3_response = s3_client.put_object(**put_object_args)
+  s3_response = _call_with_retries(upload, 'writing GCS object to S3', metrics, 's3_retries')
+  metrics.add('s3_retries', _s3_retries(s3_response))
   logging.info('Wrote GCS object to S3: %s', s3_response)
+  return s3_response, crc_checksum_b64
 
+# compresses a block of data as a complete gzip member or zstd frame. zlib and zstandard release the gil 
+# while compressing, so blocks compressed by several threads are compressed in parallel
+def _compress_block(compression: str, data: bytes) -> bytes: 
+  if compression == 'gzip': 
+    compressor = zlib.compressobj(COMPRESSION_LEVELS['gzip'], zlib.DEFLATED, 31) # wbits 16 + 15 writes a gzip header and trailer
+    return compressor.compress(data) + compressor.flush()
+  if compression != 'zstd': 
+    raise ValueError(f'Compression `{compression}` is not supported, supported compressions are: {COMPRESSIONS}')
+  import zstandard
+  return zstandard.ZstdCompressor(level=COMPRESSION_LEVELS['zstd']).compress(data)
+
+# reads a block of a gcs object and compresses it. returns the block size, crc32c of the block read 
+# (None if checksum is false) and the compressed block
+def _read_compressed_block(gcs_object, compression: str, start_byte: int, end_byte: int, checksum: bool, metrics: _CopyMetrics) -> tuple: 
+  data = _read_gcs(gcs_object, metrics, start_byte, end_byte) if end_byte >= start_byte else b''
+  crc_checksum = None
   if checksum: 
-    return {"ETag": s3_response["ETag"], "ChecksumCRC32C": crc_checksum_b64}
+    with metrics.timer('crc_time'): 
+      crc_checksum = crc32c.crc32c(data)
+  with metrics.timer('compress_time'): 
+    compressed_data = _compress_block(compression, data)
+  return len(data), crc_checksum, compressed_data
+
+# uploads compressed data to s3, as a part of a multi-part upload if `mpu_id` is set, or as the full object. 
+# returns the s3 response, and crc32c (int) of the data if checksum is true
+def _upload_compressed(copy_ctx: dict, data: bytes, metrics: _CopyMetrics, part_num: int = None, mpu_id: str = None) -> tuple: 
+  upload_args = dict(Bucket=copy_ctx['s3_bucket_name'], Key=copy_ctx['s3_object_name'], Body=data)
+  if mpu_id: 
+    upload_args.update(dict(PartNumber=part_num, UploadId=mpu_id))
+    upload_fn, description = _get_s3_client().upload_part, f'uploading compressed part #{part_num} to S3'
   else: 
-    return {"ETag": s3_response["ETag"]}
+    upload_args.update(_sse_args(copy_ctx['kms_key_arn']))
+    upload_args.update(dict(Metadata=copy_ctx['target_metadata']))
+    upload_fn, description = _get_s3_client().put_object, 'writing compressed object to S3'
+  crc_checksum = None
+  if copy_ctx['checksum']: 
+    with metrics.timer('crc_time'): 
+      crc_checksum = crc32c.crc32c(data)
+    upload_args.update(dict(ChecksumAlgorithm='CRC32C', ChecksumCRC32C=_crc32c_b64(crc_checksum)))
 
+  def upload(): 
+    with metrics.timer('s3_upload_time'): 
+      return upload_fn(**upload_args)
 
-# copy a gcs object to s3 using mpu
-def copy_object_gcs_to_s3(source_object_uri, target_object_uri, chunk_size: int, max_workers: int, checksum: bool = False, kms_key_arn: str = None) -> dict: 
+  s3_response = _call_with_retries(upload, description, metrics, 's3_retries')
+  metrics.add('s3_retries', _s3_retries(s3_response))
+  return s3_response, crc_checksum
+
+# copies a gcs object to s3 compressed with `copy_ctx['compression']`. blocks are read and compressed ahead by 
+# up to `max_workers` tasks, and appended in order to the compressed stream, which is uploaded in parts of 
+# `chunk_size` bytes by up to `max_workers` tasks, so reading, compressing and uploading overlap and memory 
+# is bounded by blocks and parts in flight. tasks run on `executor` (the helper pool of the scheduler), and never 
+# wait on other tasks. the stream is written with put_object if it fits in a single part. 
+# returns a transform dict for `_finalize_copy`, with the size and crc32c of the compressed bytes written, 
+# and crc32c of the source bytes read (crc32c checksums are None if checksum is false), and the s3 response 
+# of the upload which created the object
+def _copy_compressed(copy_ctx: dict, metrics: _CopyMetrics, executor: concurrent.futures.Executor) -> tuple: 
+  gcs_object = copy_ctx['gcs_object']
+  compression = copy_ctx['compression']
+  checksum = copy_ctx['checksum']
+  object_size = copy_ctx['object_size']
+  chunk_size = copy_ctx['chunk_size']
+  max_workers = copy_ctx['max_workers']
+  if copy_ctx['resumable'] or copy_ctx['fan_out'] > 1: 
+    logging.warning('Resumable and fan out copies are not supported with compression, copying the object in a single pass')
+  logging.info('Starting %s compressed object copy using %s byte blocks, %s byte parts and %s max workers', compression, COMPRESSION_BLOCK_SIZE, chunk_size, max_workers)
+
+  # an empty object is compressed as a single empty block
+  block_ranges = iter(_iter_part_ranges(object_size, max(1, -(-object_size // COMPRESSION_BLOCK_SIZE)), COMPRESSION_BLOCK_SIZE))
+  source_crc32c = 0 # crc32c of no data
+  compressed_crc32c = 0
+  compressed_size = 0
+  pending_data = bytearray()
+  mpu_id = None
+  mpu_parts = []
+  part_futures = deque()
+
+  def upload_part(part_data: bytes): 
+    nonlocal mpu_id
+    if mpu_id is None: 
+      mpu_id = _create_mpu(copy_ctx['s3_bucket_name'], copy_ctx['s3_object_name'], checksum, copy_ctx['kms_key_arn'], copy_ctx['target_metadata'])
+    part_num = len(mpu_parts) + len(part_futures) + 1
+    part_futures.append((part_num, len(part_data), executor.submit(_upload_compressed, copy_ctx, part_data, metrics, part_num, mpu_id)))
+    if len(part_futures) > max_workers: 
+      record_part()
+
+  def record_part(): 
+    nonlocal compressed_crc32c
+    part_num, part_size, part_future = part_futures.popleft()
+    s3_response, crc_checksum = part_future.result()
+    logging.info('Uploaded compressed part #%s of %s bytes', part_num, part_size)
+    mpu_part = {"ETag": s3_response["ETag"], "PartNumber": part_num}
+    if checksum: 
+      mpu_part['ChecksumCRC32C'] = _crc32c_b64(crc_checksum)
+      compressed_crc32c = _crc32c_combine(compressed_crc32c, crc_checksum, part_size)
+    mpu_parts.append(mpu_part)
+    metrics.add('parts_copied', 1)
+
+  block_futures = deque()
+  try: 
+    while True: 
+      # keep up to max_workers blocks being read and compressed ahead of the stream
+      for part_num, start_byte, end_byte in block_ranges: 
+        block_futures.append(executor.submit(_read_compressed_block, gcs_object, compression, start_byte, end_byte, checksum, metrics))
+        if len(block_futures) >= max_workers: 
+          break
+      if not block_futures: 
+        break
+      block_size, block_crc32c, compressed_block = block_futures.popleft().result()
+      if checksum: 
+        source_crc32c = _crc32c_combine(source_crc32c, block_crc32c, block_size)
+      metrics.add('bytes_copied', block_size)
+      compressed_size += len(compressed_block)
+      pending_data += compressed_block
+      # a part is only cut once more data follows it, so the last part is never empty
+      while len(pending_data) > chunk_size: 
+        upload_part(bytes(pending_data[:chunk_size]))
+        del pending_data[:chunk_size]
+
+    if mpu_id is None: 
+      s3_response, crc_checksum = _upload_compressed(copy_ctx, bytes(pending_data), metrics)
+      logging.info('Wrote compressed object to S3: %s', s3_response)
+      compressed_crc32c = crc_checksum
+      metrics.add('parts_copied', 1)
+    else: 
+      upload_part(bytes(pending_data))
+      while part_futures: 
+        record_part()
+      s3_response = _complete_mpu(copy_ctx['s3_bucket_name'], copy_ctx['s3_object_name'], mpu_id, mpu_parts)
+  except Exception as e:
+    # tasks of a failed copy which haven't started are dropped, and uploads in flight finish before the upload is aborted
+    pending_futures = list(block_futures) + [ part_future for _, _, part_future in part_futures ]
+    for future in pending_futures: 
+      future.cancel()
+    concurrent.futures.wait(pending_futures)
+    if mpu_id is not None: 
+      logging.error('Encountered an error copying compressed object, aborting multi-part upload: %s', e)
+      _abort_mpu(copy_ctx['s3_bucket_name'], copy_ctx['s3_object_name'], mpu_id)
+    raise
+
+  copy_ctx['total_parts'] = max(1, len(mpu_parts))
+  logging.info('Compressed %s bytes into %s bytes (%s parts) using %s', object_size, compressed_size, copy_ctx['total_parts'], compression)
+  transform = dict(
+    compression = compression, 
+    size = compressed_size, 
+    crc32c = _crc32c_b64(compressed_crc32c) if checksum else None, 
+    source_crc32c = _crc32c_b64(source_crc32c) if checksum else None
+  )
+  return transform, s3_response
+
+
+# copy a full s3 object to s3 server side (e.g. to rename it or encrypt it with another key), using copy_object
+# copy only succeeds if the source object still has the etag it had when the copy was prepared
+def _copy_full_s3(source_bucket_name: str, source_object_name: str, source_etag: str, s3_bucket_name: str, s3_object_name: str, checksum: bool, kms_key_arn: str) -> dict: 
+  copy_object_args = {
+    'Bucket': s3_bucket_name,
+    'Key': s3_object_name, 
+    'CopySource': {'Bucket': source_bucket_name, 'Key': source_object_name}, 
+    'CopySourceIfMatch': source_etag
+  }
+  if checksum: 
+    copy_object_args.update({'ChecksumAlgorithm': 'CRC32C'})
+  copy_object_args.update(_sse_args(kms_key_arn))
+
+  s3_response = _call_with_retries(lambda: _get_s3_client().copy_object(**copy_object_args), 'copying S3 object server side')
+  logging.info('Copied S3 object server side: %s', s3_response)
+  copy_result = s3_response['CopyObjectResult']
+  if checksum: 
+    return {"ETag": copy_result["ETag"], "ChecksumCRC32C": copy_result.get("ChecksumCRC32C")}
+  else: 
+    return {"ETag": copy_result["ETag"]}
+
+# copy a byte range of an s3 object to a part of an s3 multi-part upload server side, using upload_part_copy
+def _copy_part_s3(source_bucket_name: str, source_object_name: str, source_etag: str, s3_bucket_name: str, s3_object_name: str, 
+                  part_num: int, total_parts: int, mpu_id: str, start_byte: int, end_byte: int, checksum: bool) -> dict: 
+  logging.info('Copying S3 object range #%s of %s server side (start byte: %s; end byte: %s)', part_num, total_parts, start_byte, end_byte)
+  try: 
+    s3_response = _call_with_retries(lambda: _get_s3_client().upload_part_copy(Bucket=s3_bucket_name, Key=s3_object_name, PartNumber=part_num, UploadId=mpu_id, 
+                                                                                CopySource={'Bucket': source_bucket_name, 'Key': source_object_name}, CopySourceIfMatch=source_etag, 
+                                                                                CopySourceRange=f'bytes={start_byte}-{end_byte}'), 
+                                     f'copying S3 object range #{part_num} server side')
+  except Exception as e:
+    logging.error('Encountered an error copying S3 object range #%s server side: %s', part_num, e)
+    raise # re-raise the exception so that the caller can handle it
+
+  copy_result = s3_response['CopyPartResult']
+  if checksum:
+    return {"ETag": copy_result["ETag"], "PartNumber": part_num, "ChecksumCRC32C": copy_result.get("ChecksumCRC32C")}
+  else: 
+    return {"ETag": copy_result["ETag"], "PartNumber": part_num}
+
+# copy a gcs object to gcs server side using rewrite, which may take several calls for large objects, 
+# or objects copied across locations or storage classes. returns the copy response dict
+def _copy_gcs_to_gcs(copy_ctx: dict) -> dict: 
+  gcs_object = copy_ctx['gcs_object']
+  gcs_target_object = copy_ctx['gcs_target_object']
+  if copy_ctx['kms_key_arn']: 
+    logging.warning('KMS key arn is ignored when copying to a GCS target object')
+
+  logging.info('Starting server side GCS object rewrite')
+  rewrite_token = None
+  while True: 
+    rewrite_token, bytes_rewritten, total_bytes = gcs_target_object.rewrite(gcs_object, token=rewrite_token, if_source_generation_match=gcs_object.generation)
+    logging.info('Rewrote %s of %s bytes of GCS object', bytes_rewritten, total_bytes)
+    if rewrite_token is None: 
+      break
+
+  # rewrite updates target object properties once complete
+  if gcs_target_object.size != copy_ctx['object_size']: 
+    logging.error('Original GCS object (%s bytes) and copied GCS object (%s bytes) sizes do not match', copy_ctx['object_size'], gcs_target_object.size)
+    status = 'COPY_SUCCESS_SIZE_MISMATCHED'
+  else: 
+    status = 'COPY_SUCCESS_SIZE_MATCHED'
+
+  execution_time = time.time() - copy_ctx['start_time']
+  logging.info('Object copy total execution time: %s seconds', execution_time)
+  response = dict(
+    status = status, 
+    bucket_name = copy_ctx['target_bucket_name'],
+    object_name = copy_ctx['target_object_name'],
+    object_size = gcs_target_object.size, 
+    parts = 1,
+    etag = gcs_target_object.etag, 
+    execution_time = execution_time
+  )
+  if copy_ctx['checksum']: 
+    response['checksum_crc32c'] = gcs_target_object.crc32c
+  return response
+
+# s3 user metadata describing the gcs source of a copied object, used by sync mode to detect unchanged objects
+def _source_metadata(gcs_object) -> dict: 
+  return {
+    'gcs-generation': str(gcs_object.generation), 
+    'gcs-crc32c': gcs_object.crc32c or '', 
+    'gcs-size': str(gcs_object.size)
+  }
+
+# describes a gcs source object (size, etag, generation and base64 crc32c) for later copy stages
+def _describe_gcs_source(gcs_object) -> dict: 
+  return dict(
+    object_size = gcs_object.size, 
+    source_etag = gcs_object.etag, 
+    source_generation = str(gcs_object.generation), 
+    source_crc32c = gcs_object.crc32c, 
+    target_metadata = _source_metadata(gcs_object)
+  )
+
+# describes an s3 source object (size, etag, version and base64 crc32c if known) for later copy stages
+def _describe_s3_source(s3_bucket_name: str, s3_object_name: str) -> dict: 
+  s3_object_head = _get_s3_client().head_object(Bucket=s3_bucket_name, Key=s3_object_name, ChecksumMode='ENABLED')
+  s3_metadata = s3_object_head.get('Metadata', {})
+  s3_crc32c = s3_object_head.get('ChecksumCRC32C')
+  if s3_crc32c and '-' in s3_crc32c: 
+    s3_crc32c = None # checksum of a multi-part object is a checksum of part checksums
+  return dict(
+    object_size = s3_object_head['ContentLength'], 
+    source_etag = s3_object_head['ETag'], 
+    source_generation = s3_object_head.get('VersionId') or s3_object_head['ETag'], 
+    # prefer crc32c recorded when the object was copied from gcs, as it covers the full object
+    source_crc32c = s3_metadata.get('gcs-crc32c') or s3_crc32c, 
+    target_metadata = s3_metadata
+  )
+
+# returns true if the target object already holds the same data as the source object. objects match if 
+# their sizes are equal, and their crc32c checksums (for s3 targets, from our copy metadata or a full object 
+# checksum) are equal, or if no checksum is available, the source generation (or s3 etag) is equal. 
+# a single metadata call is made per object
+def _is_up_to_date(copy_ctx: dict) -> bool: 
+  if copy_ctx['gcs_target_object'] is not None: 
+    # a single metadata request, which returns none if the target doesn't exist
+    gcs_target_object = copy_ctx['gcs_target_object'].bucket.get_blob(copy_ctx['gcs_target_object'].name)
+    if gcs_target_object is None: 
+      return False
+    return gcs_target_object.size == copy_ctx['object_size'] and gcs_target_object.crc32c == copy_ctx['source_crc32c']
+
+  try: 
+    s3_object_head = _get_s3_client().head_object(Bucket=copy_ctx['s3_bucket_name'], Key=copy_ctx['s3_object_name'], ChecksumMode='ENABLED')
+  except _get_s3_client().exceptions.ClientError as e:
+    logging.info('S3 target object is not available for sync comparison: %s', e)
+    return False
+
+  s3_metadata = s3_object_head.get('Metadata', {})
+  if copy_ctx['compression']: 
+    # a compressed target is only compared with its source through our copy metadata
+    if s3_metadata.get('compression') != copy_ctx['compression'] or s3_metadata.get('gcs-size') != str(copy_ctx['object_size']): 
+      return False
+  elif s3_metadata.get('compression') or s3_object_head.get('ContentLength') != copy_ctx['object_size']: 
+    return False
+  s3_crc32c = s3_metadata.get('gcs-crc32c') or (None if copy_ctx['compression'] else s3_object_head.get('ChecksumCRC32C'))
+  if s3_crc32c and copy_ctx['source_crc32c']: 
+    return s3_crc32c == copy_ctx['source_crc32c']
+  return copy_ctx['source_generation'] in [s3_metadata.get('gcs-generation'), s3_object_head.get('ETag')]
+
+# builds the copy response of an object skipped by sync mode because the target is up to date
+def _skipped_copy_response(copy_ctx: dict) -> dict: 
+  execution_time = time.time() - copy_ctx['start_time']
+  logging.info('Object copy skipped because target object is up to date with source object')
+  return dict(
+    status = 'COPY_SKIPPED_UP_TO_DATE', 
+    bucket_name = copy_ctx['target_bucket_name'],
+    object_name = copy_ctx['target_object_name'],
+    object_size = copy_ctx['object_size'], 
+    execution_time = execution_time
+  )
+
+# resolves source and target uris of a copy request, fetches source object metadata and decides how the 
+# object is copied: through this function (gcs to s3), or server side (s3 to s3 and gcs to gcs), and for s3 
+# targets, between a full or multi-part copy. returns a copy context dict used by later stages
+def _prepare_copy(source_object_uri, target_object_uri, chunk_size: int = None, max_workers: int = None, checksum: bool = False, kms_key_arn: str = None, streaming: bool = False, resumable: bool = False, sync: bool = False, 
+                  gcs_object = None, source_error: Exception = None, engine: str = DEFAULT_ENGINE, fan_out: int = DEFAULT_FAN_OUT, compression: str = None, 
+                  verify: bool = DEFAULT_VERIFY_ENABLED) -> dict: 
   start_time = time.time() # capture start time
+  if source_error: 
+    raise source_error # source objects couldn't be listed
 
   # use naive object to get local time based on system timezone (use TZ environment variable to set timezone)
   now = datetime.now() 
   source_object_uri = source_object_uri.format(now)
   target_object_uri = target_object_uri.format(now)
-  gcs_bucket_name, gcs_object_name = _split_uri(source_object_uri)
-  s3_bucket_name, s3_object_name = _split_uri(target_object_uri)
+  copy_route = (urlparse(source_object_uri).scheme, urlparse(target_object_uri).scheme)
+  if copy_route not in COPY_ROUTES: 
+    raise ValueError(f'Copying objects from `{copy_route[0]}` to `{copy_route[1]}` uris is not supported')
+  if compression and copy_route != ('gs', 's3'): 
+    raise ValueError('Compression is only supported when copying objects from `gs` to `s3` uris')
+  source_bucket_name, source_object_name = _split_uri(source_object_uri)
+  target_bucket_name, target_object_name = _split_uri(target_object_uri)
 
-  logging.info('GCS source bucket `%s` and object key `%s`', gcs_bucket_name, gcs_object_name)
-  logging.info('S3 target bucket `%s` and object key `%s`', s3_bucket_name, s3_object_name)
+  logging.info('Source bucket `%s` and object key `%s`', source_bucket_name, source_object_name)
+  logging.info('Target bucket `%s` and object key `%s`', target_bucket_name, target_object_name)
 
-  # fetch gcs blob
-  gcs_bucket = gcs_client.bucket(gcs_bucket_name)
-  gcs_object = gcs_bucket.get_blob(gcs_object_name)
-  gcs_object.reload() # required to read blob attributes like size
-  gcs_object_size = gcs_object.size
-  logging.info('GCS source object size and etag: %s, %s', gcs_object_size, gcs_object.etag)
+  if copy_route[0] == 'gs': 
+    # fetch gcs blob, unless it was already fetched by listing a source prefix or by metadata prefetch. 
+    # get_blob fetches all blob attributes (like size), so the blob doesn't need to be reloaded
+    if gcs_object is None: 
+      gcs_bucket = _get_gcs_client().bucket(source_bucket_name)
+      gcs_object = gcs_bucket.get_blob(source_object_name)
+      if gcs_object is None: 
+        raise FileNotFoundError(f'Source object {source_object_uri} does not exist')
+    source = _describe_gcs_source(gcs_object)
+  else: 
+    source = _describe_s3_source(source_bucket_name, source_object_name)
+  object_size = source['object_size']
+  logging.info('Source object size and etag: %s, %s', object_size, source['source_etag'])
+  if compression: 
+    source['target_metadata'] = dict(source['target_metadata'], compression=compression)
 
-  # s3 mpu requires parts to be atleast 5Mb, so if gcs object size is less than 5Mb, 
-  # or less than chunk size, we direct copy the object
-  if gcs_object_size < 5242880 or gcs_object_size <= chunk_size: 
-    # initiate direct file copy
-    total_parts = 1
-    logging.info('Starting full object copy because GCS object size is either less than 5Mb or less than chunk-size')
-    _copy_full(gcs_object, s3_bucket_name, s3_object_name, checksum, kms_key_arn)
+  server_side = copy_route != ('gs', 's3')
+  if copy_route == ('gs', 'gs'): 
+    # gcs rewrites whole objects server side
+    total_parts, max_workers = 1, 1
   else: 
-    # initiate multi-part copy
-    total_parts = (gcs_object_size // chunk_size) + 1 
-    logging.info('Starting multi-part object copy using %s parts, and checksum validation set to %s', total_parts, checksum)
-    _copy_mpu(gcs_object, s3_bucket_name, s3_object_name, gcs_object_size, total_parts, chunk_size, max_workers, checksum, kms_key_arn)
+    if server_side and chunk_size is None: 
+      chunk_size = SERVER_SIDE_CHUNK_SIZE
+    # data of server side copies doesn't pass through memory of this function
+    chunk_size, max_workers, total_parts = _plan_copy(object_size, chunk_size, max_workers, streaming or server_side, engine)
+
+  copy_ctx = dict(
+    start_time = start_time, 
+    source_object_uri = source_object_uri, 
+    source_bucket_name = source_bucket_name, 
+    source_object_name = source_object_name, 
+    copy_route = f'{copy_route[0]}_to_{copy_route[1]}', 
+    gcs_object = gcs_object, 
+    target_bucket_name = target_bucket_name, 
+    target_object_name = target_object_name, 
+    s3_bucket_name = target_bucket_name if copy_route[1] == 's3' else None, 
+    s3_object_name = target_object_name if copy_route[1] == 's3' else None, 
+    gcs_target_object = _get_gcs_client().bucket(target_bucket_name).blob(target_object_name) if copy_route[1] == 'gs' else None, 
+    server_side = server_side, 
+    total_parts = total_parts, 
+    chunk_size = chunk_size, 
+    max_workers = max_workers, 
+    checksum = checksum, 
+    kms_key_arn = kms_key_arn, 
+    streaming = streaming, 
+    resumable = resumable, 
+    fan_out = fan_out or DEFAULT_FAN_OUT, 
+    compression = compression, 
+    verify = verify, 
+    **source
+  )
+  copy_ctx['up_to_date'] = sync and _is_up_to_date(copy_ctx)
+  return copy_ctx
+
+# reads attributes of the copied s3 target object, compares them with the source and 
+# builds the copy response dict. if checksum is true and crc32c checksums of the copied parts (ordered by 
+# part number, or the full object) are given, their combined crc32c is compared with the source crc32c. 
+# a compressed copy passes the `transform` dict returned by `_copy_compressed` instead, and the target is 
+# compared with the size and crc32c of the bytes written, while the source crc32c is compared with the bytes read. 
+# if verify is false, the target attributes are taken from `s3_response` (of the put, copy or multi-part upload 
+# completion which created the object) instead of being read again. s3 already rejects uploads whose data 
+# doesn't match their length (or checksum), so this only skips a check of the object as s3 stored it
+def _finalize_copy(copy_ctx: dict, copy_parts: list = None, transform: dict = None, s3_response: dict = None) -> dict: 
+  s3_bucket_name = copy_ctx['s3_bucket_name']
+  s3_object_name = copy_ctx['s3_object_name']
+  source_object_size = copy_ctx['object_size']
+  expected_object_size = transform['size'] if transform else source_object_size
 
-  # lets read some attributes of the final s3 target object
-  s3_object_attr = s3_client.get_object_attributes(Bucket=s3_bucket_name, Key=s3_object_name, ObjectAttributes=['ETag', 'Checksum', 'ObjectSize', ''])
+  if copy_ctx['verify'] or s3_response is None: 
+    # lets read some attributes of the final s3 target object
+    s3_object_attr = _get_s3_client().get_object_attributes(Bucket=s3_bucket_name, Key=s3_object_name, ObjectAttributes=['ETag', 'Checksum', 'ObjectSize'])
+    logging.info('S3 target object attributes: %s', s3_object_attr)
+  else: 
+    s3_object_attr = dict(ETag=s3_response.get('ETag'), ObjectSize=expected_object_size, Checksum=dict(ChecksumCRC32C=s3_response.get('ChecksumCRC32C')))
   s3_object_size = s3_object_attr.get('ObjectSize')
-  logging.info('S3 target object attributes: %s', s3_object_attr)
 
-  if gcs_object_size != s3_object_size:
-    logging.error('Original GCS object (%s bytes) and copied S3 object (%s bytes) sizes do not match', gcs_object_size, s3_object_size)
+  object_crc32c = read_crc32c = None
+  if copy_ctx['checksum'] and transform: 
+    object_crc32c, read_crc32c = transform['crc32c'], transform['source_crc32c']
+  elif copy_ctx['checksum'] and copy_parts: 
+    object_crc32c = read_crc32c = _combine_part_crc32c(copy_parts, source_object_size, copy_ctx['chunk_size'])
+
+  if expected_object_size != s3_object_size:
+    logging.error('Expected (%s bytes) and copied S3 object (%s bytes) sizes do not match', expected_object_size, s3_object_size)
     status = 'COPY_SUCCESS_SIZE_MISMATCHED'
+  elif read_crc32c and copy_ctx['source_crc32c'] and read_crc32c != copy_ctx['source_crc32c']: 
+    logging.error('Source object CRC32C checksum (%s) and combined CRC32C checksum of copied data (%s) do not match', copy_ctx['source_crc32c'], read_crc32c)
+    status = 'COPY_SUCCESS_CHECKSUM_MISMATCHED'
   else: 
-    logging.info('GCS and S3 object sizes match. GCS size: %s, S3 size: %s', gcs_object_size, s3_object_size)
+    logging.info('Expected and S3 object sizes match. Expected size: %s, S3 size: %s', expected_object_size, s3_object_size)
+    if read_crc32c and copy_ctx['source_crc32c']: 
+      logging.info('Source object CRC32C checksum matches combined CRC32C checksum of copied data: %s', read_crc32c)
 
     status = 'COPY_SUCCESS_SIZE_MATCHED'
 
   end_time = time.time() # capture end time
-  execution_time = end_time - start_time
+  execution_time = end_time - copy_ctx['start_time']
   logging.info('Object copy total execution time: %s seconds', execution_time)
 
   response = dict(
@@ -362,63 +1828,1357 @@ def copy_object_gcs_to_s3(source_object_uri, target_object_uri, chunk_size: int,
     bucket_name = s3_bucket_name,
     object_name = s3_object_name,
     object_size = s3_object_size, 
-    parts = total_parts,
+    parts = copy_ctx['total_parts'],
+    chunk_size = copy_ctx['chunk_size'], 
+    max_workers = copy_ctx['max_workers'], 
     etag = s3_object_attr.get('ETag'), 
     execution_time = execution_time
   )
-  if checksum: 
+  if copy_ctx['checksum']: 
     response['checksum_crc32c'] = s3_object_attr.get('Checksum', {}).get('ChecksumCRC32C')
-  if kms_key_arn: 
-    response['kms_key_arn'] = kms_key_arn
+    if object_crc32c: 
+      # unlike the checksum of a multi-part s3 object, this is the crc32c of the full object
+      response['object_crc32c'] = object_crc32c
+      response['checksum_verified'] = read_crc32c == copy_ctx['source_crc32c'] if copy_ctx['source_crc32c'] else None
+  if transform: 
+    response['compression'] = transform['compression']
+    response['source_object_size'] = source_object_size
+    response['compression_ratio'] = round(source_object_size / s3_object_size, 3) if s3_object_size else None
+  if copy_ctx['kms_key_arn']: 
+    response['kms_key_arn'] = copy_ctx['kms_key_arn']
 
   return response
 
+# adds copy metrics to the copy response of an object, and emits them to the metrics sink
+def _add_copy_metrics(copy_ctx: dict, response: dict, metrics: _CopyMetrics): 
+  response['metrics'] = metrics.report(response['execution_time'])
+  _emit_metrics(dict(route=copy_ctx['copy_route']), response['metrics'], 
+                dict(status=response['status'], source_uri=copy_ctx['source_object_uri'], target_bucket_name=copy_ctx['target_bucket_name'], 
+                     target_object_name=copy_ctx['target_object_name']))
+
+# builds the copy response of a resumable copy which stopped before all parts were copied
+def _incomplete_copy_response(copy_ctx: dict, parts_remaining: int) -> dict: 
+  execution_time = time.time() - copy_ctx['start_time']
+  logging.info('Object copy stopped with %s of %s parts remaining after %s seconds', parts_remaining, copy_ctx['total_parts'], execution_time)
+  return dict(
+    status = 'COPY_INCOMPLETE_RESUMABLE', 
+    bucket_name = copy_ctx['s3_bucket_name'],
+    object_name = copy_ctx['s3_object_name'],
+    parts = copy_ctx['total_parts'],
+    parts_remaining = parts_remaining, 
+    chunk_size = copy_ctx['chunk_size'], 
+    upload_id = copy_ctx['mpu_id'], 
+    execution_time = execution_time
+  )
+
+
+# state of a single object copy flowing through the copy scheduler
+# part tasks of a multi-part copy share this state, so all updates are made while holding `lock`
+class _CopyJob: 
+  def __init__(self, copy_args: dict): 
+    self.copy_args = copy_args
+    self.future = concurrent.futures.Future() # resolves to the copy response dict
+    self.idle = threading.Event() # set once the job has no more work in the worker pool
+    self.lock = threading.Lock()
+    self.copy_ctx = None
+    self.metrics = _CopyMetrics()
+    self.ledger = None # `_LedgerWriter` of a resumable copy
+    self.mpu_parts = None
+    self.pending_parts = None # iterator of part ranges not yet submitted to the worker pool
+    self.parts_remaining = 0
+    self.parts_in_flight = 0 # copies of parts in the worker pool, including hedged copies
+    self.running_parts = {} # (start time, start byte, end byte) of parts being copied, keyed by part number
+    self.part_attempts = {} # number of copies of each part in the worker pool, keyed by part number
+    self.part_times = [] # copy times of completed parts, used to find straggler parts
+    self.hedged_parts = set()
+    self.part_cancelled = {} # event shared by the copies of a part, set once the part is done, keyed by part number
+    self.failed = False
+    self.stopped = False # resumable copy stopped scheduling parts because the deadline has passed
+
+
+# schedules copies of many objects over a single pool of worker threads. whole object copies and
+# parts of multi-part copies (from different objects) are mixed in the same pool, while each object
+# still has at most `max_workers` of its parts in flight. tasks never block waiting on other tasks, 
+# instead, completion of a part submits the next part (or the completion of the upload) to the pool. 
+# once `deadline` (epoch seconds) has passed, resumable copies stop starting new parts, so they can be 
+# completed by a later invocation. a watcher thread hedges straggler parts (see HEDGE_PERCENTILE). 
+# tasks which wait on work of their own (block reads and uploads of compressed copies, and invocations of part 
+# range workers) submit it to a helper pool of another `pool_size` threads, so a scheduler uses at most 
+# `2 * pool_size` threads (and connections), however many objects are compressed or fanned out
+class _CopyScheduler: 
+  def __init__(self, pool_size: int, deadline: float = None): 
+    self.pool_size = max(1, pool_size)
+    self.deadline = deadline
+    self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.pool_size)
+    self.helper_executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.pool_size)
+    self.jobs = set()
+    self.jobs_lock = threading.Lock()
+    self._closed = threading.Event()
+    self._straggler_watcher = None
+    if HEDGE_PERCENTILE > 0: 
+      self._straggler_watcher = threading.Thread(target=self._watch_stragglers, daemon=True)
+      self._straggler_watcher.start()
+
+  def __enter__(self): 
+    return self
+
+  def __exit__(self, *exc_info): 
+    self.shutdown()
+
+  # waits for all scheduled objects to finish and stops worker threads. copies of parts which are still running 
+  # once all objects finished lost to a hedged copy, so they are left to stop on their own rather than waited for
+  def shutdown(self): 
+    with self.jobs_lock: 
+      jobs = list(self.jobs)
+    for job in jobs: 
+      job.idle.wait()
+    self._closed.set()
+    if self._straggler_watcher: 
+      self._straggler_watcher.join()
+    self.executor.shutdown(wait=False, cancel_futures=True)
+    self.helper_executor.shutdown(wait=False, cancel_futures=True)
+
+  # schedules an object copy (using `_prepare_copy` arguments) and returns a future which 
+  # resolves to its copy response, or raises the exception that failed the copy
+  def submit(self, copy_args: dict) -> concurrent.futures.Future: 
+    job = _CopyJob(copy_args)
+    with self.jobs_lock: 
+      self.jobs.add(job)
+    self._submit_task(job, self._start_job, job)
+    return job.future
+
+  # schedules object copies from an iterable, and yields completed futures in the same order. 
+  # at most `window` objects are in flight, so the iterable is consumed lazily
+  def map(self, copy_args_iter, window: int = None): 
+    window = window or self.pool_size * 4
+    in_flight = deque()
+    for copy_args in copy_args_iter: 
+      in_flight.append(self.submit(copy_args))
+      if len(in_flight) >= window: 
+        future = in_flight.popleft()
+        concurrent.futures.wait([future])
+        yield future
+    while in_flight: 
+      future = in_flight.popleft()
+      concurrent.futures.wait([future])
+      yield future
+
+  def _submit_task(self, job: _CopyJob, fn, *args): 
+    future = self.executor.submit(self._run_task, job, time.perf_counter(), fn, *args)
+    future.add_done_callback(lambda f: self._on_task_done(job, f))
+    return future
+
+  # runs a task of a job in a worker thread, recording how long the task waited for a free worker
+  def _run_task(self, job: _CopyJob, submit_time: float, fn, *args): 
+    queue_wait_time = time.perf_counter() - submit_time
+    job.metrics.add('queue_wait_time', queue_wait_time)
+    job.metrics.add('max_queue_wait_time', queue_wait_time)
+    return fn(*args)
+
+  # any exception raised by an object task fails the whole object copy
+  def _on_task_done(self, job: _CopyJob, future: concurrent.futures.Future): 
+    if future.exception(): 
+      self._fail_job(job, future.exception())
+      self._settle_if_idle(job)
+
+  def _fail_job(self, job: _CopyJob, e: Exception): 
+    with job.lock: 
+      if job.failed or job.future.done(): 
+        return
+      job.failed = True
+    logging.error('Copy of %s failed with an exception [%s]. Aborting copy operation now!', job.copy_args.get('source_object_uri'), e)
+    job.future.set_exception(e)
+
+  # marks the job as having no more work, so the scheduler can be shut down
+  def _release_job(self, job: _CopyJob): 
+    job.idle.set()
+    with self.jobs_lock: 
+      self.jobs.discard(job)
+
+  # adds copy metrics to the response of a job, emits them to the metrics sink and resolves the job's future
+  def _complete_job(self, job: _CopyJob, response: dict): 
+    _add_copy_metrics(job.copy_ctx, response, job.metrics)
+    job.future.set_result(response)
+
+  def _start_job(self, job: _CopyJob): 
+    copy_ctx = job.copy_ctx = _prepare_copy(**job.copy_args)
+    if copy_ctx['up_to_date']: 
+      self._complete_job(job, _skipped_copy_response(copy_ctx))
+      self._release_job(job)
+      return
+
+    if copy_ctx['gcs_target_object'] is not None: 
+      copy_response = _copy_gcs_to_gcs(copy_ctx)
+      job.metrics.add('bytes_copied', copy_ctx['object_size'])
+      job.metrics.add('parts_copied', 1)
+      self._complete_job(job, copy_response)
+      self._release_job(job)
+      return
+
+    if copy_ctx['compression']: 
+      transform, s3_response = _copy_compressed(copy_ctx, job.metrics, self.helper_executor)
+      self._complete_job(job, _finalize_copy(copy_ctx, transform=transform, s3_response=s3_response))
+      self._release_job(job)
+      return
+
+    if copy_ctx['total_parts'] == 1: 
+      # initiate direct file copy
+      logging.info('Starting full object copy because source object size is either less than 5Mb or less than chunk-size')
+      copy_start_time = time.time()
+      if copy_ctx['server_side']: 
+        # time of a server side copy is reported as s3 upload time
+        with job.metrics.timer('s3_upload_time'): 
+          copy_full_response = _copy_full_s3(copy_ctx['source_bucket_name'], copy_ctx['source_object_name'], copy_ctx['source_etag'], 
+                                             copy_ctx['s3_bucket_name'], copy_ctx['s3_object_name'], copy_ctx['checksum'], copy_ctx['kms_key_arn'])
+      else: 
+        copy_full_response = _copy_full(copy_ctx['gcs_object'], copy_ctx['s3_bucket_name'], copy_ctx['s3_object_name'], copy_ctx['checksum'], copy_ctx['kms_key_arn'], 
+                                        copy_ctx['streaming'], copy_ctx['target_metadata'], job.metrics)
+      job.metrics.add('bytes_copied', copy_ctx['object_size'])
+      job.metrics.add('parts_copied', 1)
+      job.metrics.add('max_part_time', time.time() - copy_start_time)
+      self._complete_job(job, _finalize_copy(copy_ctx, [ copy_full_response ], s3_response=copy_full_response))
+      self._release_job(job)
+      return
+
+    # initiate multi-part copy
+    completed_parts = {}
+    if copy_ctx['resumable']: 
+      ledger = _resume_or_create_mpu(copy_ctx)
+      copy_ctx['mpu_id'] = ledger['upload_id']
+      if ledger['chunk_size'] != copy_ctx['chunk_size']: 
+        # parts must keep the size they were uploaded with
+        copy_ctx['chunk_size'] = ledger['chunk_size']
+        copy_ctx['total_parts'] = -(-copy_ctx['object_size'] // copy_ctx['chunk_size'])
+      completed_parts = { int(part_num): part for part_num, part in ledger['parts'].items() }
+      job.ledger = _LedgerWriter(copy_ctx, ledger)
+    else: 
+      copy_ctx['mpu_id'] = _create_mpu(copy_ctx['s3_bucket_name'], copy_ctx['s3_object_name'], copy_ctx['checksum'], copy_ctx['kms_key_arn'], 
+                                       copy_ctx['target_metadata'])
+    logging.info('Starting multi-part object copy using %s parts, and checksum validation set to %s', copy_ctx['total_parts'], copy_ctx['checksum'])
+
+    job.mpu_parts = [completed_parts.get(part_num) for part_num in range(1, copy_ctx['total_parts'] + 1)]
+    job.parts_remaining = copy_ctx['total_parts'] - len(completed_parts)
+    job.pending_parts = (part_range for part_range in _iter_part_ranges(copy_ctx['object_size'], copy_ctx['total_parts'], copy_ctx['chunk_size'])
+                         if part_range[0] not in completed_parts)
+    if job.parts_remaining == 0: 
+      self._finish_job(job)
+      return
+    if copy_ctx['fan_out'] > 1 and not copy_ctx['server_side']: 
+      self._fan_out_parts(job)
+      return
+
+    max_workers = copy_ctx['max_workers']
+    if max_workers <= 1: 
+      logging.info('Using single threaded multi-part object copy because max-workers is less than or equal to 1')
+    else: 
+      logging.info('Using multi-threaded multi-part object copy with max-workers equal to %s', max_workers)
+    for _ in range(min(max_workers, job.parts_remaining)): 
+      self._submit_next_part(job)
+
+  def _submit_next_part(self, job: _CopyJob): 
+    part_range = None
+    with job.lock: 
+      if not (job.failed or job.stopped): 
+        if job.copy_ctx['resumable'] and self.deadline and time.time() > self.deadline: 
+          logging.warning('Copy deadline passed, no more parts of %s will be copied by this invocation', job.copy_ctx['source_object_uri'])
+          job.stopped = True
+        else: 
+          part_range = next(job.pending_parts, None)
+          if part_range is not None: 
+            job.parts_in_flight += 1
+            job.part_attempts[part_range[0]] = 1
+    if part_range is None: 
+      self._settle_if_idle(job)
+      return
+    self._submit_part(job, part_range)
+
+  # submits a copy of a part to the worker pool, once it has been counted in `parts_in_flight` and `part_attempts`
+  def _submit_part(self, job: _CopyJob, part_range: tuple, hedged: bool = False): 
+    future = self.executor.submit(self._run_task, job, time.perf_counter(), self._copy_part, job, *part_range, hedged)
+    future.add_done_callback(lambda f: self._on_part_done(job, part_range[0], f))
+
+  def _copy_part(self, job: _CopyJob, part_num: int, start_byte: int, end_byte: int, hedged: bool = False) -> dict: 
+    copy_ctx = job.copy_ctx
+    part_metrics = _CopyMetrics()
+    part_start_time = time.time()
+    with job.lock: 
+      cancelled = job.part_cancelled.setdefault(part_num, threading.Event())
+      if not hedged: 
+        job.running_parts[part_num] = (part_start_time, start_byte, end_byte)
+    if cancelled.is_set(): 
+      raise _CopyCancelled(f'Copy of part #{part_num} was cancelled before it started')
+    try: 
+      if copy_ctx['server_side']: 
+        # time of a server side part copy is reported as s3 upload time
+        with part_metrics.timer('s3_upload_time'): 
+          copy_part_response = _copy_part_s3(copy_ctx['source_bucket_name'], copy_ctx['source_object_name'], copy_ctx['source_etag'], copy_ctx['s3_bucket_name'], copy_ctx['s3_object_name'], 
+                                             part_num, copy_ctx['total_parts'], copy_ctx['mpu_id'], start_byte, end_byte, copy_ctx['checksum'])
+      else: 
+        copy_part_response = _copy_part(copy_ctx['gcs_object'], copy_ctx['s3_bucket_name'], copy_ctx['s3_object_name'], 
+                                        part_num, copy_ctx['total_parts'], copy_ctx['mpu_id'], start_byte, end_byte, copy_ctx['checksum'], copy_ctx['streaming'], 
+                                        part_metrics, cancelled, hedged)
+        # server side part copies don't tell us anything about throughput of this function
+        part_throughput.record(end_byte - start_byte + 1, time.time() - part_start_time)
+      part_metrics.add('bytes_copied', end_byte - start_byte + 1)
+      part_metrics.add('parts_copied', 1)
+      part_metrics.add('max_part_time', time.time() - part_start_time)
+      if not hedged: 
+        with job.lock: 
+          job.part_times.append(time.time() - part_start_time)
+      logging.info('Copied part #%s%s with metrics: %s', part_num, ' (hedged copy)' if hedged else '', { name: round(value, 3) for name, value in part_metrics.values.items() })
+    finally: 
+      # timings and retries of failed parts are reported too
+      job.metrics.merge(part_metrics)
+    # the ledger of a completed copy may have been deleted already, when the other copy of the part won
+    if job.ledger and not cancelled.is_set(): 
+      job.ledger.record([ copy_part_response ])
+    return copy_part_response
+
+  # splits the remaining parts of a job into up to `fan_out` contiguous part ranges, which are copied by part 
+  # range workers (see `_copy_part_range`). the coordinating worker thread waits for all of them, then completes 
+  # the multi-part upload as if the parts were copied here. lambda workers are invoked from the helper pool, so 
+  # an object fans out to at most `pool_size` workers
+  def _fan_out_parts(self, job: _CopyJob): 
+    copy_ctx = job.copy_ctx
+    pending_parts = list(job.pending_parts)
+    fan_out = min(copy_ctx['fan_out'], len(pending_parts))
+    if FAN_OUT_FUNCTION and fan_out > self.pool_size: 
+      logging.warning('Fanning out to %s part range workers instead of %s, the size of the worker pool', self.pool_size, fan_out)
+      fan_out = self.pool_size
+    range_size = -(-len(pending_parts) // fan_out)
+    tasks = [ dict(
+      source_uri = copy_ctx['source_object_uri'], 
+      source_generation = copy_ctx['source_generation'], 
+      target_uri = f"s3://{copy_ctx['s3_bucket_name']}/{copy_ctx['s3_object_name']}", 
+      upload_id = copy_ctx['mpu_id'], 
+      parts = [ list(part_range) for part_range in pending_parts[range_start:range_start + range_size] ], 
+      total_parts = copy_ctx['total_parts'], 
+      checksum = copy_ctx['checksum'], 
+      streaming = copy_ctx['streaming'], 
+      max_workers = copy_ctx['max_workers'], 
+      # only resumable copies stop early, other copies fail if a worker times out
+      deadline = self.deadline if copy_ctx['resumable'] else None
+    ) for range_start in range(0, len(pending_parts), range_size) ]
+    logging.info('Fanning out %s parts of %s to %s part range workers (%s)', len(pending_parts), copy_ctx['source_object_uri'], len(tasks), 
+                 f'lambda function {FAN_OUT_FUNCTION}' if FAN_OUT_FUNCTION else 'local processes')
+
+    with job.lock: 
+      job.parts_in_flight += len(pending_parts)
+    copy_error = None
+    if FAN_OUT_FUNCTION: 
+      executor, run_task = self.helper_executor, _invoke_part_range_worker
+    else: 
+      # local worker processes have connections of their own
+      executor, run_task = concurrent.futures.ProcessPoolExecutor(len(tasks), mp_context=multiprocessing.get_context('spawn')), _copy_part_range
+    try: 
+      for future in concurrent.futures.as_completed([ executor.submit(run_task, task) for task in tasks ]): 
+        try: 
+          part_range_response = future.result()
+        except Exception as e:
+          logging.error('Part range worker of %s failed: %s', copy_ctx['source_object_uri'], e)
+          copy_error = copy_error or e
+          continue
+        for name, value in part_range_response['metrics'].items(): 
+          job.metrics.add(name, value)
+        with job.lock: 
+          for copy_part_response in part_range_response['parts']: 
+            job.mpu_parts[copy_part_response['PartNumber']-1] = copy_part_response
+            job.parts_remaining -= 1
+        if job.ledger and part_range_response['parts']: 
+          job.ledger.record(part_range_response['parts'])
+        # parts the worker copied are kept above before a failed part fails the copy
+        if part_range_response.get('error'): 
+          logging.error('Part range worker of %s failed: %s', copy_ctx['source_object_uri'], part_range_response['error'])
+          copy_error = copy_error or RuntimeError(f"Part range worker failed: {part_range_response['error']}")
+    finally: 
+      if executor is not self.helper_executor: 
+        executor.shutdown()
+    with job.lock: 
+      job.parts_in_flight -= len(pending_parts)
+
+    if copy_error is None and job.parts_remaining > 0 and not copy_ctx['resumable']: 
+      copy_error = RuntimeError(f'Part range workers did not copy {job.parts_remaining} parts of {copy_ctx["source_object_uri"]}')
+    if copy_error: 
+      self._fail_job(job, copy_error)
+    elif job.parts_remaining > 0: 
+      logging.warning('Copy deadline passed, %s parts of %s were not copied by part range workers', job.parts_remaining, copy_ctx['source_object_uri'])
+      job.stopped = True
+    else: 
+      self._finish_job(job)
+      return
+    self._settle_if_idle(job)
+
+  # a part is done when its first copy succeeds. when a part was hedged, the other copy of the part is ignored 
+  # once it completes, and a failed copy only fails the object if the part has no other copy in flight
+  def _on_part_done(self, job: _CopyJob, part_num: int, future: concurrent.futures.Future): 
+    with job.lock: 
+      job.parts_in_flight -= 1
+      job.part_attempts[part_num] -= 1
+      part_done = job.mpu_parts[part_num-1] is not None
+      other_attempts = job.part_attempts[part_num] > 0
+      if not other_attempts: 
+        job.running_parts.pop(part_num, None)
+
+    if future.cancelled(): 
+      return # a copy which lost to the other copy of its part, and was still queued at shutdown
+    if future.exception(): 
+      if part_done or other_attempts: 
+        logging.warning('A copy of part #%s of %s failed, but another copy of the part %s: %s', part_num, job.copy_ctx['source_object_uri'], 
+                        'succeeded' if part_done else 'is in flight', future.exception())
+      else: 
+        self._fail_job(job, future.exception())
+      self._settle_if_idle(job)
+      return
+    if part_done: 
+      self._settle_if_idle(job)
+      return
+
+    copy_part_response = future.result()
+    logging.info('copy_part response: %s', copy_part_response)
+    with job.lock: 
+      job.mpu_parts[copy_part_response['PartNumber']-1] = copy_part_response
+      job.running_parts.pop(part_num, None)
+      cancelled = job.part_cancelled.get(part_num)
+    if cancelled is not None: 
+      cancelled.set() # stops the other copy of a hedged part
+      job.parts_remaining -= 1
+      last_part = job.parts_remaining == 0
+    if last_part: 
+      self._submit_task(job, self._finish_job, job)
+    else: 
+      self._submit_next_part(job)
+
+  # once a failed or stopped job has no parts in flight, either its multi-part upload is aborted, or 
+  # (for resumable copies) left in place for a later invocation to resume
+  def _settle_if_idle(self, job: _CopyJob): 
+    with job.lock: 
+      if job.idle.is_set() or job.parts_in_flight > 0 or not (job.failed or job.stopped): 
+        return
+      job.idle.set()
+    with self.jobs_lock: 
+      self.jobs.discard(job)
+
+    copy_ctx = job.copy_ctx or {}
+    if not copy_ctx.get('mpu_id'): 
+      return
+    if job.ledger: 
+      job.ledger.flush()
+    if copy_ctx['resumable']: 
+      logging.info('S3 multi-part upload %s of s3://%s/%s can be resumed by copying the object again', 
+                   copy_ctx['mpu_id'], copy_ctx['s3_bucket_name'], copy_ctx['s3_object_name'])
+    else: 
+      _abort_mpu(copy_ctx['s3_bucket_name'], copy_ctx['s3_object_name'], copy_ctx['mpu_id'])
+    if job.stopped and not job.failed: 
+      self._complete_job(job, _incomplete_copy_response(copy_ctx, job.parts_remaining))
+
+  # checks copies in flight every HEDGE_CHECK_INTERVAL seconds for straggler parts, until the scheduler shuts down
+  def _watch_stragglers(self): 
+    while not self._closed.wait(HEDGE_CHECK_INTERVAL): 
+      with self.jobs_lock: 
+        jobs = list(self.jobs)
+      for job in jobs: 
+        try: 
+          self._hedge_stragglers(job)
+        except Exception as e:
+          logging.warning('Unable to hedge straggler parts of %s: %s', job.copy_args.get('source_object_uri'), e)
+
+  # submits a second copy of parts which have been running for much longer than other parts of the same object
+  def _hedge_stragglers(self, job: _CopyJob): 
+    with job.lock: 
+      if job.failed or job.stopped or len(job.part_times) < HEDGE_MIN_SAMPLES or not job.running_parts: 
+        return
+      hedge_budget = max(1, job.copy_ctx['total_parts'] // HEDGE_MAX_PARTS_RATIO) - len(job.hedged_parts)
+      if hedge_budget <= 0: 
+        return
+      part_times = sorted(job.part_times)
+      percentile_time = part_times[min(len(part_times) - 1, int(len(part_times) * HEDGE_PERCENTILE / 100))]
+      hedge_after = max(HEDGE_MIN_DELAY, HEDGE_MULTIPLIER * percentile_time)
+      now = time.time()
+      stragglers = [ (part_num, start_byte, end_byte) for part_num, (start_time, start_byte, end_byte) in job.running_parts.items() 
+                     if part_num not in job.hedged_parts and now - start_time > hedge_after ][:hedge_budget]
+      for part_num, _, _ in stragglers: 
+        job.hedged_parts.add(part_num)
+        job.part_attempts[part_num] += 1
+        job.parts_in_flight += 1
+
+    for part_range in stragglers: 
+      logging.info('Hedging part #%s of %s, which has been copying for longer than %.2f seconds (p%s part copy time: %.2f seconds)', 
+                   part_range[0], job.copy_ctx['source_object_uri'], hedge_after, HEDGE_PERCENTILE, percentile_time)
+      job.metrics.add('hedged_parts', 1)
+      self._submit_part(job, part_range, hedged=True)
+
+  # both copies of a hedged part may have been uploaded, and s3 keeps the one uploaded last. etags of uploads 
+  # of the same data may differ (e.g. with sse-kms encryption), so hedged parts use the etags s3 has listed
+  def _reconcile_hedged_parts(self, job: _CopyJob): 
+    copy_ctx = job.copy_ctx
+    uploaded_parts = _list_mpu_parts(copy_ctx['s3_bucket_name'], copy_ctx['s3_object_name'], copy_ctx['mpu_id']) or {}
+    for part_num in job.hedged_parts: 
+      uploaded_part = uploaded_parts.get(part_num)
+      mpu_part = job.mpu_parts[part_num-1]
+      if uploaded_part and uploaded_part['ETag'] != mpu_part['ETag']: 
+        logging.info('Using ETag %s listed by S3 for hedged part #%s instead of %s', uploaded_part['ETag'], part_num, mpu_part['ETag'])
+        mpu_part['ETag'] = uploaded_part['ETag']
+        if 'ChecksumCRC32C' in mpu_part and uploaded_part.get('ChecksumCRC32C'): 
+          mpu_part['ChecksumCRC32C'] = uploaded_part['ChecksumCRC32C']
+
+  def _finish_job(self, job: _CopyJob): 
+    copy_ctx = job.copy_ctx
+    if job.hedged_parts: 
+      self._reconcile_hedged_parts(job)
+      try: 
+        s3_response = _complete_mpu(copy_ctx['s3_bucket_name'], copy_ctx['s3_object_name'], copy_ctx['mpu_id'], job.mpu_parts)
+      except Exception as e:
+        # the other copy of a hedged part may have been uploaded after parts were listed
+        logging.warning('Unable to complete S3 multi-part upload with hedged parts, listing parts again: %s', e)
+        self._reconcile_hedged_parts(job)
+        s3_response = _complete_mpu(copy_ctx['s3_bucket_name'], copy_ctx['s3_object_name'], copy_ctx['mpu_id'], job.mpu_parts)
+    else: 
+      s3_response = _complete_mpu(copy_ctx['s3_bucket_name'], copy_ctx['s3_object_name'], copy_ctx['mpu_id'], job.mpu_parts)
+    if job.ledger: 
+      job.ledger.close()
+      _delete_ledger(copy_ctx['s3_bucket_name'], copy_ctx['s3_object_name'])
+    self._complete_job(job, _finalize_copy(copy_ctx, job.mpu_parts, s3_response=s3_response))
+    self._release_job(job)
+
+
+# copies parts of a fan out copy as a part range worker (in a lambda invocation or a local process). parts are 
+# copied by up to `max_workers` threads, and no part is started after the task deadline, if it has one, or after 
+# a part failed. returns the copied parts (also when a part failed, so the coordinator keeps them), the error 
+# message of the first failed part (None if no part failed) and copy metrics of the part range
+def _copy_part_range(task: dict) -> dict: 
+  source_bucket_name, source_object_name = _split_uri(task['source_uri'])
+  s3_bucket_name, s3_object_name = _split_uri(task['target_uri'])
+  max_workers = min(task['max_workers'], len(task['parts']))
+  _ensure_connection_pools(max_workers + CONNECTION_POOL_HEADROOM)
+  # reads are pinned to the generation the coordinator planned the copy for
+  gcs_object = _get_gcs_client().bucket(source_bucket_name).blob(source_object_name, generation=int(task['source_generation']))
+  logging.info('Copying parts #%s to #%s of %s using up to %s workers', task['parts'][0][0], task['parts'][-1][0], task['source_uri'], max_workers)
+
+  metrics = _CopyMetrics()
+  part_failed = threading.Event()
+  def copy_part(part_num: int, start_byte: int, end_byte: int) -> dict: 
+    if part_failed.is_set() or (task.get('deadline') and time.time() > task['deadline']): 
+      return None # left for the coordinator to resume
+    part_metrics = _CopyMetrics()
+    part_start_time = time.time()
+    try: 
+      copy_part_response = _copy_part(gcs_object, s3_bucket_name, s3_object_name, part_num, task['total_parts'], task['upload_id'], start_byte, end_byte, 
+                                      task['checksum'], task['streaming'], part_metrics)
+      part_throughput.record(end_byte - start_byte + 1, time.time() - part_start_time)
+      part_metrics.add('bytes_copied', end_byte - start_byte + 1)
+      part_metrics.add('parts_copied', 1)
+      part_metrics.add('max_part_time', time.time() - part_start_time)
+    except Exception: 
+      part_failed.set()
+      raise
+    finally: 
+      metrics.merge(part_metrics)
+    return copy_part_response
+
+  copy_part_responses = []
+  copy_error = None
+  with concurrent.futures.ThreadPoolExecutor(max_workers) as executor: 
+    part_futures = { executor.submit(copy_part, *part_range): part_range[0] for part_range in task['parts'] }
+    for part_future in concurrent.futures.as_completed(part_futures): 
+      try: 
+        copy_part_response = part_future.result()
+      except Exception as e:
+        logging.error('Error encountered copying part #%s of %s: %s', part_futures[part_future], task['source_uri'], e)
+        copy_error = copy_error or f'Copying part #{part_futures[part_future]} failed: {e}'
+        continue
+      if copy_part_response is not None: 
+        copy_part_responses.append(copy_part_response)
+  return dict(
+    parts = sorted(copy_part_responses, key=lambda copy_part_response: copy_part_response['PartNumber']), 
+    error = copy_error, 
+    metrics = metrics.values
+  )
+
+# invokes the FAN_OUT_FUNCTION lambda function as the part range worker of a task, and returns its response
+def _invoke_part_range_worker(task: dict) -> dict: 
+  payload = json.dumps({'part_range_task': task}).encode('utf-8')
+  lambda_response = _call_with_retries(lambda: _get_lambda_client().invoke(FunctionName=FAN_OUT_FUNCTION, InvocationType='RequestResponse', Payload=payload), 
+                                       f'invoking part range worker {FAN_OUT_FUNCTION}')
+  response_payload = json.loads(lambda_response['Payload'].read())
+  if lambda_response.get('FunctionError'): 
+    raise RuntimeError(f"Part range worker failed with an {lambda_response['FunctionError']} error: {response_payload.get('errorMessage')}")
+  if response_payload.get('statusCode') != 200: 
+    raise RuntimeError(f"Part range worker returned status {response_payload.get('statusCode')}: {response_payload.get('body')}")
+  return response_payload['body']
+
+
+# asyncio engine. gcs to s3 copies are made by a single thread running many concurrent aiohttp transfers: byte 
+# ranges are read with the gcs json api, and parts are uploaded with sigv4 signed s3 requests. metadata calls 
+# (e.g. creating and completing multi-part uploads, ledgers and sync checks) are made with the sdk clients in 
+# worker threads, and server side copies are handed to the threads engine. part data is held in memory, so the 
+# part data in flight is limited to PLANNER_MEMORY_FRACTION of function memory
+
+# error response of an http request made by the asyncio engine, `code` is the http status (see `_is_retryable`)
+class _AsyncHttpError(IOError): 
+  def __init__(self, status: int, message: str): 
+    super().__init__(f'HTTP status {status}: {message}')
+    self.code = status
+
+# limits bytes of part data held in memory by the asyncio engine. a part larger than the whole budget 
+# can still be held once nothing else is
+class _AsyncMemoryBudget: 
+  def __init__(self, limit: int): 
+    self.limit = limit
+    self.used = 0
+    self._condition = asyncio.Condition()
+
+  async def acquire(self, num_bytes: int): 
+    async with self._condition: 
+      await self._condition.wait_for(lambda: self.used == 0 or self.used + num_bytes <= self.limit)
+      self.used += num_bytes
+
+  async def release(self, num_bytes: int): 
+    async with self._condition: 
+      self.used -= num_bytes
+      self._condition.notify_all()
+
+# asyncio variant of `_call_with_retries`
+async def _call_with_retries_async(coro_fn, description: str, metrics: _CopyMetrics = None, retry_metric: str = None): 
+  for attempt in range(1, RETRY_ATTEMPTS + 1): 
+    try: 
+      return await coro_fn()
+    except Exception as e:
+      if attempt >= RETRY_ATTEMPTS or not _is_retryable(e): 
+        raise
+      delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+      logging.warning('Encountered an error %s (attempt %s of %s), retrying after %.2f seconds: %s', description, attempt, RETRY_ATTEMPTS, delay, e)
+      if metrics is not None: 
+        metrics.add(retry_metric, 1)
+      await asyncio.sleep(delay)
+
+# returns the authorization header of gcs json api requests, refreshing the gcp access token if it has expired
+def _gcs_auth_headers() -> dict: 
+  from google.auth.credentials import AnonymousCredentials
+  import google.auth.transport.requests
+
+  credentials = _get_gcp_credentials()
+  if isinstance(credentials, AnonymousCredentials): 
+    return {}
+  with client_lock: 
+    if not credentials.valid: 
+      credentials.refresh(google.auth.transport.requests.Request())
+    return {'Authorization': f'Bearer {credentials.token}'}
+
+# copies objects with aiohttp transfers, with at most `pool_size` part transfers in flight
+class _AsyncCopyEngine: 
+  def __init__(self, pool_size: int, deadline: float = None): 
+    import aiohttp
+    import boto3
+    from botocore.config import Config
+
+    self.pool_size = max(1, pool_size)
+    self.deadline = deadline
+    self.transfers = asyncio.Semaphore(self.pool_size)
+    self.memory_budget = _AsyncMemoryBudget(int(_available_memory() * PLANNER_MEMORY_FRACTION))
+    self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.pool_size * 2 + CONNECTION_POOL_HEADROOM), 
+                                         timeout=aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60))
+    s3_client = _get_s3_client()
+    self.s3_endpoint = s3_client.meta.endpoint_url
+    self.s3_region = s3_client.meta.region_name
+    self.aws_credentials = boto3.Session().get_credentials()
+    # S3SigV4Auth only skips hashing the payload when told so by the s3 config of a client config (or when the 
+    # request has a checksum header over https), so requests carry this config to be sent with an unsigned payload
+    self.signing_config = Config(s3={'payload_signing_enabled': False})
+    self.gcs_endpoint = os.environ.get('STORAGE_EMULATOR_HOST') or GCS_API_ENDPOINT
+    self.gcp_proxy = os.environ.get('GCP_PROXY')
+    if self.gcp_proxy and '://' not in self.gcp_proxy: 
+      self.gcp_proxy = 'http://' + self.gcp_proxy
+    self.scheduler = None # threads engine used for server side copies, created when first needed
+
+  async def close(self): 
+    await self.session.close()
+    if self.scheduler: 
+      await asyncio.to_thread(self.scheduler.shutdown)
+
+  # reads a byte range of a gcs object, pinned to the generation of the object when the copy was prepared
+  async def read_gcs(self, copy_ctx: dict, start_byte: int, end_byte: int, metrics: _CopyMetrics) -> bytes: 
+    import yarl
+
+    url = yarl.URL(f"{self.gcs_endpoint}/storage/v1/b/{quote(copy_ctx['source_bucket_name'], safe='')}/o/{quote(copy_ctx['source_object_name'], safe='')}", encoded=True)
+    params = {'alt': 'media', 'ifGenerationMatch': copy_ctx['source_generation']}
+
+    async def read(): 
+      headers = await asyncio.to_thread(_gcs_auth_headers)
+      headers['Range'] = f'bytes={start_byte}-{end_byte}'
+      with metrics.timer('gcs_read_time'): 
+        async with self.session.get(url, params=params, headers=headers, proxy=self.gcp_proxy) as response: 
+          data = await response.read()
+          if response.status >= 300: 
+            raise _AsyncHttpError(response.status, data[:500].decode('utf-8', 'replace'))
+      if len(data) != end_byte - start_byte + 1: 
+        raise IOError(f'Read {len(data)} bytes from GCS object range (start byte: {start_byte}; end byte: {end_byte}), expected {end_byte - start_byte + 1}')
+      return data
+    return await _call_with_retries_async(read, f'reading GCS object range (start byte: {start_byte}; end byte: {end_byte})', metrics, 'gcs_retries')
+
+  # uploads data to s3 with a sigv4 signed put request (a put_object, or an upload_part if `params` has a 
+  # part number and upload id), returning the response headers
+  async def put_s3(self, s3_bucket_name: str, s3_object_name: str, data: bytes, params: dict, headers: dict, metrics: _CopyMetrics, description: str): 
+    import yarl
+    from botocore.auth import S3SigV4Auth
+    from botocore.awsrequest import AWSRequest
+
+    endpoint = urlparse(self.s3_endpoint)
+    quoted_name = quote(s3_object_name, safe='/~')
+    if endpoint.hostname.endswith('amazonaws.com') and '.' not in s3_bucket_name: 
+      url = f'{endpoint.scheme}://{s3_bucket_name}.{endpoint.netloc}/{quoted_name}' # virtual hosted style
+    else: 
+      url = f"{self.s3_endpoint.rstrip('/')}/{s3_bucket_name}/{quoted_name}" # path style, e.g. for emulators
+    if params: 
+      url += '?' + urlencode(params, quote_via=quote, safe='-_.~')
+
+    async def put(): 
+      request = AWSRequest(method='PUT', url=url, data=data, headers=headers)
+      # the payload is sent unsigned (x-amz-content-sha256: UNSIGNED-PAYLOAD) rather than sha256 hashed on the event 
+      # loop thread, it is protected by tls (and crc32c if enabled)
+      request.context['client_config'] = self.signing_config
+      S3SigV4Auth(self.aws_credentials.get_frozen_credentials(), 's3', self.s3_region).add_auth(request)
+      with metrics.timer('s3_upload_time'): 
+        async with self.session.put(yarl.URL(url, encoded=True), data=data, headers=dict(request.headers.items())) as response: 
+          body = await response.read()
+          if response.status >= 300: 
+            raise _AsyncHttpError(response.status, body[:500].decode('utf-8', 'replace'))
+          return response.headers
+    return await _call_with_retries_async(put, description, metrics, 's3_retries')
+
+  # reads a byte range of the source object and uploads it to s3, within the memory budget. returns the 
+  # upload response headers and base64 crc32c checksum (None if checksum is false)
+  async def transfer(self, copy_ctx: dict, start_byte: int, end_byte: int, params: dict, headers: dict, metrics: _CopyMetrics, description: str) -> tuple: 
+    num_bytes = end_byte - start_byte + 1
+    await self.memory_budget.acquire(num_bytes)
+    try: 
+      data = await self.read_gcs(copy_ctx, start_byte, end_byte, metrics) if num_bytes > 0 else b''
+      crc_checksum_b64 = None
+      if copy_ctx['checksum']: 
+        with metrics.timer('crc_time'): 
+          crc_checksum_b64 = _crc32c_b64(crc32c.crc32c(data))
+        headers = dict(headers, **{'x-amz-checksum-crc32c': crc_checksum_b64})
+      s3_headers = await self.put_s3(copy_ctx['s3_bucket_name'], copy_ctx['s3_object_name'], data, params, headers, metrics, description)
+      return s3_headers, crc_checksum_b64
+    finally: 
+      await self.memory_budget.release(num_bytes)
+
+  # copies an object, returning its copy response
+  async def copy_object(self, copy_args: dict) -> dict: 
+    now = datetime.now()
+    copy_route = (urlparse(copy_args['source_object_uri'].format(now)).scheme, urlparse(copy_args['target_object_uri'].format(now)).scheme)
+    if copy_route != ('gs', 's3') or copy_args.get('source_error') or (copy_args.get('fan_out') or DEFAULT_FAN_OUT) > 1 or copy_args.get('compression'): 
+      # server side copies don't move data through this function, fan out copies move it through part range 
+      # workers, and compressed copies through compression threads
+      if self.scheduler is None: 
+        self.scheduler = _CopyScheduler(DEFAULT_POOL_SIZE, self.deadline)
+      return await asyncio.wrap_future(self.scheduler.submit(copy_args))
+
+    if copy_args.get('streaming'): 
+      logging.info('Streaming is not used by the asyncio engine, which limits part data in memory instead')
+    metrics = _CopyMetrics()
+    copy_ctx = await asyncio.to_thread(_prepare_copy, **dict(copy_args, streaming=False), engine='asyncio')
+    if copy_ctx['up_to_date']: 
+      response = _skipped_copy_response(copy_ctx)
+    elif copy_ctx['total_parts'] == 1: 
+      response = await self._copy_full(copy_ctx, metrics)
+    else: 
+      response = await self._copy_mpu(copy_ctx, metrics)
+    _add_copy_metrics(copy_ctx, response, metrics)
+    return response
+
+  async def _copy_full(self, copy_ctx: dict, metrics: _CopyMetrics) -> dict: 
+    logging.info('Starting full object copy because source object size is either less than 5Mb or less than chunk-size')
+    headers = { 'x-amz-meta-' + name: value for name, value in copy_ctx['target_metadata'].items() }
+    sse_args = _sse_args(copy_ctx['kms_key_arn'])
+    headers['x-amz-server-side-encryption'] = sse_args['ServerSideEncryption']
+    if 'SSEKMSKeyId' in sse_args: 
+      headers['x-amz-server-side-encryption-aws-kms-key-id'] = sse_args['SSEKMSKeyId']
+    copy_start_time = time.time()
+    async with self.transfers: 
+      s3_headers, crc_checksum_b64 = await self.transfer(copy_ctx, 0, copy_ctx['object_size'] - 1, {}, headers, metrics, 'writing GCS object to S3')
+    metrics.add('bytes_copied', copy_ctx['object_size'])
+    metrics.add('parts_copied', 1)
+    metrics.add('max_part_time', time.time() - copy_start_time)
+    s3_response = dict(ETag=s3_headers.get('ETag'), ChecksumCRC32C=s3_headers.get('x-amz-checksum-crc32c'))
+    return await asyncio.to_thread(_finalize_copy, copy_ctx, [ {'ChecksumCRC32C': crc_checksum_b64} ], None, s3_response)
+
+  async def _copy_mpu(self, copy_ctx: dict, metrics: _CopyMetrics) -> dict: 
+    completed_parts = {}
+    ledger = None
+    if copy_ctx['resumable']: 
+      ledger = await asyncio.to_thread(_resume_or_create_mpu, copy_ctx)
+      copy_ctx['mpu_id'] = ledger['upload_id']
+      if ledger['chunk_size'] != copy_ctx['chunk_size']: 
+        # parts must keep the size they were uploaded with
+        copy_ctx['chunk_size'] = ledger['chunk_size']
+        copy_ctx['total_parts'] = -(-copy_ctx['object_size'] // copy_ctx['chunk_size'])
+      completed_parts = { int(part_num): part for part_num, part in ledger['parts'].items() }
+      ledger = _LedgerWriter(copy_ctx, ledger)
+    else: 
+      copy_ctx['mpu_id'] = await asyncio.to_thread(_create_mpu, copy_ctx['s3_bucket_name'], copy_ctx['s3_object_name'], copy_ctx['checksum'], 
+                                                   copy_ctx['kms_key_arn'], copy_ctx['target_metadata'])
+    logging.info('Starting multi-part object copy using %s parts with up to %s concurrent transfers, and checksum validation set to %s', 
+                 copy_ctx['total_parts'], copy_ctx['max_workers'], copy_ctx['checksum'])
+
+    async def copy_part(part_num: int, start_byte: int, end_byte: int) -> dict: 
+      wait_start_time = time.perf_counter()
+      async with self.transfers: 
+        if copy_ctx['resumable'] and self.deadline and time.time() > self.deadline: 
+          return None # left for a later invocation
+        queue_wait_time = time.perf_counter() - wait_start_time
+        metrics.add('queue_wait_time', queue_wait_time)
+        metrics.add('max_queue_wait_time', queue_wait_time)
+        part_start_time = time.time()
+        s3_headers, crc_checksum_b64 = await self.transfer(copy_ctx, start_byte, end_byte, {'partNumber': part_num, 'uploadId': copy_ctx['mpu_id']}, {}, 
+                                                           metrics, f'uploading GCS object chunk #{part_num} to S3')
+      part_throughput.record(end_byte - start_byte + 1, time.time() - part_start_time)
+      metrics.add('bytes_copied', end_byte - start_byte + 1)
+      metrics.add('parts_copied', 1)
+      metrics.add('max_part_time', time.time() - part_start_time)
+      copy_part_response = {"ETag": s3_headers['ETag'], "PartNumber": part_num}
+      if copy_ctx['checksum']: 
+        copy_part_response['ChecksumCRC32C'] = crc_checksum_b64
+      if ledger: 
+        ledger.record([ copy_part_response ]) # doesn't block, the ledger is saved in the background
+      return copy_part_response
+
+    # parts are fed through a window of up to `max_workers` part tasks, a part is started as another completes 
+    # (like the submission window of the threads engine), so tasks aren't created for all parts of a large object 
+    # up front, and a failed part stops the copy as soon as it fails
+    pending_parts = (part_range for part_range in _iter_part_ranges(copy_ctx['object_size'], copy_ctx['total_parts'], copy_ctx['chunk_size']) 
+                     if part_range[0] not in completed_parts)
+    part_tasks, done_tasks = set(), set()
+    try: 
+      while True: 
+        if not (copy_ctx['resumable'] and self.deadline and time.time() > self.deadline): 
+          for part_range in itertools.islice(pending_parts, copy_ctx['max_workers'] - len(part_tasks)): 
+            part_tasks.add(asyncio.ensure_future(copy_part(*part_range)))
+        if not part_tasks: 
+          break
+        done_tasks, part_tasks = await asyncio.wait(part_tasks, return_when=asyncio.FIRST_COMPLETED)
+        for part_task in done_tasks: 
+          part_response = part_task.result()
+          if part_response is not None: 
+            completed_parts[part_response['PartNumber']] = part_response
+    except Exception as e:
+      logging.error('Copy of %s failed with an exception [%s]. Aborting copy operation now!', copy_ctx['source_object_uri'], e)
+      for task in part_tasks: 
+        task.cancel()
+      await asyncio.gather(*part_tasks, *done_tasks, return_exceptions=True)
+      if ledger: 
+        await asyncio.to_thread(ledger.flush)
+      if copy_ctx['resumable']: 
+        logging.info('S3 multi-part upload %s of s3://%s/%s can be resumed by copying the object again', 
+                     copy_ctx['mpu_id'], copy_ctx['s3_bucket_name'], copy_ctx['s3_object_name'])
+      else: 
+        await asyncio.to_thread(_abort_mpu, copy_ctx['s3_bucket_name'], copy_ctx['s3_object_name'], copy_ctx['mpu_id'])
+      raise
+
+    parts_remaining = copy_ctx['total_parts'] - len(completed_parts)
+    if parts_remaining > 0: 
+      logging.warning('Copy deadline passed, no more parts of %s will be copied by this invocation', copy_ctx['source_object_uri'])
+      if ledger: 
+        await asyncio.to_thread(ledger.flush)
+      return _incomplete_copy_response(copy_ctx, parts_remaining)
+    mpu_parts = [ completed_parts[part_num] for part_num in range(1, copy_ctx['total_parts'] + 1) ]
+    s3_response = await asyncio.to_thread(_complete_mpu, copy_ctx['s3_bucket_name'], copy_ctx['s3_object_name'], copy_ctx['mpu_id'], mpu_parts)
+    if ledger: 
+      await asyncio.to_thread(ledger.close)
+      await asyncio.to_thread(_delete_ledger, copy_ctx['s3_bucket_name'], copy_ctx['s3_object_name'])
+    return await asyncio.to_thread(_finalize_copy, copy_ctx, mpu_parts, None, s3_response)
+
+  # copies objects from an iterable of `_prepare_copy` arguments, with at most `window` objects in flight. 
+  # returns the copy responses (or exceptions that failed copies) in the same order
+  async def copy_objects(self, copy_args_iter, window: int) -> list: 
+    objects_in_flight = asyncio.Semaphore(window)
+    copy_args_iter = iter(copy_args_iter)
+    copy_tasks = []
+    while True: 
+      # listing source objects makes blocking calls, so it happens in a worker thread
+      copy_args = await asyncio.to_thread(next, copy_args_iter, None)
+      if copy_args is None: 
+        break
+      await objects_in_flight.acquire()
+      copy_task = asyncio.ensure_future(self.copy_object(copy_args))
+      copy_task.add_done_callback(lambda _: objects_in_flight.release())
+      copy_tasks.append(copy_task)
+    return await asyncio.gather(*copy_tasks, return_exceptions=True)
+
+# copies objects with the asyncio engine, and returns futures resolved with their copy responses (or the 
+# exceptions that failed them) in the same order as `copy_args_iter`, like `_CopyScheduler.map`
+def _copy_objects_async(copy_args_iter, pool_size: int, deadline: float = None) -> list: 
+  async def copy_objects(): 
+    engine = _AsyncCopyEngine(pool_size, deadline)
+    try: 
+      return await engine.copy_objects(copy_args_iter, engine.pool_size * 4)
+    finally: 
+      await engine.close()
+
+  copy_futures = []
+  for copy_result in asyncio.run(copy_objects()): 
+    copy_future = concurrent.futures.Future()
+    if isinstance(copy_result, Exception): 
+      copy_future.set_exception(copy_result)
+    else: 
+      copy_future.set_result(copy_result)
+    copy_futures.append(copy_future)
+  return copy_futures
+
+
+# copy a gcs object to s3 using mpu
+def copy_object_gcs_to_s3(source_object_uri, target_object_uri, chunk_size: int = None, max_workers: int = None, checksum: bool = False, kms_key_arn: str = None, streaming: bool = False, resumable: bool = False, sync: bool = False, 
+                          engine: str = DEFAULT_ENGINE, fan_out: int = DEFAULT_FAN_OUT, compression: str = None, verify: bool = DEFAULT_VERIFY_ENABLED) -> dict: 
+  copy_args = dict(source_object_uri=source_object_uri, target_object_uri=target_object_uri, chunk_size=chunk_size, 
+                   max_workers=max_workers, checksum=checksum, kms_key_arn=kms_key_arn, streaming=streaming, resumable=resumable, sync=sync, fan_out=fan_out, 
+                   compression=compression, verify=verify)
+  if engine == 'asyncio': 
+    pool_size = max_workers or ASYNC_POOL_SIZE
+    _ensure_connection_pools(2 * DEFAULT_POOL_SIZE + CONNECTION_POOL_HEADROOM)
+    return _copy_objects_async([ copy_args ], pool_size)[0].result()
+  # a dedicated scheduler sized to max_workers keeps the behavior of a standalone single object copy
+  pool_size = max_workers or DEFAULT_POOL_SIZE
+  _ensure_connection_pools(2 * pool_size + CONNECTION_POOL_HEADROOM)
+  with _CopyScheduler(pool_size) as scheduler: 
+    return scheduler.submit(copy_args).result()
+
+# returns true if a (formatted) gcs source uri refers to many objects, either as a prefix (ending with `/`) 
+# or as a glob pattern (containing `*`, `?` or `[`)
+def _is_source_pattern(source_object_uri: str) -> bool: 
+  return source_object_uri.endswith('/') or any(c in source_object_uri for c in '*?[')
+
+# escapes braces in a uri, so it is left unchanged when formatted with the current date by `_prepare_copy`
+def _escape_format(uri: str) -> str: 
+  return uri.replace('{', '{{').replace('}', '}}')
+
+# expands a gcs source uri which is a prefix or glob pattern into the objects it matches, listing them page by
+# page so copies can start before listing completes. yields (source_uri, target_uri, gcs_object) tuples, where 
+# the target uri is the target prefix followed by the object name relative to the source's literal prefix. 
+# a source uri which refers to a single object is yielded unchanged (with gcs_object set to None)
+def _expand_source(source_object_uri: str, target_object_uri: str): 
+  now = datetime.now() 
+  formatted_source_uri = source_object_uri.format(now)
+  if urlparse(formatted_source_uri).scheme != 'gs' or not _is_source_pattern(formatted_source_uri): 
+    yield source_object_uri, target_object_uri, None
+    return
+
+  gcs_bucket_name, pattern = _split_uri(formatted_source_uri)
+  glob_index = min([pattern.find(c) for c in '*?[' if c in pattern], default=len(pattern))
+  prefix = pattern[:pattern.rfind('/', 0, glob_index) + 1] # literal "directory" part of the pattern
+  list_blobs_args = dict(prefix=prefix, page_size=LIST_PAGE_SIZE)
+  if glob_index < len(pattern): 
+    list_blobs_args['match_glob'] = pattern
+  target_prefix_uri = target_object_uri.format(now)
+  if not target_prefix_uri.endswith('/'): 
+    target_prefix_uri += '/'
+  logging.info('Listing GCS source objects in bucket `%s` using: %s', gcs_bucket_name, list_blobs_args)
+
+  for gcs_object in _get_gcs_client().list_blobs(gcs_bucket_name, **list_blobs_args): 
+    if gcs_object.name.endswith('/'): 
+      continue # skip folder placeholder objects
+    relative_name = gcs_object.name[len(prefix):]
+    yield _escape_format(f'gs://{gcs_bucket_name}/{gcs_object.name}'), _escape_format(target_prefix_uri + relative_name), gcs_object
+
+# generates `_prepare_copy` arguments for each object definition in a lambda payload, applying payload defaults. 
+# prefix and glob sources are expanded into one copy per matching object
+def _iter_copy_args(object_defs: list, defaults: dict): 
+  # chunk size and max workers are planned per object unless set in the payload
+  default_chunk_size = defaults.get('chunk_size')
+  default_max_workers = defaults.get('max_workers')
+  default_checksum = defaults.get('checksum', DEFAULT_CHECKSUM_ENABLED)
+  default_kms_key_arn = defaults.get('kms_key_arn')
+  default_streaming = defaults.get('streaming', DEFAULT_STREAMING_ENABLED)
+  default_resumable = defaults.get('resumable', DEFAULT_RESUMABLE_ENABLED)
+  default_sync = defaults.get('sync', DEFAULT_SYNC_ENABLED)
+  default_verify = defaults.get('verify', DEFAULT_VERIFY_ENABLED)
+  default_fan_out = defaults.get('fan_out', DEFAULT_FAN_OUT)
+  default_compression = defaults.get('compression')
+
+  copy_count = 0
+  for object_def in object_defs: 
+    copy_options = dict(
+      chunk_size = object_def.get('chunk_size', default_chunk_size), 
+      max_workers = object_def.get('max_workers', default_max_workers), 
+      checksum = _is_true(object_def.get('checksum', default_checksum)), 
+      kms_key_arn = object_def.get('kms_key_arn', default_kms_key_arn), 
+      streaming = _is_true(object_def.get('streaming', default_streaming)), 
+      resumable = _is_true(object_def.get('resumable', default_resumable)), 
+      sync = _is_true(object_def.get('sync', default_sync)), 
+      verify = _is_true(object_def.get('verify', default_verify)), 
+      fan_out = object_def.get('fan_out', default_fan_out), 
+      compression = object_def.get('compression', default_compression)
+    )
+    try: 
+      for source_object_uri, target_object_uri, gcs_object in _expand_source(object_def.get('source_uri'), object_def.get('target_uri')): 
+        copy_count += 1
+        logging.info('Copying object #%s: %s -> %s', copy_count, source_object_uri, target_object_uri)
+        yield dict(source_object_uri=source_object_uri, target_object_uri=target_object_uri, gcs_object=gcs_object, **copy_options)
+    except Exception as e:
+      # report the listing failure as a failed copy of the source
+      logging.error('Error encountered listing GCS source objects of %s: %s', object_def.get('source_uri'), e)
+      copy_count += 1
+      yield dict(source_object_uri=object_def.get('source_uri'), target_object_uri=object_def.get('target_uri'), source_error=e, **copy_options)
+
+# fetches metadata of gcs source objects ahead of their copies, so that copies of many small objects don't each 
+# wait on a metadata request before they can start. blobs of single object gcs sources (objects of prefix and 
+# glob sources already have theirs from listing) are fetched for up to `window` copies ahead, by `max_workers` 
+# concurrent requests, and copy arguments are yielded in the same order. a source which can't be fetched here 
+# is left to `_prepare_copy`, which fetches it again and fails its copy if it still can't
+def _prefetch_source_metadata(copy_args_iter, window: int = METADATA_PREFETCH_WINDOW, max_workers: int = METADATA_PREFETCH_WORKERS): 
+  def fetch(copy_args: dict) -> dict: 
+    if copy_args.get('gcs_object') is not None or copy_args.get('source_error'): 
+      return copy_args
+    try: 
+      # format uris once, so that the blob matches the source uri its copy formats
+      now = datetime.now() 
+      source_object_uri = copy_args['source_object_uri'].format(now)
+      if urlparse(source_object_uri).scheme != 'gs': 
+        return copy_args
+      source_bucket_name, source_object_name = _split_uri(source_object_uri)
+      gcs_object = _get_gcs_client().bucket(source_bucket_name).get_blob(source_object_name)
+    except Exception as e:
+      logging.warning('Unable to prefetch metadata of GCS source object %s: %s', copy_args['source_object_uri'], e)
+      return copy_args
+    if gcs_object is None: 
+      return copy_args
+    return dict(copy_args, source_object_uri=_escape_format(source_object_uri), 
+                target_object_uri=_escape_format(copy_args['target_object_uri'].format(now)), gcs_object=gcs_object)
+
+  with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor: 
+    prefetches = deque()
+    for copy_args in copy_args_iter: 
+      prefetches.append(executor.submit(fetch, copy_args))
+      if len(prefetches) >= window: 
+        yield prefetches.popleft().result()
+    while prefetches: 
+      yield prefetches.popleft().result()
+
+
+# builds metrics of a lambda invocation from the copy responses of its objects, and emits them to the metrics sink
+def _invocation_metrics(copy_responses: list, execution_time: float) -> dict: 
+  return _invocation_totals_metrics(
+    objects = len(copy_responses), 
+    objects_failed = sum(1 for response in copy_responses if response['status'] == 'COPY_FAILED'), 
+    bytes_copied = sum(response['metrics']['bytes_copied'] for response in copy_responses if 'metrics' in response), 
+    execution_time = execution_time
+  )
+
+# builds and emits metrics of a lambda invocation from totals of its copies
+def _invocation_totals_metrics(objects: int, objects_failed: int, bytes_copied: int, execution_time: float) -> dict: 
+  metrics = dict(
+    objects = objects, 
+    objects_failed = objects_failed, 
+    bytes_copied = bytes_copied, 
+    execution_time = round(execution_time, 3), 
+    mb_per_sec = round(bytes_copied / (1024 * 1024) / execution_time, 3) if execution_time > 0 else 0, 
+    peak_memory_mb = _peak_memory_mb()
+  )
+  _emit_metrics({}, metrics)
+  return metrics
+
+# returns copy responses of completed copy futures, with a COPY_FAILED response for each failed copy
+def _collect_copy_responses(copy_futures) -> list: 
+  return [ _copy_future_response(copy_future, copy_count) for copy_count, copy_future in enumerate(copy_futures, start=1) ]
+
+# returns the copy response of a completed copy future, or a COPY_FAILED response if the copy failed
+def _copy_future_response(copy_future: concurrent.futures.Future, copy_count: int) -> dict: 
+  try: 
+    copy_object_response = copy_future.result()
+    logging.info('Copying object #%s completed with response: %s', copy_count, copy_object_response)
+  except Exception as e:
+    logging.error('Error encountered copying object #%s: %s', copy_count, e)
+    copy_object_response = _failed_copy_response(e)
+  return copy_object_response
+
+def _failed_copy_response(e: Exception) -> dict: 
+  return dict(
+    status = 'COPY_FAILED',
+    err_code = 500,
+    err_message = str(e)
+  )
+
+# yields lines (without line endings) of a text object in s3 or gcs, streaming it rather than reading it whole
+def _iter_object_lines(object_uri: str): 
+  bucket_name, object_name = _split_uri(object_uri)
+  if urlparse(object_uri).scheme == 's3': 
+    body = _get_s3_client().get_object(Bucket=bucket_name, Key=object_name)['Body']
+    for line in body.iter_lines(): 
+      yield line.decode('utf-8')
+  else: 
+    with _get_gcs_client().bucket(bucket_name).blob(object_name).open('rt', encoding='utf-8') as manifest_file: 
+      for line in manifest_file: 
+        yield line.rstrip('\r\n')
+
+# parses a manifest entry, returning the object definition (as in the `objects` of a payload), or raising 
+# a ValueError if the entry isn't valid
+def _parse_manifest_entry(entry) -> dict: 
+  if not isinstance(entry, dict): 
+    raise ValueError(f'Manifest entry is not an object: {entry}')
+  object_def = { name: value for name, value in entry.items() if value not in [None, ''] }
+  for name in MANIFEST_INTEGER_FIELDS: 
+    if isinstance(object_def.get(name), str): 
+      object_def[name] = int(object_def[name])
+  entry_errors = [ err.message for err in _get_manifest_entry_validator().iter_errors(object_def) ]
+  if entry_errors: 
+    raise ValueError(f'Manifest entry invalid ({"; ".join(entry_errors)}): {entry}')
+  return object_def
+
+# yields (entry number, object definition, error) tuples for entries of a jsonl or csv manifest after the first 
+# `offset` entries. a jsonl manifest has an object definition per line, and a csv manifest either a header row 
+# naming its columns (including source_uri and target_uri, other columns than object options are ignored), or 
+# source and target uris as its first two columns. blank lines aren't entries. an invalid entry is yielded with 
+# an error instead of an object definition
+def _iter_manifest_entries(manifest_uri: str, manifest_format: str, offset: int = 0): 
+  lines = (line for line in _iter_object_lines(manifest_uri) if line.strip())
+  if manifest_format == 'csv': 
+    rows = csv.reader(lines)
+    columns = ['source_uri', 'target_uri']
+    first_row = next(rows, None)
+    if first_row is not None and 'source_uri' in first_row: 
+      columns = first_row
+    elif first_row is not None: 
+      rows = itertools.chain([ first_row ], rows)
+    object_options = LAMBDA_PAYLOAD_SCHEMA['properties']['objects']['items']['properties']
+    entries = ({ column: value for column, value in zip(columns, row) if column in object_options } for row in rows)
+  else: 
+    entries = lines
+
+  for entry_num, entry in enumerate(entries, start=1): 
+    if entry_num <= offset: 
+      continue
+    try: 
+      object_def = _parse_manifest_entry(json.loads(entry) if manifest_format == 'jsonl' else entry)
+    except ValueError as e:
+      yield entry_num, None, e
+      continue
+    yield entry_num, object_def, None
+
+# writes lines to a result manifest object in s3 or gcs as they are produced. s3 results are buffered and 
+# uploaded as parts of a multi-part upload (or a single put_object if they fit in a part), gcs results are 
+# written with a resumable upload. the object only appears once the writer is closed
+class _ResultManifestWriter: 
+  def __init__(self, result_uri: str, kms_key_arn: str = None): 
+    self.result_uri = result_uri
+    self.kms_key_arn = kms_key_arn
+    self.bucket_name, self.object_name = _split_uri(result_uri)
+    self.buffer = bytearray()
+    self.mpu_id = None
+    self.mpu_parts = []
+    self.gcs_file = None
+    if urlparse(result_uri).scheme == 'gs': 
+      self.gcs_file = _get_gcs_client().bucket(self.bucket_name).blob(self.object_name).open('wb')
+
+  def write(self, result: dict): 
+    line = (json.dumps(result, default=str) + '\n').encode('utf-8')
+    if self.gcs_file: 
+      self.gcs_file.write(line)
+      return
+    self.buffer += line
+    if len(self.buffer) >= RESULT_MANIFEST_PART_SIZE: 
+      self._upload_part()
+
+  def _upload_part(self): 
+    if self.mpu_id is None: 
+      self.mpu_id = _create_mpu(self.bucket_name, self.object_name, False, self.kms_key_arn)
+    part_num = len(self.mpu_parts) + 1
+    part_data = bytes(self.buffer)
+    s3_response = _call_with_retries(lambda: _get_s3_client().upload_part(Bucket=self.bucket_name, Key=self.object_name, Body=part_data, PartNumber=part_num, UploadId=self.mpu_id), 
+                                     f'uploading result manifest part #{part_num} to S3')
+    self.mpu_parts.append({"ETag": s3_response["ETag"], "PartNumber": part_num})
+    self.buffer = bytearray()
+
+  # writes the remaining results and completes the result manifest object
+  def close(self): 
+    if self.gcs_file: 
+      self.gcs_file.close()
+    elif self.mpu_id is None: 
+      _call_with_retries(lambda: _get_s3_client().put_object(Bucket=self.bucket_name, Key=self.object_name, Body=bytes(self.buffer), ContentType='application/x-ndjson', 
+                                                               **_sse_args(self.kms_key_arn)), 
+                         'writing result manifest to S3')
+    else: 
+      if self.buffer: 
+        self._upload_part()
+      _complete_mpu(self.bucket_name, self.object_name, self.mpu_id, self.mpu_parts)
+    logging.info('Wrote result manifest %s', self.result_uri)
+
+# copies the objects listed in a manifest, in batches of `batch_size` entries. the results of each batch (a line 
+# per copied object or invalid entry) are written to a result object of their own under the `result_uri` prefix, 
+# named after the first entry of the batch, as the batch completes. so memory used doesn't grow with the size of 
+# the manifest, and results of completed batches are kept if an invocation times out. once `deadline` has passed, 
+# no more objects are started, and the summary returns the `next_offset` a later invocation continues the 
+# manifest from (an entry whose source expanded into objects which were only partly started is copied again). 
+# returns the manifest summary
+def _copy_manifest(manifest: dict, defaults: dict, engine: str, pool_size: int, deadline: float = None) -> dict: 
+  start_time = time.time()
+  manifest_uri = manifest['uri']
+  manifest_format = manifest.get('format') or ('csv' if manifest_uri.lower().endswith('.csv') else 'jsonl')
+  batch_size = manifest.get('batch_size', DEFAULT_MANIFEST_BATCH_SIZE)
+  offset = manifest.get('offset', 0)
+  result_prefix = manifest.get('result_uri') or f'{manifest_uri}.results/'
+  if not result_prefix.endswith('/'): 
+    result_prefix += '/'
+  kms_key_arn = manifest.get('kms_key_arn', defaults.get('kms_key_arn'))
+  logging.info('Copying objects of %s manifest %s from entry #%s in batches of %s, writing results under %s', manifest_format, manifest_uri, offset + 1, batch_size, result_prefix)
+
+  totals = dict(objects=0, objects_failed=0, objects_skipped=0, bytes_copied=0, result_objects=0)
+  next_offset = offset
+  stopped = False
+  result_writer = None
+  scheduler = _CopyScheduler(pool_size, deadline) if engine != 'asyncio' else None
+
+  def write_result(entry_num: int, source_uri: str, target_uri: str, response: dict): 
+    result_writer.write(dict(entry=entry_num, source_uri=source_uri, target_uri=target_uri, **response))
+    totals['objects'] += 1
+    totals['objects_failed'] += response['status'] == 'COPY_FAILED'
+    totals['objects_skipped'] += response['status'] == 'COPY_SKIPPED_UP_TO_DATE'
+    totals['bytes_copied'] += response.get('metrics', {}).get('bytes_copied', 0)
+
+  try: 
+    entries = _iter_manifest_entries(manifest_uri, manifest_format, offset)
+    while not stopped: 
+      if deadline and time.time() > deadline: 
+        logging.warning('Copy deadline passed, manifest entries from #%s will not be copied by this invocation', next_offset + 1)
+        stopped = True
+        break
+      batch = list(itertools.islice(entries, batch_size))
+      if not batch: 
+        break
+      result_writer = _ResultManifestWriter(f'{result_prefix}results-{batch[0][0]:09d}.jsonl', kms_key_arn)
+
+      # batch items, (entry number, copy arguments, entry error) tuples, are recorded as entries are consumed, 
+      # to pair copies with their (ordered) copy responses. an entry with a prefix or glob source expands into 
+      # a copy per object, and an invalid entry is an item without copy arguments
+      batch_items = deque()
+      def iter_batch_copy_args(): 
+        for entry_num, object_def, entry_error in batch: 
+          if entry_error: 
+            batch_items.append((entry_num, None, entry_error))
+            continue
+          for copy_args in _iter_copy_args([ object_def ], defaults): 
+            batch_items.append((entry_num, copy_args, None))
+            yield copy_args
+
+      # the deadline is checked before each copy is started, after its metadata was prefetched
+      def until_deadline(copy_args_iter): 
+        nonlocal stopped
+        for copy_args in copy_args_iter: 
+          if deadline and time.time() > deadline: 
+            stopped = True
+            return
+          yield copy_args
+
+      # writes results of invalid entries ahead of the next copy, returns the next copy's item (None if none is left)
+      def next_copy_item(): 
+        while batch_items and batch_items[0][1] is None: 
+          entry_num, _, entry_error = batch_items.popleft()
+          write_result(entry_num, None, None, _failed_copy_response(entry_error))
+        return batch_items.popleft() if batch_items else None
+
+      copy_args_iter = until_deadline(_prefetch_source_metadata(iter_batch_copy_args()))
+      if engine == 'asyncio': 
+        copy_futures = _copy_objects_async(copy_args_iter, pool_size, deadline)
+      else: 
+        copy_futures = scheduler.map(copy_args_iter)
+      for copy_count, copy_future in enumerate(copy_futures, start=totals['objects'] + 1): 
+        response = _copy_future_response(copy_future, copy_count)
+        entry_num, copy_args, _ = next_copy_item()
+        write_result(entry_num, copy_args['source_object_uri'], copy_args['target_object_uri'], response)
+
+      if stopped: 
+        # the first copy not started, and anything after it, is left for a later invocation
+        unstarted_item = next_copy_item()
+        next_offset = unstarted_item[0] - 1 if unstarted_item else batch[-1][0]
+        logging.warning('Copy deadline passed, manifest entries from #%s will not be copied by this invocation', next_offset + 1)
+      else: 
+        next_copy_item() # results of trailing invalid entries
+        next_offset = batch[-1][0]
+      result_writer.close()
+      totals['result_objects'] += 1
+      result_writer = None
+  finally: 
+    if scheduler: 
+      scheduler.shutdown()
+    # results written so far are kept, even if the manifest couldn't be read to the end
+    if result_writer: 
+      result_writer.close()
+
+  execution_time = time.time() - start_time
+  summary = dict(
+    status = 'MANIFEST_INCOMPLETE' if stopped else 'MANIFEST_COMPLETE', 
+    manifest_uri = manifest_uri, 
+    result_uri = result_prefix, 
+    entries = next_offset - offset, 
+    execution_time = execution_time, 
+    **totals
+  )
+  if stopped: 
+    summary['next_offset'] = next_offset
+  logging.info('Manifest copy summary: %s', summary)
+  return summary
 
 def lambda_handler(event, context):
+  invocation_start_time = time.time()
   # validate lambda payload using the defined json schema
-  if lambda_schema_validator.is_valid(event): 
+  if _get_payload_validator().is_valid(event): 
     # json payload conforms to schema
     logging.info('Lambda invoked with a valid payload: %s', event) 
-    default_chunk_size = event.get('defaults', {}).get('chunk_size', DEFAULT_CHUNK_SIZE)
-    default_max_workers = event.get('defaults', {}).get('max_workers', DEFAULT_MAX_WORKERS)
-    default_checksum = event.get('defaults', {}).get('checksum', DEFAULT_CHECKSUM_ENABLED)
-    default_kms_key_arn = event.get('defaults', {}).get('kms_key_arn')
-
-    copy_count = 0
-    copy_responses = []
-    for object_def in event.get('objects'): 
-      copy_count += 1
-      source_object_uri = object_def.get('source_uri')
-      target_object_uri = object_def.get('target_uri')
-      chunk_size = int(object_def.get('chunk_size', default_chunk_size))
-      max_workers = int(object_def.get('max_workers', default_max_workers))
-      checksum = object_def.get('checksum', default_checksum) in [True, 'True', 'true', 'Yes', 'yes', 'Y', 'y', '1'] 
-      kms_key_arn = object_def.get('kms_key_arn', default_kms_key_arn)
+    engine = event.get('engine', DEFAULT_ENGINE)
+    pool_size = int(event.get('pool_size', ASYNC_POOL_SIZE if engine == 'asyncio' else DEFAULT_POOL_SIZE))
+    # sdk clients of the asyncio engine only make metadata calls and server side copies. a scheduler uses up to 
+    # twice its pool size in connections (see `_CopyScheduler`), and metadata of source objects is prefetched 
+    # over the same gcs session as copies
+    _ensure_connection_pools(2 * (DEFAULT_POOL_SIZE if engine == 'asyncio' else pool_size) + METADATA_PREFETCH_WORKERS + CONNECTION_POOL_HEADROOM)
+    # resumable copies stop before the invocation times out, so their progress can be saved
+    deadline = None
+    if context: 
+      deadline = time.time() + context.get_remaining_time_in_millis() / 1000 - RESUMABLE_DEADLINE_MARGIN
 
-      try: 
-        logging.info('Copying object #%s: %s -> %s', copy_count, source_object_uri, target_object_uri)
-        copy_object_response = copy_object_gcs_to_s3(source_object_uri, target_object_uri, chunk_size, max_workers, checksum, kms_key_arn)
-        logging.info('Copying object #%s completed with response: %s', copy_count, copy_object_response)
-      except Exception as e:
-        logging.error('Error encountered copying object #%s: %s', copy_count, e)
-        copy_object_response = dict(
-          status = 'COPY_FAILED',
-          err_code = 500,
-          err_message = str(e)
-        )
-      copy_responses.append(copy_object_response)
+    if 'part_range_task' in event: 
+      # this invocation is a part range worker of a fan out copy, which stops by the earlier of the 
+      # coordinator's deadline and its own (if the copy is resumable)
+      task = event['part_range_task']
+      if task.get('deadline') and deadline: 
+        task['deadline'] = min(task['deadline'], deadline)
+      part_range_response = _copy_part_range(task)
+      _log_init_timings()
+      return dict(
+        statusCode = 200,
+        headers = { 'Content-Type': 'application/json' }, 
+        body = part_range_response
+      )
+
+    if 'manifest' in event: 
+      # objects are read from a manifest, and results written to a result manifest
+      summary = _copy_manifest(event['manifest'], event.get('defaults', {}), engine, pool_size, deadline)
+      _log_init_timings()
+      return dict(
+        statusCode = 200,
+        headers = { 'Content-Type': 'application/json' }, 
+        body = { "summary": summary, "metrics": _invocation_totals_metrics(summary['objects'], summary['objects_failed'], summary['bytes_copied'], 
+                                                                          time.time() - invocation_start_time) } 
+      )
+
+    # objects are copied concurrently using a shared pool of workers, but results are 
+    # returned in the same order as objects appear in the payload
+    copy_args_iter = _prefetch_source_metadata(_iter_copy_args(event.get('objects'), event.get('defaults', {})))
+    if engine == 'asyncio': 
+      copy_responses = _collect_copy_responses(_copy_objects_async(copy_args_iter, pool_size, deadline))
+    else: 
+      with _CopyScheduler(pool_size, deadline) as scheduler: 
+        copy_responses = _collect_copy_responses(scheduler.map(copy_args_iter))
+
+    _log_init_timings()
 
     # return copy responses
     return dict(
       statusCode = 200,
       headers = { 'Content-Type': 'application/json' }, 
-      body = { "results": copy_responses } 
+      body = { "results": copy_responses, "metrics": _invocation_metrics(copy_responses, time.time() - invocation_start_time) } 
     )
   else: 
     # payload schema is not valid
     logging.error('Lambda invoked with an invalid payload: %s', event)
     logging.info('Example of a valid payload is: %s', LAMBDA_PAYLOAD_EXAMPLE)
-    payload_errors = [ err.message for err in lambda_schema_validator.iter_errors(event) ]
+    payload_errors = [ err.message for err in _get_payload_validator().iter_errors(event) ]
     logging.error('Lambda payload errors: %s', payload_errors)
     return dict(
       statusCode = 400,
@@ -443,24 +3203,24 @@ if __name__ == "__main__":
     description='Copy an object from GCP Storage to AWS S3, with support for large files.',
   )
   cliparser.add_argument('--source-uri', '-s',
-                          required=True,
-                          help='source gcs object uri (e.g. gs://bucketname/path/file)'
+                          required=False,
+                          help='source gcs object uri (e.g. gs://bucketname/path/file), prefix (e.g. gs://bucketname/path/) or glob pattern (e.g. gs://bucketname/path/*.csv)'
                           )
   cliparser.add_argument('--target-uri', '-t',
-                          required=True,
-                          help='target s3 object uri (e.g. s3://bucketname/path/file)'
+                          required=False,
+                          help='target s3 object uri (e.g. s3://bucketname/path/file), or target prefix if source is a prefix or glob pattern'
                           )
   cliparser.add_argument('--chunk-size', '-c',
                           required=False,
                           type=int,
-                          default=DEFAULT_CHUNK_SIZE,
-                          help='chunk size in bytes (default: %s)' % DEFAULT_CHUNK_SIZE
+                          default=None,
+                          help='chunk size in bytes (default: planned from object size and observed throughput)'
                         )
   cliparser.add_argument('--max-workers', '-w',
                           required=False,
                           type=int,
-                          default=DEFAULT_MAX_WORKERS,
-                          help='max number of concurrent workers (default: %s)' % DEFAULT_MAX_WORKERS
+                          default=None,
+                          help='max number of concurrent workers (default: planned from object size, memory and vcpus)'
                         )
   cliparser.add_argument('--checksum', '-k',
                           required=False,
@@ -468,10 +3228,82 @@ if __name__ == "__main__":
                           default='False',
                           help='whether checksum validation should be performed (valid values are True or False)'
                         )
+  cliparser.add_argument('--resumable', '-r',
+                          required=False,
+                          type=str,
+                          default='False',
+                          help='whether a failed multi-part copy can be resumed by running the same copy again (valid values are True or False)'
+                        )
+  cliparser.add_argument('--sync', '-y',
+                          required=False,
+                          type=str,
+                          default='False',
+                          help='whether copy should be skipped if the target object is already up to date with the source (valid values are True or False)'
+                        )
+  cliparser.add_argument('--verify', '-v',
+                          required=False,
+                          type=str,
+                          default='True',
+                          help='whether attributes of the target object are read back from S3 after the copy to verify its size (valid values are True or False)'
+                        )
+  cliparser.add_argument('--streaming', '-m',
+                          required=False,
+                          type=str,
+                          default='False',
+                          help='whether object data should be streamed through a bounded buffer pool instead of read in full chunks (valid values are True or False)'
+                        )
+  cliparser.add_argument('--engine', '-e',
+                          required=False,
+                          choices=ENGINES,
+                          default=DEFAULT_ENGINE,
+                          help='copy engine, either a pool of worker threads or concurrent asyncio transfers (default: threads)'
+                        )
+  cliparser.add_argument('--fan-out', '-f',
+                          required=False,
+                          type=int,
+                          default=None,
+                          help='number of part range workers (local processes) a large multi-part copy is split across (default: 1, no fan out)'
+                        )
+  cliparser.add_argument('--compression', '-z',
+                          required=False,
+                          choices=COMPRESSIONS,
+                          default=None,
+                          help='compress the object on the fly while copying it (default: copy the object unchanged)'
+                        )
+
+  cliparser.add_argument('--manifest', '-n',
+                          required=False,
+                          default=None,
+                          help='uri of a jsonl or csv manifest of objects to copy (e.g. s3://bucketname/path/manifest.jsonl), instead of a source and target uri'
+                        )
+  cliparser.add_argument('--result-uri', '-o',
+                          required=False,
+                          default=None,
+                          help='uri prefix of the result objects written in manifest mode, one per batch (default: manifest uri followed by .results/)'
+                        )
 
   # extract cli option values and set program behavior
   args = cliparser.parse_args()
+  if not args.manifest and not (args.source_uri and args.target_uri): 
+    cliparser.error('either --source-uri and --target-uri, or --manifest are required')
 
-  lambda_payload = { "objects": [ dict(source_uri=args.source_uri, target_uri=args.target_uri, chunk_size=args.chunk_size, max_workers=args.max_workers, checksum=args.checksum) ] }
+  object_def = dict(source_uri=args.source_uri, target_uri=args.target_uri, checksum=args.checksum, streaming=args.streaming, resumable=args.resumable, sync=args.sync, verify=args.verify)
+  if args.chunk_size: 
+    object_def['chunk_size'] = args.chunk_size
+  if args.max_workers: 
+    object_def['max_workers'] = args.max_workers
+  if args.fan_out: 
+    object_def['fan_out'] = args.fan_out
+  if args.compression: 
+    object_def['compression'] = args.compression
+  if args.manifest: 
+    # options given on the command line apply to every object of the manifest
+    manifest = dict(uri=args.manifest)
+    if args.result_uri: 
+      manifest['result_uri'] = args.result_uri
+    defaults = { name: value for name, value in object_def.items() if name not in ['source_uri', 'target_uri'] }
+    lambda_payload = { "manifest": manifest, "defaults": defaults, "engine": args.engine }
+  else: 
+    lambda_payload = { "objects": [ object_def ], "engine": args.engine }
   response = lambda_handler(lambda_payload, None)
   logging.info('Response from lambda_handler: %s', response)
\ No newline at end of file
@@ -0,0 +1,185 @@
+import os, sys, io, time, base64, hashlib, threading
+import pytest
+import crc32c
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('METRICS_SINK', 'none')
+import main
+
+
+# in memory s3 client, implementing the calls made by copies, ledgers and manifests
+class FakeS3Client:
+  class exceptions:
+    class ClientError(Exception):
+      def __init__(self, code: str, status: int):
+        super().__init__(code)
+        self.response = {'Error': {'Code': code}, 'ResponseMetadata': {'HTTPStatusCode': status}}
+
+    class NoSuchKey(ClientError):
+      def __init__(self):
+        super().__init__('NoSuchKey', 404)
+
+    class NoSuchUpload(ClientError):
+      def __init__(self):
+        super().__init__('NoSuchUpload', 404)
+
+  def __init__(self):
+    self.objects = {} # (bucket, key) -> dict(data, metadata)
+    self.uploads = {} # upload id -> dict(key, metadata, parts)
+    self.upload_part_calls = [] # (key, part number) of each upload_part call
+    self.fail_parts = set() # part numbers whose uploads are denied
+    self.on_put = None # called with the key of each object written
+    self.lock = threading.Lock()
+
+  @staticmethod
+  def _read(body) -> bytes:
+    return bytes(body) if isinstance(body, (bytes, bytearray)) else body.read()
+
+  def _store(self, bucket: str, key: str, data: bytes, metadata: dict):
+    with self.lock:
+      self.objects[(bucket, key)] = dict(data=data, metadata=metadata or {})
+    if self.on_put:
+      self.on_put(key)
+
+  def put_object(self, Bucket, Key, Body, Metadata=None, **kwargs):
+    data = self._read(Body)
+    self._store(Bucket, Key, data, Metadata)
+    return {'ETag': '"%s"' % hashlib.md5(data).hexdigest()}
+
+  def get_object(self, Bucket, Key, **kwargs):
+    if (Bucket, Key) not in self.objects:
+      raise self.exceptions.NoSuchKey()
+    data = self.objects[(Bucket, Key)]['data']
+    body = io.BytesIO(data)
+    body.iter_lines = lambda: iter(data.splitlines())
+    return {'Body': body}
+
+  def delete_object(self, Bucket, Key):
+    self.objects.pop((Bucket, Key), None)
+
+  def head_object(self, Bucket, Key, **kwargs):
+    if (Bucket, Key) not in self.objects:
+      raise self.exceptions.ClientError('404', 404)
+    stored = self.objects[(Bucket, Key)]
+    return {'ContentLength': len(stored['data']), 'ETag': '"%s"' % hashlib.md5(stored['data']).hexdigest(), 'Metadata': stored['metadata']}
+
+  def get_object_attributes(self, Bucket, Key, ObjectAttributes):
+    data = self.objects[(Bucket, Key)]['data']
+    return {'ObjectSize': len(data), 'ETag': hashlib.md5(data).hexdigest()}
+
+  def create_multipart_upload(self, Bucket, Key, Metadata=None, **kwargs):
+    with self.lock:
+      upload_id = f'upload-{len(self.uploads) + 1}'
+      self.uploads[upload_id] = dict(key=(Bucket, Key), metadata=Metadata, parts={})
+    return {'UploadId': upload_id}
+
+  def upload_part(self, Bucket, Key, Body, PartNumber, UploadId, ChecksumCRC32C=None, **kwargs):
+    with self.lock:
+      self.upload_part_calls.append((Key, PartNumber))
+    if PartNumber in self.fail_parts:
+      raise self.exceptions.ClientError('AccessDenied', 403)
+    if UploadId not in self.uploads:
+      raise self.exceptions.NoSuchUpload()
+    data = self._read(Body)
+    part = dict(PartNumber=PartNumber, ETag='"%s"' % hashlib.md5(data).hexdigest(), Size=len(data), data=data)
+    if ChecksumCRC32C:
+      part['ChecksumCRC32C'] = ChecksumCRC32C
+    with self.lock:
+      self.uploads[UploadId]['parts'][PartNumber] = part
+    return {'ETag': part['ETag']}
+
+  def complete_multipart_upload(self, Bucket, Key, MultipartUpload, UploadId):
+    upload = self.uploads.pop(UploadId)
+    part_nums = [ part['PartNumber'] for part in MultipartUpload['Parts'] ]
+    assert part_nums == list(range(1, len(part_nums) + 1))
+    assert all(part['ETag'] == upload['parts'][part['PartNumber']]['ETag'] for part in MultipartUpload['Parts'])
+    self._store(Bucket, Key, b''.join(upload['parts'][part_num]['data'] for part_num in part_nums), upload['metadata'])
+    return {'ETag': f'"mpu-{len(part_nums)}"'}
+
+  def abort_multipart_upload(self, Bucket, Key, UploadId):
+    self.uploads.pop(UploadId, None)
+
+  def get_paginator(self, operation_name: str):
+    assert operation_name == 'list_parts'
+    client = self
+
+    class Paginator:
+      def paginate(self, Bucket, Key, UploadId):
+        if UploadId not in client.uploads:
+          raise client.exceptions.NoSuchUpload()
+        parts = client.uploads[UploadId]['parts']
+        yield {'Parts': [ { name: value for name, value in part.items() if name != 'data' } for _, part in sorted(parts.items()) ]}
+    return Paginator()
+
+
+class FakeGcsBlob:
+  def __init__(self, bucket, name: str):
+    self.bucket = bucket
+    self.name = name
+    data = bucket.client.objects.get((bucket.name, name), b'')
+    self.size = len(data)
+    self.generation = 1
+    self.etag = hashlib.md5(data).hexdigest()
+    self.crc32c = base64.b64encode(crc32c.crc32c(data).to_bytes(4, 'big')).decode('utf-8')
+    self.md5_hash = None
+
+  def download_as_bytes(self, start: int = None, end: int = None, **kwargs) -> bytes:
+    data = self.bucket.client.objects[(self.bucket.name, self.name)]
+    return data if start is None else data[start:end + 1]
+
+  def download_to_file(self, file_obj, start: int = None, end: int = None, **kwargs):
+    file_obj.write(self.download_as_bytes(start, end))
+
+
+class FakeGcsBucket:
+  def __init__(self, client, name: str):
+    self.client = client
+    self.name = name
+
+  def get_blob(self, name: str, **kwargs):
+    return FakeGcsBlob(self, name) if (self.name, name) in self.client.objects else None
+
+  def blob(self, name: str, **kwargs):
+    return FakeGcsBlob(self, name)
+
+
+# in memory gcs client, holding object data keyed by (bucket, name)
+class FakeGcsClient:
+  def __init__(self):
+    self.objects = {}
+
+  def bucket(self, name: str):
+    return FakeGcsBucket(self, name)
+
+
+# the clock used by main, which can be moved forward to pass copy deadlines
+class FakeClock:
+  def __init__(self):
+    self.offset = 0
+
+  def time(self) -> float:
+    return time.time() + self.offset
+
+  def __getattr__(self, name):
+    return getattr(time, name)
+
+
+@pytest.fixture
+def s3(monkeypatch):
+  client = FakeS3Client()
+  monkeypatch.setattr(main, '_get_s3_client', lambda: client)
+  monkeypatch.setattr(main, '_get_s3_hedge_client', lambda: client)
+  monkeypatch.setattr(main, 'RETRY_BASE_DELAY', 0)
+  return client
+
+@pytest.fixture
+def gcs(monkeypatch):
+  client = FakeGcsClient()
+  monkeypatch.setattr(main, '_get_gcs_client', lambda: client)
+  return client
+
+@pytest.fixture
+def clock(monkeypatch):
+  fake_clock = FakeClock()
+  monkeypatch.setattr(main, 'time', fake_clock)
+  return fake_clock
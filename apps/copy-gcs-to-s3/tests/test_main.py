@@ -0,0 +1,154 @@
+import json, random, base64
+import pytest
+import crc32c
+
+import main
+
+MB = 1024 * 1024
+
+
+def _crc32c_b64(data: bytes) -> str:
+  return base64.b64encode(crc32c.crc32c(data).to_bytes(4, 'big')).decode('utf-8')
+
+def _result_lines(s3, bucket: str, prefix: str) -> list:
+  return [ json.loads(line) for (result_bucket, key), stored in sorted(s3.objects.items())
+           if result_bucket == bucket and key.startswith(prefix) for line in stored['data'].splitlines() ]
+
+
+# planner
+
+def test_plan_copy_small_object_is_copied_whole():
+  assert main._plan_copy(1024, chunk_size=8 * MB, max_workers=4) == (8 * MB, 1, 1)
+
+def test_plan_copy_raises_chunk_size_to_s3_part_limits():
+  chunk_size, max_workers, total_parts = main._plan_copy(12 * MB, chunk_size=1 * MB, max_workers=8)
+  assert (chunk_size, max_workers, total_parts) == (main.S3_MIN_PART_SIZE, 3, 3)
+
+  object_size = (main.S3_MAX_PARTS + 1) * main.S3_MIN_PART_SIZE
+  chunk_size, _, total_parts = main._plan_copy(object_size, chunk_size=main.S3_MIN_PART_SIZE, max_workers=8)
+  assert total_parts <= main.S3_MAX_PARTS and chunk_size * total_parts >= object_size
+
+def test_plan_copy_keeps_parts_in_flight_within_memory(monkeypatch):
+  monkeypatch.setenv('AWS_LAMBDA_FUNCTION_MEMORY_SIZE', '512')
+  monkeypatch.setattr(main, 'part_throughput', main._ThroughputStats())
+  chunk_size, max_workers, total_parts = main._plan_copy(1024 * MB)
+  assert chunk_size % MB == 0 and total_parts == -(-1024 * MB // chunk_size)
+  assert chunk_size * max_workers <= 512 * MB * main.PLANNER_MEMORY_FRACTION
+
+def test_plan_copy_rejects_objects_above_s3_limit():
+  with pytest.raises(ValueError):
+    main._plan_copy(main.S3_MAX_OBJECT_SIZE + 1)
+
+
+# crc32c combine
+
+@pytest.mark.parametrize('len1, len2', [ (0, 0), (0, 7), (7, 0), (1, 1), (1000, 4096), (5 * MB, 3 * MB + 1) ])
+def test_crc32c_combine_matches_crc32c_of_concatenation(len1, len2):
+  data1, data2 = random.randbytes(len1), random.randbytes(len2)
+  assert main._crc32c_combine(crc32c.crc32c(data1), crc32c.crc32c(data2), len2) == crc32c.crc32c(data1 + data2)
+
+def test_combine_part_crc32c_of_uneven_parts():
+  data = random.randbytes(2 * MB + 100)
+  chunk_size = MB
+  parts = [ {'ChecksumCRC32C': _crc32c_b64(data[start:start + chunk_size])} for start in range(0, len(data), chunk_size) ]
+  assert main._combine_part_crc32c(parts, len(data), chunk_size) == _crc32c_b64(data)
+  assert main._combine_part_crc32c(parts[:1] + [ {} ] + parts[2:], len(data), chunk_size) is None
+
+
+# ledger resume
+
+def test_resumable_copy_uploads_only_missing_parts(s3, gcs):
+  data = random.randbytes(3 * main.S3_MIN_PART_SIZE - 100)
+  gcs.objects[('source', 'big')] = data
+  copy_args = dict(source_object_uri='gs://source/big', target_object_uri='s3://target/big', chunk_size=main.S3_MIN_PART_SIZE,
+                   max_workers=3, checksum=True, resumable=True)
+
+  s3.fail_parts = { 2 }
+  with pytest.raises(Exception):
+    main.copy_object_gcs_to_s3(**copy_args)
+  assert ('target', 'big') not in s3.objects
+  ledger = json.loads(s3.objects[('target', 'big' + main.LEDGER_SUFFIX)]['data'])
+  assert sorted(ledger['parts']) == ['1', '3'] and ledger['upload_id'] in s3.uploads
+
+  s3.fail_parts = set()
+  s3.upload_part_calls.clear()
+  copy_response = main.copy_object_gcs_to_s3(**copy_args)
+  assert s3.upload_part_calls == [ ('big', 2) ]
+  assert copy_response['status'] == 'COPY_SUCCESS_SIZE_MATCHED' and copy_response['checksum_verified']
+  assert s3.objects[('target', 'big')]['data'] == data
+  assert ('target', 'big' + main.LEDGER_SUFFIX) not in s3.objects and not s3.uploads
+
+def test_resumable_copy_starts_over_when_source_changed(s3, gcs):
+  gcs.objects[('source', 'big')] = random.randbytes(2 * main.S3_MIN_PART_SIZE)
+  copy_args = dict(source_object_uri='gs://source/big', target_object_uri='s3://target/big', chunk_size=main.S3_MIN_PART_SIZE,
+                   max_workers=2, resumable=True)
+  s3.fail_parts = { 2 }
+  with pytest.raises(Exception):
+    main.copy_object_gcs_to_s3(**copy_args)
+
+  data = random.randbytes(2 * main.S3_MIN_PART_SIZE + 1)
+  gcs.objects[('source', 'big')] = data
+  s3.fail_parts = set()
+  s3.upload_part_calls.clear()
+  main.copy_object_gcs_to_s3(**copy_args)
+  assert sorted(s3.upload_part_calls) == [ ('big', 1), ('big', 2), ('big', 3) ]
+  assert s3.objects[('target', 'big')]['data'] == data and not s3.uploads
+
+def test_missing_ledger_without_list_bucket_permission(s3):
+  def get_object_denied(Bucket, Key, **kwargs):
+    raise s3.exceptions.ClientError('AccessDenied', 403)
+  s3.get_object = get_object_denied
+  assert main._load_ledger('target', 'big') is None
+
+
+# manifest batching and deadline
+
+MANIFEST_ENTRIES = 13
+INVALID_ENTRY = 3
+
+def _write_manifest(s3, gcs):
+  lines = []
+  for entry_num in range(1, MANIFEST_ENTRIES + 1):
+    if entry_num == INVALID_ENTRY:
+      lines.append(json.dumps(dict(source_uri=f'gs://source/object-{entry_num}'))) # no target
+      continue
+    gcs.objects[('source', f'object-{entry_num}')] = f'object {entry_num}'.encode('utf-8')
+    lines.append(json.dumps(dict(source_uri=f'gs://source/object-{entry_num}', target_uri=f's3://target/object-{entry_num}')))
+  s3.objects[('manifests', 'copy.jsonl')] = dict(data='\n'.join(lines).encode('utf-8'), metadata={})
+
+def test_manifest_writes_a_result_object_per_batch(s3, gcs):
+  _write_manifest(s3, gcs)
+  summary = main._copy_manifest(dict(uri='s3://manifests/copy.jsonl', batch_size=5), {}, main.DEFAULT_ENGINE, 4)
+
+  assert summary['status'] == 'MANIFEST_COMPLETE' and 'next_offset' not in summary
+  assert (summary['entries'], summary['objects'], summary['objects_failed'], summary['result_objects']) == (MANIFEST_ENTRIES, MANIFEST_ENTRIES, 1, 3)
+  result_keys = sorted(key for bucket, key in s3.objects if key.startswith('copy.jsonl.results/'))
+  assert result_keys == [ 'copy.jsonl.results/results-000000001.jsonl', 'copy.jsonl.results/results-000000006.jsonl', 'copy.jsonl.results/results-000000011.jsonl' ]
+  results = _result_lines(s3, 'manifests', 'copy.jsonl.results/')
+  assert [ result['entry'] for result in results ] == list(range(1, MANIFEST_ENTRIES + 1))
+  assert [ result['entry'] for result in results if result['status'] == 'COPY_FAILED' ] == [ INVALID_ENTRY ]
+  assert s3.objects[('target', 'object-13')]['data'] == b'object 13'
+
+def test_manifest_stops_at_deadline_and_resumes_from_next_offset(s3, gcs, clock):
+  _write_manifest(s3, gcs)
+  copied_objects = []
+  def pass_deadline_after_two_copies(key: str):
+    if not key.startswith('copy.jsonl.results/'):
+      copied_objects.append(key)
+      if len(copied_objects) == 2:
+        clock.offset = 3600
+  s3.on_put = pass_deadline_after_two_copies
+  manifest = dict(uri='s3://manifests/copy.jsonl', batch_size=5)
+
+  summary = main._copy_manifest(manifest, {}, main.DEFAULT_ENGINE, 1, deadline=clock.time() + 600)
+  assert summary['status'] == 'MANIFEST_INCOMPLETE'
+  assert summary['next_offset'] < MANIFEST_ENTRIES and summary['entries'] == summary['next_offset']
+  first_results = _result_lines(s3, 'manifests', 'copy.jsonl.results/')
+  assert [ result['entry'] for result in first_results ] == list(range(1, summary['next_offset'] + 1))
+
+  s3.on_put = None
+  resumed_summary = main._copy_manifest(dict(manifest, offset=summary['next_offset']), {}, main.DEFAULT_ENGINE, 1, deadline=clock.time() + 600)
+  assert resumed_summary['status'] == 'MANIFEST_COMPLETE'
+  assert summary['objects'] + resumed_summary['objects'] == MANIFEST_ENTRIES
+  results = _result_lines(s3, 'manifests', 'copy.jsonl.results/')
+  assert sorted(result['entry'] for result in results) == list(range(1, MANIFEST_ENTRIES + 1))
@@ -1,57 +1,256 @@
-import sys
+import sys, json
+from datetime import date, datetime, timedelta, timezone
+import boto3
 from awsglue.transforms import *
 from awsglue.utils import getResolvedOptions
 from pyspark.context import SparkContext
+from pyspark.sql import functions as F
 from awsglue.context import GlueContext
 from awsglue.job import Job
-from awsglue import DynamicFrame
 
+# optional job parameters and their defaults, overridden by passing --NAME value job arguments
+OPTIONAL_ARGS = {
+    # fully qualified name of the source bigquery table
+    "SRC_BQ_TABLE": "bigquery-public-data.covid19_open_data.covid19_open_data",
+    # comma separated list of columns to read, or * for all columns
+    "SRC_COLUMNS": "date,location_key,country_code,country_name,subregion1_code,subregion1_name,new_confirmed,new_deceased,"
+                   "new_recovered,new_tested,cumulative_confirmed,cumulative_deceased,cumulative_recovered,cumulative_tested,"
+                   "new_persons_vaccinated,cumulative_persons_vaccinated,population",
+    # bigquery standard sql row filter (e.g. "country_code = 'US' AND date >= '2022-01-01'"), empty to read all rows
+    "SRC_FILTER": "",
+    # upper and lower bounds of read streams the bigquery storage read api is asked for, empty to use its defaults
+    "SRC_MAX_PARALLELISM": "",
+    "SRC_MIN_PARALLELISM": "",
+    # date column output is partitioned by, and partition granularity (year, month or day)
+    "TGT_PARTITION_COLUMN": "date",
+    "TGT_PARTITION_GRANULARITY": "month",
+    # parquet compression codec (snappy, gzip, zstd or none)
+    "TGT_COMPRESSION": "snappy",
+    # approximate size of output files, rows per file are estimated from the size of the parquet output of a sample
+    "TGT_FILE_SIZE_MB": "128",
+    # column whose highest extracted value is kept as the watermark, so a run only reads rows past the last one
+    # extracted. empty to always read the whole table
+    "WATERMARK_COLUMN": "date",
+    # days before the watermark that are read again, to pick up rows revised after they were extracted (merge only)
+    "WATERMARK_LOOKBACK_DAYS": "0",
+    # s3 uri of the json object the watermark is kept in, defaults to _state/watermark.json beside the output
+    "STATE_S3_URI": "",
+    # how extracted rows are loaded: merge replaces existing rows with the same merge keys (in the partitions
+    # the rows belong to), append only adds them (for insert only tables)
+    "LOAD_MODE": "merge",
+    # comma separated list of columns identifying a row, for merge
+    "MERGE_KEYS": "date,location_key",
+    # true to ignore the watermark and replace the whole output
+    "FULL_REFRESH": "false",
+}
 
-def sparkSqlQuery(glueContext, query, mapping, transformation_ctx) -> DynamicFrame:
-    for alias, frame in mapping.items():
-        frame.toDF().createOrReplaceTempView(alias)
-    result = spark.sql(query)
-    return DynamicFrame.fromDF(result, glueContext, transformation_ctx)
+# partition columns of each granularity, and the functions deriving them from a date
+PARTITION_GRANULARITIES = ["year", "month", "day"]
+PARTITION_FUNCTIONS = {"year": F.year, "month": F.month, "day": F.dayofmonth}
+FILE_SIZE_SAMPLE_ROWS = 100000
+LOAD_MODES = ["merge", "append"]
+
+
+# resolves optional job parameters, which getResolvedOptions fails on when they are not passed
+def getOptionalArgs(argv, defaults):
+    options = [ name for name in defaults if f"--{name}" in argv ]
+    resolved = getResolvedOptions(argv, options) if options else {}
+    return { name: resolved.get(name, default) for name, default in defaults.items() }
+
+
+# reads the bigquery service account credentials of a glue connection from its secret
+def getConnectionCredentials(connection_name):
+    connection = boto3.client("glue").get_connection(Name=connection_name, HidePassword=False)["Connection"]
+    secret_id = connection["ConnectionProperties"]["SECRET_ID"]
+    secret = boto3.client("secretsmanager").get_secret_value(SecretId=secret_id)
+    return json.loads(secret["SecretString"])["credentials"]
+
+
+# returns a dataframe of the selected columns and filtered rows of a bigquery table. the table is read using the
+# spark dataframe api of the bigquery connector (not a dynamic frame), so that column selection and the row filter
+# are pushed down to the bigquery storage read api, and only the needed data leaves bigquery
+def readBigQueryTable(spark, table, parent_project, credentials, columns, row_filter, max_parallelism, min_parallelism):
+    reader = (spark.read.format("bigquery")
+              .option("table", table)
+              .option("parentProject", parent_project)
+              .option("credentials", credentials))
+    if row_filter:
+        reader = reader.option("filter", row_filter)
+    if max_parallelism:
+        reader = reader.option("maxParallelism", max_parallelism)
+    if min_parallelism:
+        reader = reader.option("preferredMinParallelism", min_parallelism)
+    df = reader.load()
+    if columns != ["*"]:
+        df = df.select(*columns)
+    return df
+
+
+def splitS3Uri(s3_uri):
+    bucket, _, key = s3_uri.replace("s3://", "", 1).partition("/")
+    return bucket, key
+
+
+# reads the job state (watermark) json object, returns None if it doesn't exist yet
+def readJobState(state_uri):
+    bucket, key = splitS3Uri(state_uri)
+    s3 = boto3.client("s3")
+    try:
+        return json.loads(s3.get_object(Bucket=bucket, Key=key)["Body"].read())
+    except s3.exceptions.NoSuchKey:
+        return None
+
+
+def writeJobState(state_uri, state):
+    bucket, key = splitS3Uri(state_uri)
+    boto3.client("s3").put_object(Bucket=bucket, Key=key, Body=json.dumps(state, indent=2).encode("utf-8"), ContentType="application/json")
+
+
+# returns a bigquery row filter selecting rows past the watermark, or lookback_days before it. the watermark is
+# kept as an iso date/timestamp string, which bigquery coerces to the type of the column
+def watermarkFilter(column, watermark, lookback_days):
+    if lookback_days:
+        if len(watermark) == 10:
+            start = (date.fromisoformat(watermark) - timedelta(days=lookback_days)).isoformat()
+        else:
+            start = (datetime.fromisoformat(watermark) - timedelta(days=lookback_days)).isoformat()
+        return f"{column} >= '{start}'"
+    return f"{column} > '{watermark}'"
+
+
+def combineFilters(*row_filters):
+    row_filters = [ f"({row_filter})" for row_filter in row_filters if row_filter ]
+    return " AND ".join(row_filters)
+
+
+# adds year/month/day partition columns derived from a date column, up to the given granularity
+def addPartitionColumns(df, date_column, granularity):
+    partition_columns = PARTITION_GRANULARITIES[:PARTITION_GRANULARITIES.index(granularity) + 1]
+    for partition_column in partition_columns:
+        df = df.withColumn(partition_column, PARTITION_FUNCTIONS[partition_column](F.col(date_column)))
+    return df, partition_columns
+
+
+# estimates rows per output file of the target size, by writing a sample of rows as parquet and measuring it
+def estimateRowsPerFile(spark, df, sample_path, compression, file_size_mb):
+    sample = df.limit(FILE_SIZE_SAMPLE_ROWS).cache()
+    sample_rows = sample.count()
+    if sample_rows == 0:
+        return 0
+    sample.coalesce(1).write.mode("overwrite").option("compression", compression).parquet(sample_path)
+    sample.unpersist()
+    path = spark.sparkContext._jvm.org.apache.hadoop.fs.Path(sample_path)
+    fs = path.getFileSystem(spark.sparkContext._jsc.hadoopConfiguration())
+    sample_bytes = fs.getContentSummary(path).getLength()
+    fs.delete(path, True)
+    return max(1, int(file_size_mb * 1024 * 1024 * sample_rows / max(sample_bytes, 1)))
+
+
+# writes a dataframe as compressed parquet partitioned by the partition columns. rows are clustered by partition
+# so each partition is written by as few tasks as possible, and files are split at the estimated rows per file, so
+# that files are neither too small (many requests per athena scan) nor too large (little read parallelism)
+def writePartitionedParquet(df, path, partition_columns, compression, rows_per_file, mode="overwrite"):
+    writer = (df.repartition(*partition_columns)
+              .sortWithinPartitions(*partition_columns)
+              .write.mode(mode)
+              .option("compression", compression)
+              .partitionBy(*partition_columns))
+    if rows_per_file:
+        writer = writer.option("maxRecordsPerFile", rows_per_file)
+    writer.parquet(path)
+
+
+# returns rows to write to the partitions touched by a delta, so that they are replaced by the delta merged with
+# their existing rows. existing rows with the merge keys of a delta row are dropped in favour of the delta row.
+# the result is checkpointed, as it is read from the same partitions it is written to
+def mergeWithExisting(spark, delta_df, path, partition_columns, merge_keys):
+    try:
+        existing_df = spark.read.parquet(path)
+    except Exception as e:
+        if "Path does not exist" not in str(e):
+            raise
+        return delta_df
+    touched_partitions = F.broadcast(delta_df.select(*partition_columns).distinct())
+    existing_df = existing_df.join(touched_partitions, partition_columns, "left_semi")
+    merged_df = (existing_df.join(delta_df.select(*merge_keys), merge_keys, "left_anti")
+                 .unionByName(delta_df, allowMissingColumns=True))
+    return merged_df.localCheckpoint(eager=True)
 
 
 args = getResolvedOptions(sys.argv, ["JOB_NAME", "GCP_PROJECT_NAME", "SRC_BQ_CONN_NAME", "TGT_S3_PATH"])
+args.update(getOptionalArgs(sys.argv, OPTIONAL_ARGS))
 sc = SparkContext()
 glueContext = GlueContext(sc)
 spark = glueContext.spark_session
+# glue's log4j logger, whose messages carry levels and go to the job's log stream
+logger = glueContext.get_logger()
 job = Job(glueContext)
 job.init(args["JOB_NAME"], args)
 
- # create a df using data from bq table
-sparkbq_node1 = glueContext.create_dynamic_frame.from_options(
-    connection_type="custom.spark",
-    connection_options={
-        "table": "bigquery-public-data.covid19_open_data.covid19_open_data",
-        "parentProject": args["GCP_PROJECT_NAME"], 
-        "connectionName": args["SRC_BQ_CONN_NAME"],
-    },
-    transformation_ctx="sparkbq_node1",
-)
-
-# filter bq df using a spark sql query
-bq_filter_query = "select * from myDataSource limit 10"
-
-sql_query_filter_node1 = sparkSqlQuery(
-    glueContext,
-    query=bq_filter_query,
-    mapping={"myDataSource": sparkbq_node1},
-    transformation_ctx="sql_query_filter_node1",
-)
-
-# write df to s3 bucket as csv
-s3_bucket_node1 = glueContext.write_dynamic_frame.from_options(
-    frame=sql_query_filter_node1,
-    connection_type="s3",
-    format="csv",
-    connection_options={
-        "path": args["TGT_S3_PATH"],
-        "partitionKeys": [],
-    },
-    transformation_ctx="s3_bucket_node1",
-)
+# only replace the partitions present in the output of this run
+spark.conf.set("spark.sql.sources.partitionOverwriteMode", "dynamic")
+
+target_path = args["TGT_S3_PATH"].rstrip("/")
+watermark_column = args["WATERMARK_COLUMN"]
+state_uri = args["STATE_S3_URI"] or f"{target_path}/_state/watermark.json"
+full_refresh = args["FULL_REFRESH"].lower() == "true"
+if args["LOAD_MODE"] not in LOAD_MODES:
+    raise ValueError(f"LOAD_MODE must be one of {', '.join(LOAD_MODES)}")
+# rows within the lookback were loaded by the previous run, and appending them again would duplicate them
+if args["LOAD_MODE"] == "append" and int(args["WATERMARK_LOOKBACK_DAYS"]) > 0:
+    raise ValueError("WATERMARK_LOOKBACK_DAYS must be 0 when LOAD_MODE is append, use LOAD_MODE merge to reload late rows")
+
+# read only rows past the watermark of the last run, unless there is none or a full refresh is requested
+state = None if full_refresh or not watermark_column else readJobState(state_uri)
+watermark = state["watermark"] if state else None
+row_filter = args["SRC_FILTER"]
+if watermark:
+    row_filter = combineFilters(row_filter, watermarkFilter(watermark_column, watermark, int(args["WATERMARK_LOOKBACK_DAYS"])))
+logger.info(f"Extracting {args['SRC_BQ_TABLE']} {'from watermark ' + watermark if watermark else 'in full'}, filter: {row_filter or 'none'}")
+
+# read selected columns and rows from the bq table
+columns = [ column.strip() for column in args["SRC_COLUMNS"].split(",") ]
+source_df = readBigQueryTable(
+    spark,
+    table=args["SRC_BQ_TABLE"],
+    parent_project=args["GCP_PROJECT_NAME"],
+    credentials=getConnectionCredentials(args["SRC_BQ_CONN_NAME"]),
+    columns=columns,
+    row_filter=row_filter,
+    max_parallelism=args["SRC_MAX_PARALLELISM"],
+    min_parallelism=args["SRC_MIN_PARALLELISM"],
+).cache()
+
+# the new watermark is the highest value extracted, an empty delta leaves it unchanged
+stats = source_df.agg(F.count(F.lit(1)).alias("rows"), *([F.max(watermark_column).alias("watermark")] if watermark_column else [])).first()
+logger.info(f"Extracted {stats['rows']} rows")
+
+if stats["rows"] > 0:
+    # write df to s3 bucket as date partitioned parquet, merged into or appended to the partitions of a previous run
+    partitioned_df, partition_columns = addPartitionColumns(source_df, args["TGT_PARTITION_COLUMN"], args["TGT_PARTITION_GRANULARITY"])
+    write_mode = "overwrite"
+    if watermark and args["LOAD_MODE"] == "merge":
+        merge_keys = [ column.strip() for column in args["MERGE_KEYS"].split(",") ]
+        partitioned_df = mergeWithExisting(spark, partitioned_df, target_path, partition_columns, merge_keys)
+    elif watermark:
+        write_mode = "append"
+    rows_per_file = estimateRowsPerFile(spark, partitioned_df, f"{target_path}_tmp/{args['JOB_NAME']}/file-size-sample", args["TGT_COMPRESSION"],
+                                        float(args["TGT_FILE_SIZE_MB"]))
+    if full_refresh:
+        # replace the whole output, not only the partitions written
+        spark.conf.set("spark.sql.sources.partitionOverwriteMode", "static")
+    writePartitionedParquet(partitioned_df, target_path, partition_columns, args["TGT_COMPRESSION"], rows_per_file, write_mode)
+
+    # advance the watermark only once its rows are written, so a failed run is extracted again
+    if watermark_column:
+        new_watermark = stats["watermark"].isoformat() if hasattr(stats["watermark"], "isoformat") else str(stats["watermark"])
+        new_watermark = max(new_watermark, watermark) if watermark else new_watermark
+        logger.info(f"Advancing watermark of {watermark_column} to {new_watermark}")
+        writeJobState(state_uri, {
+            "watermark_column": watermark_column,
+            "watermark": new_watermark,
+            "rows": stats["rows"],
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        })
 
 job.commit()
@@ -1,50 +1,378 @@
 import os, sys
-import random, time
+import time
 import logging
+import argparse
+import gzip, io, shutil, math
+import concurrent.futures
+from datetime import date
 
 from faker import Faker
+import numpy as np
 import csv
 
 logger = logging.getLogger(__name__)
 
-def generateCustomerTable(filename, rowcount = 100): 
+DEFAULT_BATCH_SIZE = 100000 # rows generated and written per block (and per parquet row group)
+FAKER_POOL_SIZE = 10000 # distinct faker values sampled from for each pooled column
+
+# sharded datasets are written as part files of these formats and compressions (the first is the default)
+FILE_FORMATS = ['parquet', 'csv']
+COMPRESSIONS = {
+  'parquet': ['snappy', 'zstd', 'gzip', 'none'],
+  'csv': ['gzip', 'zstd', 'none'],
+}
+FILE_EXTENSIONS = {'csv': '.csv', 'parquet': '.parquet'}
+COMPRESSION_EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst'} # csv only, parquet files compress their column chunks
+DEFAULT_DATASET_DIR = '../../data/synth/mdm/sharded'
+
+# list of tuples(3): column name, column generator and generator parameters. columns are generated a batch
+# of rows at a time, using numpy sampling instead of calling faker (or evaluating an expression) for every field
+CUSTOMER_FIELD_MAP = [
+  ('id', 'sequence', None), # id is required for glue crawler to detect schema
+  ('first_name', 'faker_pool', {"provider": "first_name"}),
+  ('last_name', 'faker_pool', {"provider": "last_name"}),
+  ('dob', 'date_of_birth', {"minimum_age": 18, "maximum_age": 99}),
+  ('citizenship', 'faker_pool', {"provider": "country_code", "args": {"representation": "alpha-3"}, "default": "USA", "default_weight": 0.95}),
+  ('marital_status', 'choice', {"elements": ['single', 'married', 'divorced', 'widowed']}),
+]
+
+ACCOUNT_FIELD_MAP = [
+  ('id', 'sequence', None),
+  ('customer_id', 'foreign_key', {"table": "customer"}),
+  ('account_type', 'choice', {"elements": ['checking', 'savings', 'credit_card', 'loan', 'brokerage'], "weights": [0.4, 0.25, 0.2, 0.1, 0.05]}),
+  ('opened_date', 'date_between', {"min_days_ago": 3650, "max_days_ago": 0}),
+  ('balance', 'lognormal', {"mean": 8, "sigma": 1.5, "decimals": 2}),
+]
+
+ADDRESS_FIELD_MAP = [
+  ('id', 'sequence', None),
+  ('customer_id', 'foreign_key', {"table": "customer"}),
+  ('address_type', 'choice', {"elements": ['home', 'mailing', 'work'], "weights": [0.7, 0.2, 0.1]}),
+  ('street', 'faker_pool', {"provider": "street_address"}),
+  ('city', 'faker_pool', {"provider": "city"}),
+  ('state', 'faker_pool', {"provider": "state_abbr"}),
+  ('postcode', 'faker_pool', {"provider": "postcode"}),
+]
+
+TRANSACTION_FIELD_MAP = [
+  ('id', 'sequence', None),
+  ('account_id', 'foreign_key', {"table": "account"}),
+  ('txn_date', 'date_between', {"min_days_ago": 365, "max_days_ago": 0}),
+  ('txn_type', 'choice', {"elements": ['purchase', 'deposit', 'withdrawal', 'transfer', 'fee'], "weights": [0.6, 0.15, 0.1, 0.1, 0.05]}),
+  ('amount', 'lognormal', {"mean": 3.5, "sigma": 1.2, "decimals": 2}),
+]
+
+# related mdm tables, in the order they are generated. a child table has `cardinality` rows per row of its parent
+# (on average), and its foreign keys reference parent ids following a zipf distribution with exponent `skew`
+# (0 is uniform), so a few parents have many children like in real data. child tables only need the row count
+# of their parent, so tables of any size are generated a batch at a time without reading the parent table
+MDM_SCHEMA = {
+  'customer': {"field_map": CUSTOMER_FIELD_MAP},
+  'account': {"field_map": ACCOUNT_FIELD_MAP, "parent": "customer", "cardinality": 2, "skew": 0.5},
+  'address': {"field_map": ADDRESS_FIELD_MAP, "parent": "customer", "cardinality": 1.5, "skew": 0},
+  'transaction': {"field_map": TRANSACTION_FIELD_MAP, "parent": "account", "cardinality": 25, "skew": 0.8},
+}
+
+# returns the date `years` before `day` (feb 29 becomes feb 28 in non leap years)
+def _yearsBefore(day, years):
+  try:
+    return day.replace(year=day.year - years)
+  except ValueError:
+    return day.replace(year=day.year - years, day=28)
+
+# column generators, each returns a function of (rng, start, count) which generates the values of rows
+# [start, start + count) of a column as a numpy array. faker is only called while compiling the generators
+
+def _sequenceColumn(faker, params):
+  return lambda rng, start, count: np.arange(start, start + count)
+
+# samples values from a pool of FAKER_POOL_SIZE values of a faker provider. if a default is set, rows take
+# the default value with probability `default_weight`, like `"USA" if random.random() < 0.95 else faker...`
+def _fakerPoolColumn(faker, params):
+  fx = getattr(faker, params['provider'])
+  pool = np.array([ fx(**params.get('args', {})) for _ in range(FAKER_POOL_SIZE) ])
+  default = params.get('default')
+
+  def generate(rng, start, count):
+    values = pool[rng.integers(0, len(pool), count)]
+    if default is not None:
+      values = np.where(rng.random(count) < params['default_weight'], default, values)
+    return values
+  return generate
+
+# uniformly distributed dates of birth, between the same bounds as faker's `date_of_birth`
+def _dateOfBirthColumn(faker, params):
+  today = date.today()
+  first_day = np.datetime64(_yearsBefore(today, params['maximum_age'] + 1), 'D') + 1
+  last_day = np.datetime64(_yearsBefore(today, params['minimum_age']), 'D')
+  days = int((last_day - first_day) / np.timedelta64(1, 'D')) + 1
+
+  def generate(rng, start, count):
+    return first_day + rng.integers(0, days, count).astype('timedelta64[D]')
+  return generate
+
+def _choiceColumn(faker, params):
+  elements = np.array(params['elements'])
+  if params.get('weights'):
+    cumulative_weights = np.cumsum(params['weights']) / np.sum(params['weights'])
+    return lambda rng, start, count: elements[np.minimum(np.searchsorted(cumulative_weights, rng.random(count), side='right'), len(elements) - 1)]
+  return lambda rng, start, count: elements[rng.integers(0, len(elements), count)]
+
+# uniformly distributed dates between `min_days_ago` and `max_days_ago` days before today
+def _dateBetweenColumn(faker, params):
+  first_day = np.datetime64(date.today(), 'D') - params['min_days_ago']
+  days = params['min_days_ago'] - params['max_days_ago'] + 1
+  return lambda rng, start, count: first_day + rng.integers(0, days, count).astype('timedelta64[D]')
+
+# log-normally distributed amounts, rounded to `decimals` decimal places
+def _lognormalColumn(faker, params):
+  return lambda rng, start, count: np.round(rng.lognormal(params['mean'], params['sigma'], count), params.get('decimals', 2))
+
+# ids of `rows` parent rows (ids 0 to rows - 1), referenced following a zipf distribution with exponent `skew`.
+# ranks are sampled with the inverse cdf of a continuous power law over [1, rows + 1), which needs no table of
+# the parent keys, and are spread over the parent ids by an affine permutation, so hot keys aren't all low ids
+def _foreignKeyColumn(faker, params):
+  rows = params['rows']
+  skew = params.get('skew', 0)
+  multiplier = max(1, int(rows * 0.6180339887)) # golden ratio spreads consecutive ranks apart
+  while math.gcd(multiplier, rows) != 1:
+    multiplier += 1
+  offset = rows // 3
+
+  def generate(rng, start, count):
+    uniform = rng.random(count)
+    if skew == 0:
+      ranks = uniform * rows
+    elif skew == 1:
+      ranks = np.exp(uniform * math.log(rows + 1)) - 1
+    else:
+      ranks = ((math.pow(rows + 1, 1 - skew) - 1) * uniform + 1) ** (1 / (1 - skew)) - 1
+    ranks = np.minimum(ranks.astype(np.int64), rows - 1)
+    return (ranks * multiplier + offset) % rows
+  return generate
+
+COLUMN_GENERATORS = {
+  'sequence': _sequenceColumn,
+  'faker_pool': _fakerPoolColumn,
+  'date_of_birth': _dateOfBirthColumn,
+  'choice': _choiceColumn,
+  'date_between': _dateBetweenColumn,
+  'lognormal': _lognormalColumn,
+  'foreign_key': _foreignKeyColumn,
+}
+
+# compiles a field map once into a list of (column name, column generator function) tuples
+def compileFieldMap(field_map, faker):
+  return [ (col_name, COLUMN_GENERATORS[generator](faker, params)) for col_name, generator, params in field_map ]
+
+# generates rows [start, start + count) of a table as a dict of numpy arrays, one per column
+def generateColumns(columns, rng, start, count):
+  return { col_name: generate(rng, start, count) for col_name, generate in columns }
+
+# writes batches of rows to a csv file, optionally gzip or zstd compressed. rows are written a whole batch at a time.
+# zstd compresses using `compression_threads` threads (all cpus by default)
+class _CsvPartWriter:
+  def __init__(self, filename, headers, compression = None, compression_threads = -1):
+    self.headers = headers
+    if compression == 'gzip':
+      self.file = gzip.open(filename, 'wt', newline='')
+    elif compression == 'zstd':
+      import zstandard
+      self.file = io.TextIOWrapper(zstandard.ZstdCompressor(threads=compression_threads).stream_writer(open(filename, 'wb')), newline='')
+    else:
+      self.file = open(filename, 'wt', newline='')
+    self.writer = csv.writer(self.file, lineterminator='\n')
+    self.writer.writerow(headers)
+
+  def write(self, batch):
+    self.writer.writerows(zip(*[ batch[col_name].tolist() for col_name in self.headers ]))
+
+  def close(self):
+    self.file.close()
+
+# writes batches of rows to a parquet file, one row group per batch
+class _ParquetPartWriter:
+  def __init__(self, filename, headers, compression = None, compression_threads = -1):
+    self.filename = filename
+    self.headers = headers
+    self.compression = compression or 'none'
+    self.writer = None
+
+  def write(self, batch):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.table({ col_name: batch[col_name] for col_name in self.headers })
+    if self.writer is None:
+      self.writer = pq.ParquetWriter(self.filename, table.schema, compression=self.compression)
+    self.writer.write_table(table)
+
+  def close(self):
+    if self.writer is not None:
+      self.writer.close()
+
+PART_WRITERS = {'csv': _CsvPartWriter, 'parquet': _ParquetPartWriter}
+
+# splits a batch into (partition path, batch) tuples by the values of its partition columns, using hive style
+# `column=value` directories. partition columns are left out of the batches, as their values are in the path
+def _partitionBatch(batch, partition_by):
+  if not partition_by:
+    yield '', batch
+    return
+  codes = np.zeros(len(batch[partition_by[0]]), dtype=np.int64)
+  for col_name in partition_by:
+    uniques, inverse = np.unique(batch[col_name], return_inverse=True)
+    codes = codes * len(uniques) + inverse
+  for code in np.unique(codes):
+    mask = codes == code
+    partition_path = os.path.join(*[ f'{col_name}={batch[col_name][mask][0]}' for col_name in partition_by ])
+    yield partition_path, { col_name: values[mask] for col_name, values in batch.items() if col_name not in partition_by }
+
+def generateCustomerTable(filename, rowcount = 100, batch_size = DEFAULT_BATCH_SIZE, seed = None):
+  if seed is None:
+    seed = time.time_ns()
   faker = Faker('en_US')
-  Faker.seed(time.time_ns())
-
-  # list of tuples(3)
-  field_map = [
-    ('id', None, None), 
-    ('first_name', 'first_name', None), 
-    ('last_name', 'last_name', None), 
-    ('dob', 'date_of_birth', {"minimum_age": 18, "maximum_age": 99}), 
-    ('citizenship', None, '"USA" if random.random() < 0.95 else faker.country_code(representation="alpha-3")'), 
-    ('marital_status', 'random_element', ['single', 'married', 'divorced', 'widowed']), 
-  ]
-
-  headers = [elem[0] for elem in field_map]
-  with open(filename, 'wt') as csv_file: 
-    writer = csv.DictWriter(csv_file, fieldnames = headers)
-    writer.writeheader()
-
-    for i in range(0, rowcount): 
-      record = {'id': i} # id is required for glue crawler to detect schema
-      for field in field_map: 
-        col_name = field[0]
-        faker_func = field[1]
-        py_expr = field[2] 
-
-        if faker_func is None: 
-          if py_expr is None: 
-            continue
-          else: 
-            col_value = eval(py_expr)
-        else: 
-          fx = getattr(faker, faker_func)
-          col_value = fx(**py_expr) if isinstance(py_expr, dict) else fx(py_expr)
-        
-        record[col_name] = col_value
-      writer.writerow(record)
+  Faker.seed(seed)
+  rng = np.random.default_rng(seed)
+  columns = compileFieldMap(CUSTOMER_FIELD_MAP, faker)
+
+  headers = [ col_name for col_name, _ in columns ]
+  writer = _CsvPartWriter(filename, headers)
+  try:
+    for start in range(0, rowcount, batch_size):
+      count = min(batch_size, rowcount - start)
+      writer.write(generateColumns(columns, rng, start, count))
+      logger.info('Generated %s of %s rows', start + count, rowcount)
+  finally:
+    writer.close()
+
+# generates rows [start, start + count) of a dataset as shard number `shard`, and writes them to a part file in
+# each partition directory of the table. runs in a worker process, so it only takes picklable arguments.
+# faker pools are seeded with the dataset seed, so they are the same in every shard, and shard rows are sampled
+# from a generator seeded with (dataset seed, shard), so output only depends on the seed, shards and batch size
+def _generateShard(table_dir, field_map, shard, start, count, seed, file_format, compression, partition_by, batch_size, compression_threads):
+  faker = Faker('en_US')
+  Faker.seed(seed)
+  columns = compileFieldMap(field_map, faker)
+  rng = np.random.default_rng([seed, shard])
+  headers = [ col_name for col_name, _ in columns if col_name not in partition_by ]
+  filename = f'part-{shard:05d}{FILE_EXTENSIONS[file_format]}' + (COMPRESSION_EXTENSIONS.get(compression, '') if file_format == 'csv' else '')
+
+  writers = {} # part file writer of each partition directory, created when the first row of the partition is generated
+  try:
+    for batch_start in range(start, start + count, batch_size):
+      batch = generateColumns(columns, rng, batch_start, min(batch_size, start + count - batch_start))
+      for partition_path, partition_batch in _partitionBatch(batch, partition_by):
+        if partition_path not in writers:
+          os.makedirs(os.path.join(table_dir, partition_path), exist_ok=True)
+          writers[partition_path] = PART_WRITERS[file_format](os.path.join(table_dir, partition_path, filename), headers, compression, compression_threads)
+        writers[partition_path].write(partition_batch)
+  finally:
+    for writer in writers.values():
+      writer.close()
+  logger.info('Generated shard %s (%s rows) in %s partitions', shard, count, len(writers))
+  return len(writers)
+
+# generates a table as a sharded dataset under `output_dir/table_name`. row ranges are split into `shards`
+# shards, generated in parallel by `workers` processes (defaults to the number of cpus). each shard writes
+# one part file per partition of `partition_by` columns, as parquet or csv files
+def generateDataset(table_name, field_map, output_dir, rowcount, shards = None, workers = None, file_format = FILE_FORMATS[0], compression = None,
+                    partition_by = None, seed = None, batch_size = DEFAULT_BATCH_SIZE, overwrite = False):
+  if compression is None:
+    compression = COMPRESSIONS[file_format][0]
+  if compression not in COMPRESSIONS[file_format]:
+    raise ValueError(f'Compression {compression} is not supported for {file_format} files (valid values are {", ".join(COMPRESSIONS[file_format])})')
+  partition_by = list(partition_by or [])
+  workers = workers or os.cpu_count() or 1
+  shards = shards or workers
+  if seed is None:
+    seed = time.time_ns()
+  logger.info('Generating %s rows of %s table in %s shards using %s workers and seed %s', rowcount, table_name, shards, workers, seed)
+
+  table_dir = os.path.join(output_dir, table_name)
+  if os.path.exists(table_dir):
+    if not overwrite:
+      raise FileExistsError(f'Output directory {table_dir} already exists, use overwrite to replace it')
+    shutil.rmtree(table_dir)
+  os.makedirs(table_dir)
+
+  shard_ranges = [ (shard * rowcount // shards, (shard + 1) * rowcount // shards) for shard in range(shards) ]
+  with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+    futures = [ executor.submit(_generateShard, table_dir, field_map, shard, start, end - start, seed, file_format,
+                                compression if compression != 'none' else None, partition_by, batch_size, 
+                                # with a shard in each process, zstd compresses with a thread per shard
+                                0 if workers > 1 else -1)
+                for shard, (start, end) in enumerate(shard_ranges) if end > start ]
+    for future in concurrent.futures.as_completed(futures):
+      future.result()
+  return table_dir
+
+# generates related tables of a schema (e.g. MDM_SCHEMA) as sharded datasets under `output_dir`, one table at a
+# time. root tables have `rowcount` rows, and child tables `cardinality` rows per parent row. cardinalities and
+# skews of the schema can be overridden by table name. each table is partitioned by the `partition_by` columns
+# it has, and generated with its own seed derived from `seed`
+def generateSchema(schema, table_names, output_dir, rowcount, cardinalities = None, skews = None, shards = None, workers = None,
+                   file_format = FILE_FORMATS[0], compression = None, partition_by = None, seed = None, batch_size = DEFAULT_BATCH_SIZE, overwrite = False):
+  cardinalities = cardinalities or {}
+  skews = skews or {}
+  if seed is None:
+    seed = time.time_ns()
+  logger.info('Generating tables %s with seed %s', ', '.join(table_names), seed)
+
+  table_rows = {}
+  for table_index, table_name in enumerate(schema):
+    table = schema[table_name]
+    parent = table.get('parent')
+    if parent:
+      table_rows[table_name] = max(1, round(table_rows[parent] * cardinalities.get(table_name, table['cardinality'])))
+    else:
+      table_rows[table_name] = rowcount
+    if table_name not in table_names:
+      continue # only its row count is needed, by its child tables
+
+    # foreign keys reference ids of the parent table, only its row count is needed
+    field_map = []
+    for col_name, generator, params in table['field_map']:
+      if generator == 'foreign_key':
+        params = dict(params, rows=table_rows[params['table']], skew=skews.get(table_name, table.get('skew', 0)))
+      field_map.append((col_name, generator, params))
+    table_seed = int(np.random.SeedSequence([seed, table_index]).generate_state(1)[0])
+    table_partition_by = [ col_name for col_name in (partition_by or []) if col_name in [ field[0] for field in field_map ] ]
+    generateDataset(table_name, field_map, output_dir, table_rows[table_name], shards, workers, file_format, compression, 
+                    table_partition_by, table_seed, batch_size, overwrite)
+  return table_rows
+
+# parses a comma separated list of `name=value` pairs (e.g. account=3,transaction=50) into a dict of float values
+def _parseTableValues(value):
+  return { name: float(number) for name, number in (pair.split('=') for pair in value.split(',')) } if value else {}
 
 if __name__ == '__main__':
-  generateCustomerTable('../../data/synth/mdm/customer/customer.csv', 100)
+  cliparser = argparse.ArgumentParser(description='Generate a synthetic MDM customer table, as a single csv file or as a sharded dataset.')
+  cliparser.add_argument('--rows', '-r', type=int, default=100, help='number of rows to generate (default: 100)')
+  cliparser.add_argument('--batch-size', '-b', type=int, default=DEFAULT_BATCH_SIZE, help=f'rows generated and written per block (default: {DEFAULT_BATCH_SIZE})')
+  cliparser.add_argument('--seed', '-s', type=int, default=None, help='random seed, for reproducible output (default: current time)')
+  cliparser.add_argument('--output', '-o', default='../../data/synth/mdm/customer/customer.csv', help='output csv file, unless a sharded dataset is generated')
+  cliparser.add_argument('--shards', '-n', type=int, default=None, help='generate a sharded dataset with this many part files per partition')
+  cliparser.add_argument('--workers', '-w', type=int, default=None, help='number of worker processes generating shards (default: number of cpus)')
+  cliparser.add_argument('--format', '-f', choices=FILE_FORMATS, default=FILE_FORMATS[0], help='file format of a sharded dataset (default: parquet)')
+  cliparser.add_argument('--compression', '-c', choices=sorted(set(sum(COMPRESSIONS.values(), []))), default=None, 
+                         help='compression of a sharded dataset (default: snappy for parquet, gzip for csv)')
+  cliparser.add_argument('--partition-by', '-p', default=None, help='comma separated list of columns a sharded dataset is partitioned by, each table by the ones it has (e.g. citizenship,txn_type)')
+  cliparser.add_argument('--output-dir', '-d', default=DEFAULT_DATASET_DIR, help=f'directory a sharded dataset is written to (default: {DEFAULT_DATASET_DIR})')
+  cliparser.add_argument('--overwrite', action='store_true', help='replace an existing sharded dataset')
+  cliparser.add_argument('--tables', '-t', default='customer', help=f'comma separated list of tables of a sharded dataset (default: customer, tables: {", ".join(MDM_SCHEMA)})')
+  cliparser.add_argument('--cardinality', default=None, help='child rows per parent row by table, overriding the schema (e.g. account=3,transaction=50)')
+  cliparser.add_argument('--skew', default=None, help='zipf exponent of foreign keys by table, overriding the schema (e.g. transaction=1.5, 0 is uniform)')
+  args = cliparser.parse_args()
 
+  logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=os.environ.get('LOG_LEVEL', 'INFO'))
+  if args.shards:
+    partition_by = args.partition_by.split(',') if args.partition_by else None
+    table_names = args.tables.split(',')
+    unknown_tables = [ table_name for table_name in table_names if table_name not in MDM_SCHEMA ]
+    if unknown_tables:
+      cliparser.error(f'unknown tables: {", ".join(unknown_tables)}')
+    generateSchema(MDM_SCHEMA, table_names, args.output_dir, args.rows, _parseTableValues(args.cardinality), _parseTableValues(args.skew), 
+                   args.shards, args.workers, args.format, args.compression, partition_by, args.seed, args.batch_size, args.overwrite)
+  else:
+    generateCustomerTable(args.output, args.rows, args.batch_size, args.seed)
@@ -35,6 +35,14 @@ resource "aws_glue_job" "bq_to_s3_covid" {
     "--GCP_PROJECT_NAME"                  = var.hub_gcp_project_id
     "--SRC_BQ_CONN_NAME"                  = aws_glue_connection.bq_connection.name
     "--TGT_S3_PATH"                       = "s3://${aws_s3_bucket.data_files.id}/jobs/${local.covid_job_id}/output/"
+    "--SRC_MAX_PARALLELISM"               = "20"
+    "--TGT_PARTITION_GRANULARITY"         = "month"
+    "--TGT_COMPRESSION"                   = "snappy"
+    "--TGT_FILE_SIZE_MB"                  = "128"
+    "--WATERMARK_COLUMN"                  = "date"
+    "--WATERMARK_LOOKBACK_DAYS"           = "7"
+    "--LOAD_MODE"                         = "merge"
+    "--MERGE_KEYS"                        = "date,location_key"
 
     # AWS Glue parameters 
     "--disable-proxy-v2"                  = "true"
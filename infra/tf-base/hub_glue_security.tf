@@ -65,6 +65,15 @@ data "aws_iam_policy_document" "glue_role_inline_policy" {
     ]
   }
 
+  statement {
+    actions               = [
+      "s3:DeleteObject" # needed for partition overwrites, merges and file size sample cleanup of glue jobs
+    ]
+    resources             = [
+      "${aws_s3_bucket.data_files.arn}/*"
+    ]
+  }
+
   statement {
     actions               = [
       "secretsmanager:*" 
@@ -56,6 +56,7 @@ resource "aws_lambda_function" "copy_gcs_s3_lambda" {
       #GCP_CREDENTIALS_FILE = "keyfile.json"
       GCP_CREDENTIALS_SECRET_ID = aws_secretsmanager_secret.gcp_secret.arn
       GCP_PROXY             = local.gcp_proxy
+      FAN_OUT_FUNCTION      = local.lambda.name # part range workers of fan out copies are invocations of this function
       LOG_LEVEL             = "INFO"
       TZ                    = "US/Eastern"
     }
@@ -119,6 +120,9 @@ resource "aws_iam_policy" "lambda_policy" {
         "secretsmanager:GetSecretValue",
         "s3:GetObject*", 
         "s3:PutObject*", 
+        "s3:DeleteObject", 
+        "s3:AbortMultipartUpload", 
+        "s3:ListMultipartUploadParts", 
         "kms:GenerateDataKey",
         "kms:Encrypt",
         "kms:Decrypt"
@@ -127,6 +131,16 @@ resource "aws_iam_policy" "lambda_policy" {
         "*"
       ], 
       "Effect": "Allow"
+    }, 
+    {
+      "Action": [
+        "lambda:InvokeFunction"
+      ],
+      "Resource": [
+        "arn:aws:lambda:${var.aws_region}:${local.account_id}:function:${local.lambda.name}", 
+        "arn:aws:lambda:${var.aws_region}:${local.account_id}:function:${local.lambda.name}:*"
+      ],
+      "Effect": "Allow"
     }
   ]
 }